@@ -0,0 +1,199 @@
+"""Single entry point for the ingestion stages, retrieval and the chat server.
+
+    python -m app pipeline --limit 20
+    python -m app fetch blogs && python -m app extract blogs
+    python -m app serve --port 8000
+
+Each command imports only the modules it runs, so a blog-only command never
+loads Whisper, Chroma or the Gemini SDK.
+"""
+import argparse
+import sys
+
+
+def cmd_fetch(args):
+    from app.ingestion.fetch import blog_fetcher, podcast_fetcher
+
+    if args.kind in ("blogs", "all"):
+        blog_fetcher(full=args.full, max_pages=args.max_pages)
+    if args.kind in ("podcasts", "all"):
+        podcast_fetcher()
+
+
+def cmd_extract(args):
+    from app.ingestion.extract import blog_extractor
+
+    blog_extractor(refresh=not args.no_refresh)
+
+
+def cmd_download(args):
+    from app.ingestion.download import DOWNLOAD_WORKERS
+    from app.ingestion.transcriber import audio_downloader
+
+    audio_downloader(args.workers or DOWNLOAD_WORKERS)
+
+
+def cmd_transcribe(args):
+    from app.core.config import TRANSCRIBE_MODE
+    from app.ingestion.transcriber import audio_transcriber
+
+    audio_transcriber(args.workers, args.mode or TRANSCRIBE_MODE)
+
+
+def cmd_chunk(args):
+    from app.ingestion.chunk import chunker
+
+    chunker()
+
+
+def cmd_embed(args):
+    from app.ingestion.embed import embedder
+
+    embedder(full=args.full, force=args.force)
+
+
+def cmd_backfill_dates(args):
+    from app.ingestion.embed import backfill_published_ts
+
+    for name in args.collections or ["podcasts"]:
+        backfill_published_ts(name)
+
+
+def cmd_pipeline(args):
+    from app.core.config import PROFILE_SAMPLING, TRANSCRIBE_MODE
+    from app.ingestion.pipeline import run_pipeline
+
+    run_pipeline(
+        blogs=not args.no_blogs,
+        podcasts=not args.no_podcasts,
+        limit=args.limit,
+        transcribe_workers=args.workers,
+        transcribe_mode=args.mode or TRANSCRIBE_MODE,
+        profile=args.profile or PROFILE_SAMPLING,
+    )
+
+
+def cmd_quantize(args):
+    from app.core.config import COLLECTIONS
+    from app.retrieval.quantized import build_quantized_index
+
+    for name in args.collections or COLLECTIONS:
+        build_quantized_index(name)
+
+
+def cmd_lexical(args):
+    from app.core.config import COLLECTIONS
+    from app.retrieval.lexical import ensure_lexical_index, rebuild_lexical_index
+
+    for name in args.collections or COLLECTIONS:
+        if args.rebuild:
+            rebuild_lexical_index(name)
+        else:
+            ensure_lexical_index(name)
+
+
+def cmd_retrieve(args):
+    from app.retrieval.retrieve import QUERY_BATCH_SIZE, retrieve_lines
+
+    retrieve_lines(args.questions, top_k=args.top_k, hybrid=args.hybrid, batch_size=args.batch_size or QUERY_BATCH_SIZE)
+
+
+def cmd_serve(args):
+    import uvicorn
+
+    uvicorn.run("app.retrieval.chat:app", host=args.host, port=args.port, workers=args.workers)
+
+
+def cmd_registry(args):
+    from app.ingestion.storage import KINDS, get_registry
+
+    for kind in KINDS:
+        store = get_registry(kind)
+        if args.migrate:
+            # get_registry() already ran the one-time import; this re-reads the files
+            store.migrate_from_json(force=True)
+        if args.export:
+            store.export_json()
+        print(f"{kind}: {store.count_by_state()}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app", description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("fetch", help="discover new blog posts and podcast episodes")
+    p.add_argument("kind", choices=["blogs", "podcasts", "all"], nargs="?", default="all")
+    p.add_argument("--full", action="store_true", help="walk every blog listing page")
+    p.add_argument("--max-pages", type=int)
+    p.set_defaults(fn=cmd_fetch)
+
+    p = commands.add_parser("extract", help="download and extract blog articles")
+    p.add_argument("kind", choices=["blogs"], nargs="?", default="blogs")
+    p.add_argument("--no-refresh", action="store_true", help="skip revalidating stale articles")
+    p.set_defaults(fn=cmd_extract)
+
+    p = commands.add_parser("download", help="download podcast audio")
+    p.add_argument("--workers", type=int)
+    p.set_defaults(fn=cmd_download)
+
+    p = commands.add_parser("transcribe", help="transcribe downloaded (or streamed) episodes")
+    p.add_argument("--workers", type=int)
+    p.add_argument("--mode", choices=["file", "stream"])
+    p.set_defaults(fn=cmd_transcribe)
+
+    commands.add_parser("chunk", help="re-chunk changed raw documents").set_defaults(fn=cmd_chunk)
+    p = commands.add_parser("embed", help="sync the shards chunked since the last embed into the vector store")
+    p.add_argument("--full", action="store_true", help="ingest every shard and reconcile the whole collection")
+    p.add_argument("--force", action="store_true", help="let a full reconcile delete most of a collection")
+    p.set_defaults(fn=cmd_embed)
+
+    p = commands.add_parser("backfill-dates", help="add published_ts to vectors stored before date filters existed")
+    p.add_argument("collections", nargs="*")
+    p.set_defaults(fn=cmd_backfill_dates)
+
+    p = commands.add_parser("pipeline", help="run every stage as one streaming pipeline")
+    p.add_argument("--no-blogs", action="store_true")
+    p.add_argument("--no-podcasts", action="store_true")
+    p.add_argument("--limit", type=int)
+    p.add_argument("--workers", type=int, help="transcription workers")
+    p.add_argument("--mode", choices=["file", "stream"], help="transcription mode")
+    p.add_argument("--profile", action="store_true", help="sample stacks per stage")
+    p.set_defaults(fn=cmd_pipeline)
+
+    p = commands.add_parser("quantize", help="build quantized search indexes; embed and pipeline keep built ones current")
+    p.add_argument("collections", nargs="*")
+    p.set_defaults(fn=cmd_quantize)
+
+    p = commands.add_parser("lexical", help="backfill BM25 indexes that don't match their collection")
+    p.add_argument("collections", nargs="*")
+    p.add_argument("--rebuild", action="store_true", help="rebuild even when the counts match")
+    p.set_defaults(fn=cmd_lexical)
+
+    p = commands.add_parser("retrieve", help="batch retrieval: questions in, JSON lines of hits out")
+    p.add_argument("questions", nargs="?", type=argparse.FileType("r", encoding="utf-8"), default=sys.stdin)
+    p.add_argument("--top-k", type=int, default=5)
+    p.add_argument("--hybrid", action="store_true")
+    p.add_argument("--batch-size", type=int)
+    p.set_defaults(fn=cmd_retrieve)
+
+    p = commands.add_parser("serve", help="run the chat API")
+    p.add_argument("--host", default="0.0.0.0")
+    p.add_argument("--port", type=int, default=8000)
+    p.add_argument("--workers", type=int, default=1)
+    p.set_defaults(fn=cmd_serve)
+
+    p = commands.add_parser("registry", help="show registry counts by state")
+    p.add_argument("--migrate", action="store_true", help="re-import the legacy JSON registries, overwriting matching items")
+    p.add_argument("--export", action="store_true", help="write the registries back out as JSON snapshots")
+    p.set_defaults(fn=cmd_registry)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    main()
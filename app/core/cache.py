@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.config import EMBEDDING_PATH
+
+_MISSING = object()
+
+VERSIONS_DIR = EMBEDDING_PATH / "versions"
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class LatencyStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def record(self, kind: str, seconds: float):
+        with self._lock:
+            count, total, worst = self._data.get(kind, (0, 0.0, 0.0))
+            self._data[kind] = (count + 1, total + seconds, max(worst, seconds))
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                kind: {
+                    "count": count,
+                    "avg_ms": total / count * 1000,
+                    "max_ms": worst * 1000,
+                }
+                for kind, (count, total, worst) in self._data.items()
+            }
+
+
+# Collection versions live on disk so that an ingestion run in another
+# process invalidates result caches held by the retrieval workers.
+def _version_path(collection_name: str):
+    return VERSIONS_DIR / f"{collection_name}.version"
+
+
+def bump_collection_version(collection_name: str):
+    VERSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    path = _version_path(collection_name)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(str(time.time_ns()), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def collection_version(collection_name: str) -> str:
+    try:
+        return _version_path(collection_name).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return "0"
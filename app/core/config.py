@@ -1,32 +1,24 @@
 import os
-from dotenv import load_dotenv
+from functools import lru_cache
 from pathlib import Path
 
-load_dotenv()
-
 # Whsiper
 MODEL_SIZE = "tiny.en"
 DEVICE = "cpu"
 COMPUTE_TYPE = "int8"
 
 # LLM
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_EMBED_MODEL = "models/gemini-embedding-001"
 GEMINI_LLM_MODEL = "models/gemini-2.5-flash"
 
-# Data
+# Embeddings
+FAKE_EMBED_DIM = 768
+EMBEDDING_CACHE_MAX_ENTRIES = 500_000
+
+# Vector store
+COLLECTIONS = ["blogs", "podcasts"]
 
 APP_DIR = Path(__file__).resolve().parents[1]
-DATA_DIR = APP_DIR / "data"
-EMBEDDING_PATH = DATA_DIR / "embeddings"
-RAW_BLOGS_DIR = DATA_DIR / "raw" / "blogs"
-RAW_PODCASTS_DIR = DATA_DIR / "raw" / "podcasts"
-BLOGS_URL_PATH = DATA_DIR / "registry" / "blogs_urls.json"
-PODCASTS_URL_PATH = DATA_DIR / "registry" / "podcasts_urls.json"
-BLOGS_CHUNKS_PATH = DATA_DIR / "processed" / "blogs_chunks.json"
-PODCASTS_CHUNKS_PATH = DATA_DIR / "processed" / "podcasts_chunks.json"
-PODCASTS_AUDIO_PATH = DATA_DIR / "audio" / "podcasts"
-VIDEOS_AUDIO_PATH = DATA_DIR / "audio" / "videos"
 
 # URLs
 BLOGS_URL = "https://www.challengerstrength.com/blog"
@@ -35,3 +27,104 @@ PODCASTS_URL = "https://rss.buzzsprout.com/238054.rss"
 
  # Extras
 CHECK_INTERVAL_HOURS = 24
+
+
+@lru_cache(maxsize=None)
+def _env_settings() -> dict:
+    """Settings that come from the environment (and .env).
+
+    Read once, on the first access to any of them through the module
+    `__getattr__` below. Importing this module alone reads nothing, but most
+    app modules import a setting at their top level, so importing one of
+    those loads python-dotenv and reads .env. Only code that needs just the
+    constants above (the CLI's argument parsing, for one) skips that.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    settings = {
+        # "file" downloads each MP3 before transcribing; "stream" decodes straight from the HTTP response
+        "TRANSCRIBE_MODE": os.getenv("TRANSCRIBE_MODE", "file"),
+        # "faster-whisper" or "fake" for offline benchmarks
+        "WHISPER_BACKEND": os.getenv("WHISPER_BACKEND", "faster-whisper"),
+        # Fake transcription time per second of audio (0.1 = ten times faster than real time)
+        "FAKE_WHISPER_RTF": float(os.getenv("FAKE_WHISPER_RTF", "0")),
+
+        # Audio downloads pause once the audio dir holds this much, or the disk runs low
+        "AUDIO_MAX_BYTES": int(os.getenv("AUDIO_MAX_BYTES", 5 * 1024**3)),
+        "AUDIO_MIN_FREE_BYTES": int(os.getenv("AUDIO_MIN_FREE_BYTES", 1024**3)),
+
+        # LLM
+        "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY"),
+        "LLM_BACKEND": os.getenv("LLM_BACKEND", "gemini"),  # "gemini" or "fake" for load tests
+        "FAKE_LLM_LATENCY": float(os.getenv("FAKE_LLM_LATENCY", "0.3")),
+        "FAKE_LLM_TOKEN_LATENCY": float(os.getenv("FAKE_LLM_TOKEN_LATENCY", "0.01")),
+
+        # Embeddings ("gemini" or "fake" for offline benchmarks)
+        "EMBEDDER_BACKEND": os.getenv("EMBEDDER_BACKEND", "gemini"),
+        "FAKE_EMBED_LATENCY": float(os.getenv("FAKE_EMBED_LATENCY", "0")),
+        "EMBEDDING_CACHE_ENABLED": os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1",
+
+        # Retrieval backend: "chroma" (HNSW), "quantized" (int8 memmap + float re-rank),
+        # "exact" (brute force over vectors held in RAM) or "auto" (exact up to the size below, then Chroma)
+        "RETRIEVAL_BACKEND": os.getenv("RETRIEVAL_BACKEND", "auto"),
+        # "auto" keeps a collection on exact search while its float32 matrix fits this budget:
+        # 4 * dims bytes per vector, ~12KB at 3072 dims, and twice that while a reload runs
+        "EXACT_SEARCH_MEMORY_MB": int(os.getenv("EXACT_SEARCH_MEMORY_MB", 256)),
+        # A fixed vector limit instead of the budget; 0 derives it from the collection's dimensionality
+        "EXACT_SEARCH_MAX_VECTORS": int(os.getenv("EXACT_SEARCH_MAX_VECTORS", 0)),
+
+        # Re-ranking before generation: "none", "cross-encoder" (local sentence-transformers
+        # model) or "llm" (one batched scoring call to the chat model)
+        "RERANKER": os.getenv("RERANKER", "none"),
+        "RERANK_MODEL": os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+        # Candidates retrieved for the re-ranker to choose the final top_k from
+        "RERANK_CANDIDATES": int(os.getenv("RERANK_CANDIDATES", 20)),
+        # Past this, the vector order is used as is
+        "RERANK_BUDGET_MS": int(os.getenv("RERANK_BUDGET_MS", 800)),
+        # Skip re-ranking when the k-th and (k+1)-th candidates are at least this far apart in cosine distance
+        "RERANK_DECISIVE_GAP": float(os.getenv("RERANK_DECISIVE_GAP", 0.1)),
+
+        # Blog HTML extraction: "fast" (lxml, linear-time) or "soup" (html.parser)
+        "HTML_EXTRACTOR": os.getenv("HTML_EXTRACTOR", "fast"),
+
+        # Sample stacks during pipeline runs and write them next to the run summary
+        "PROFILE_SAMPLING": os.getenv("PROFILE_SAMPLING", "0") == "1",
+
+        # Chunking ("token" tokenizes each document once; "recursive" is the LangChain splitter)
+        "SPLITTER_MODE": os.getenv("SPLITTER_MODE", "token"),
+        # "segments" packs whole Whisper segments (with time ranges) when a transcript has them; "text" re-splits the text
+        "PODCAST_CHUNK_MODE": os.getenv("PODCAST_CHUNK_MODE", "segments"),
+    }
+
+    # Data
+    data_dir = Path(os.getenv("RAG_DATA_DIR", APP_DIR / "data"))
+    settings.update({
+        "DATA_DIR": data_dir,
+        "EMBEDDING_PATH": data_dir / "embeddings",
+        "LEXICAL_INDEX_PATH": data_dir / "lexical",
+        "QUANTIZED_INDEX_PATH": data_dir / "quantized",
+        # Per-run metrics summaries and profiler output
+        "RUNS_DIR": data_dir / "runs",
+        "RAW_BLOGS_DIR": data_dir / "raw" / "blogs",
+        "RAW_PODCASTS_DIR": data_dir / "raw" / "podcasts",
+        "BLOGS_URL_PATH": data_dir / "registry" / "blogs_urls.json",
+        "PODCASTS_URL_PATH": data_dir / "registry" / "podcasts_urls.json",
+        "HTTP_CACHE_PATH": data_dir / "registry" / "http_cache.json",
+        "REGISTRY_DB_PATH": data_dir / "registry" / "registry.sqlite3",
+        "BLOGS_CHUNKS_DIR": data_dir / "processed" / "blogs",
+        "PODCASTS_CHUNKS_DIR": data_dir / "processed" / "podcasts",
+        "PODCASTS_AUDIO_PATH": data_dir / "audio" / "podcasts",
+        "VIDEOS_AUDIO_PATH": data_dir / "audio" / "videos",
+        "EMBEDDING_CACHE_PATH": data_dir / "cache" / "embeddings.sqlite3",
+    })
+    return settings
+
+
+def __getattr__(name: str):
+    settings = _env_settings()
+    if name not in settings:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # Plain module attributes from here on; __getattr__ only sees missing names
+    globals().update(settings)
+    return settings[name]
@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from functools import lru_cache
+from pathlib import Path
+
+from app.core.config import EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_PATH
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Fraction of max_entries kept after an eviction pass, so we don't evict on every insert
+EVICT_TO = 0.9
+# A hit only rewrites last_used once it is this old; eviction order is coarse by
+# that much, but repeated hits read without writing
+TOUCH_INTERVAL_SECONDS = 600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    task_type TEXT NOT NULL,
+    text_sha BLOB NOT NULL,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (model, task_type, text_sha)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used);
+"""
+
+
+def normalize_text(text: str) -> str:
+    return unicodedata.normalize("NFC", text).strip()
+
+
+def text_sha(text: str) -> bytes:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """On-disk cache of float32 vectors keyed by (model, task_type, sha256(text))."""
+
+    def __init__(self, path: Path = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, task_type: str, texts: list[str]) -> list[list[float] | None]:
+        keys = [text_sha(t) for t in texts]
+        found = {}
+        stale = []
+        now = time.time()
+
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_sha, vector, last_used FROM embeddings "
+                    f"WHERE model = ? AND task_type = ? AND text_sha IN ({','.join('?' * len(part))})",
+                    (model, task_type, *part),
+                ).fetchall()
+                for key, blob, last_used in rows:
+                    found[key] = blob
+                    if now - last_used >= TOUCH_INTERVAL_SECONDS:
+                        stale.append(key)
+
+            if stale:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND task_type = ? AND text_sha = ?",
+                    [(now, model, task_type, k) for k in stale],
+                )
+                self._conn.commit()
+
+            results = []
+            for key in keys:
+                blob = found.get(key)
+                if blob is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(array("f", blob).tolist())
+
+        return results
+
+    def put_many(self, model: str, task_type: str, texts: list[str], vectors: list[list[float]]):
+        now = time.time()
+        rows = [
+            (model, task_type, text_sha(t), array("f", v).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, task_type, text_sha, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._size += self._conn.total_changes - before
+
+            if self._size > self.max_entries:
+                self._evict()
+
+            self._conn.commit()
+
+    def _evict(self):
+        target = int(self.max_entries * EVICT_TO)
+        excess = self._size - target
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE (model, task_type, text_sha) IN "
+            "(SELECT model, task_type, text_sha FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._size = target
+        logger.info(f"[CACHE] Evicted {excess} embeddings (max={self.max_entries})")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings:
+    """Wraps an embedder so texts already embedded under the same model/task never hit the API."""
+
+    def __init__(self, embedder, cache: EmbeddingCache, model: str, task_type: str):
+        self.embedder = embedder
+        self.cache = cache
+        self.model = model
+        self.task_type = task_type
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = self.cache.get_many(self.model, self.task_type, texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+
+        if missing:
+            fresh = self.embedder.embed_documents([texts[i] for i in missing])
+            self.cache.put_many(self.model, self.task_type, [texts[i] for i in missing], fresh)
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        cached = self.cache.get_many(self.model, self.task_type, [text])[0]
+        if cached is not None:
+            return cached
+
+        vector = self.embedder.embed_query(text)
+        self.cache.put_many(self.model, self.task_type, [text], [vector])
+        return vector
+
+
+@lru_cache(maxsize=None)
+def get_embedding_cache() -> EmbeddingCache:
+    return EmbeddingCache()
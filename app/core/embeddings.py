@@ -0,0 +1,80 @@
+import hashlib
+import math
+import re
+import time
+from functools import lru_cache
+
+from app.core.config import (
+    EMBEDDER_BACKEND,
+    EMBEDDING_CACHE_ENABLED,
+    FAKE_EMBED_DIM,
+    FAKE_EMBED_LATENCY,
+    GEMINI_API_KEY,
+    GEMINI_EMBED_MODEL,
+)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class FakeEmbeddings:
+    """Deterministic, offline stand-in for GoogleGenerativeAIEmbeddings.
+
+    Uses signed feature hashing over lowercased words, so texts sharing
+    vocabulary land close together and retrieval benchmarks stay meaningful.
+    """
+
+    def __init__(self, dim: int = FAKE_EMBED_DIM, latency: float = FAKE_EMBED_LATENCY):
+        self.dim = dim
+        self.latency = latency
+        self.model = "fake"
+
+    def _vector(self, text: str) -> list[float]:
+        vec = [0.0] * self.dim
+        for word in _WORD_RE.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vec[value % self.dim] += 1.0 if value & (1 << 63) else -1.0
+
+        norm = math.sqrt(sum(v * v for v in vec))
+        if not norm:
+            vec[0] = 1.0
+            return vec
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._vector(text)
+
+
+@lru_cache(maxsize=None)
+def get_embeddings(task_type: str, cached: bool = EMBEDDING_CACHE_ENABLED):
+    """One client per task type, built on first use (the Gemini SDK is slow to import)."""
+    if EMBEDDER_BACKEND == "fake":
+        embedder = FakeEmbeddings()
+        model = f"fake-{embedder.dim}"
+
+    elif EMBEDDER_BACKEND == "gemini":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        embedder = GoogleGenerativeAIEmbeddings(
+            model=GEMINI_EMBED_MODEL,
+            google_api_key=GEMINI_API_KEY,
+            task_type=task_type,
+        )
+        model = GEMINI_EMBED_MODEL
+
+    else:
+        raise ValueError(f"Unknown embedder backend: {EMBEDDER_BACKEND}")
+
+    if not cached:
+        return embedder
+
+    from app.core.embedding_cache import CachedEmbeddings, get_embedding_cache
+
+    return CachedEmbeddings(embedder, get_embedding_cache(), model, task_type)
@@ -0,0 +1,74 @@
+import asyncio
+import hashlib
+import time
+from functools import lru_cache
+
+from app.core.config import (
+    FAKE_LLM_LATENCY,
+    FAKE_LLM_TOKEN_LATENCY,
+    GEMINI_API_KEY,
+    GEMINI_LLM_MODEL,
+    LLM_BACKEND,
+)
+
+_FAKE_VOCAB = (
+    "strength speed athletes coach training program tempo squat sprint recovery "
+    "volume intensity power aerobic mobility progression week session load"
+).split()
+
+
+class FakeChunk:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeLLM:
+    """Offline stand-in for ChatGoogleGenerativeAI with a fixed time-to-first-token
+    and per-token delay, so the chat service can be load-tested without Gemini."""
+
+    def __init__(
+        self,
+        latency: float = FAKE_LLM_LATENCY,
+        token_latency: float = FAKE_LLM_TOKEN_LATENCY,
+        max_tokens: int = 64,
+    ):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.max_tokens = max_tokens
+
+    def _tokens(self, messages) -> list[str]:
+        seed = hashlib.sha1(repr(messages).encode("utf-8")).digest()
+        return [_FAKE_VOCAB[b % len(_FAKE_VOCAB)] for b in (seed * 4)[:self.max_tokens]]
+
+    async def astream(self, messages):
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(messages):
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield FakeChunk(token + " ")
+
+    def invoke(self, messages) -> FakeChunk:
+        tokens = self._tokens(messages)
+        time.sleep(self.latency + self.token_latency * len(tokens))
+        return FakeChunk(" ".join(tokens) + " ")
+
+    async def ainvoke(self, messages) -> FakeChunk:
+        parts = [chunk.content async for chunk in self.astream(messages)]
+        return FakeChunk("".join(parts))
+
+
+@lru_cache(maxsize=None)
+def get_llm():
+    if LLM_BACKEND == "fake":
+        return FakeLLM()
+
+    if LLM_BACKEND != "gemini":
+        raise ValueError(f"Unknown LLM backend: {LLM_BACKEND}")
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=GEMINI_LLM_MODEL,
+        google_api_key=GEMINI_API_KEY,
+        temperature=0.2,
+    )
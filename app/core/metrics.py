@@ -0,0 +1,338 @@
+import json
+import logging
+import math
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import ContextDecorator, contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds; spans an HTTP round trip up to a full episode transcription
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+RATIO_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+PROFILE_INTERVAL = 0.005
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self) -> list[tuple[dict, float]]:
+        with self._lock:
+            return [(dict(zip(self.labels, key)), value) for key, value in sorted(self._values.items())]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple = DEFAULT_BUCKETS, stage: str | None = None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # What the profiler calls time spent in this histogram's timers
+        self.stage = stage or name
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        i = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels) -> "timer":
+        return timer(self, **labels)
+
+    def samples(self) -> list[tuple[dict, list[int], float, int]]:
+        with self._lock:
+            return [
+                (dict(zip(self.labels, key)), list(counts), total, count)
+                for key, (counts, total, count) in sorted(self._values.items())
+            ]
+
+    def quantile(self, counts: list[int], count: int, q: float) -> float:
+        """Quantile estimate by linear interpolation inside the bucket, as Prometheus does."""
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(counts):
+            if seen + n >= rank and n:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return 0.0
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def _get(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already registered as a {type(metric).__name__}")
+            return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple = DEFAULT_BUCKETS, stage: str | None = None) -> Histogram:
+        return self._get(Histogram, name, help, labels, buckets, stage)
+
+    def metrics(self) -> list:
+        with self._lock:
+            return [self._metrics[name] for name in sorted(self._metrics)]
+
+    def reset(self):
+        for metric in self.metrics():
+            metric.reset()
+        self.started = time.time()
+
+
+_registry = MetricsRegistry()
+
+
+def counter(name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+    return _registry.counter(name, help, labels)
+
+
+def histogram(name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple = DEFAULT_BUCKETS, stage: str | None = None) -> Histogram:
+    return _registry.histogram(name, help, labels, buckets, stage)
+
+
+def reset_metrics():
+    _registry.reset()
+
+
+# --- stage tracking (shared by timers and the sampling profiler) ---
+
+# thread id -> stack of stage names currently being timed on that thread; only
+# threads inside a timer have an entry
+_stages: dict[int, list[str]] = {}
+
+
+def current_stage(thread_id: int | None = None) -> str | None:
+    stack = _stages.get(threading.get_ident() if thread_id is None else thread_id)
+    return stack[-1] if stack else None
+
+
+class timer(ContextDecorator):
+    """Times a block (or decorated function) into a histogram.
+
+    While it runs, the thread is marked as working on the histogram's stage
+    (or its `stage` label), which is how the sampling profiler attributes time.
+    """
+
+    def __init__(self, hist: Histogram, **labels):
+        self.hist = hist
+        self.labels = labels
+        self.stage = labels.get("stage") or hist.stage
+        self.seconds = None
+
+    def _recreate_cm(self):
+        # A fresh instance per call keeps the decorator thread-safe
+        return timer(self.hist, **self.labels)
+
+    def __enter__(self):
+        _stages.setdefault(threading.get_ident(), []).append(self.stage)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._start
+        self.hist.observe(self.seconds, **self.labels)
+        thread_id = threading.get_ident()
+        stack = _stages.get(thread_id)
+        if stack:
+            stack.pop()
+        if not stack:
+            # Short-lived pool threads would otherwise leave an entry each, and a
+            # recycled thread id would inherit it
+            _stages.pop(thread_id, None)
+        return False
+
+
+# --- exports ---
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict, extra: dict | None = None) -> str:
+    labels = {**labels, **(extra or {})}
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render_prometheus() -> str:
+    """Every metric in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in _registry.metrics():
+        kind = "counter" if isinstance(metric, Counter) else "histogram"
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {kind}")
+
+        if isinstance(metric, Counter):
+            for labels, value in metric.samples():
+                lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(value)}")
+            continue
+
+        for labels, counts, total, count in metric.samples():
+            cumulative = 0
+            for bound, n in zip((*metric.buckets, math.inf), counts):
+                cumulative += n
+                le = _format_value(bound)
+                lines.append(f"{metric.name}_bucket{_format_labels(labels, {'le': le})} {cumulative}")
+            lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{metric.name}_count{_format_labels(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
+
+
+def summary() -> dict:
+    """Totals per counter and count/mean/p50/p95 per histogram, keyed by label values."""
+    out = {
+        "started_at": datetime.fromtimestamp(_registry.started, timezone.utc).isoformat(),
+        "elapsed_s": round(time.time() - _registry.started, 3),
+        "counters": {},
+        "histograms": {},
+    }
+    for metric in _registry.metrics():
+        if isinstance(metric, Counter):
+            values = {",".join(labels.values()) or "_": value for labels, value in metric.samples()}
+            if values:
+                out["counters"][metric.name] = values
+            continue
+
+        values = {}
+        for labels, counts, total, count in metric.samples():
+            values[",".join(labels.values()) or "_"] = {
+                "count": count,
+                "sum": round(total, 4),
+                "mean": round(total / count, 4) if count else 0.0,
+                "p50": round(metric.quantile(counts, count, 0.5), 4),
+                "p95": round(metric.quantile(counts, count, 0.95), 4),
+            }
+        if values:
+            out["histograms"][metric.name] = values
+    return out
+
+
+def write_summary(path: Path, **extra) -> Path:
+    """Write `summary()` (plus `extra` fields) as JSON, e.g. one file per pipeline run."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({**summary(), **extra}, f, indent=2)
+    return path
+
+
+# --- sampling profiler ---
+
+class SamplingProfiler:
+    """Samples every thread's stack at a fixed interval from a background thread.
+
+    Each sample is attributed to the stage the thread is timing (see `timer`),
+    so the report says which stage time goes to and which frames within it.
+    Output is the "collapsed stack" format flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = _Tally()
+        self.stages = _Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stage = current_stage(thread_id)
+                if stage is None:
+                    # Idle pool threads and the main thread waiting on them
+                    continue
+
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{Path(code.co_filename).stem}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join([stage, *reversed(names)])] += 1
+                self.stages[stage] += 1
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def report(self, top: int = 10) -> str:
+        total = sum(self.stages.values()) or 1
+        return " | ".join(
+            f"{stage}={count * 100 / total:.0f}%" for stage, count in self.stages.most_common(top)
+        )
+
+
+@contextmanager
+def profiling(path: Path | None = None, interval: float = PROFILE_INTERVAL):
+    """Run the sampling profiler around a block; writes collapsed stacks to `path`."""
+    profiler = SamplingProfiler(interval).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        if path is not None:
+            profiler.write(path)
+        logger.info(f"[PROFILE] {sum(profiler.stages.values())} samples | {profiler.report()}")
@@ -0,0 +1,137 @@
+import atexit
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from app.core.config import EMBEDDING_PATH
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class VectorStoreManager:
+    """Opens the persistent Chroma client once and hands out one store per collection.
+
+    Reads through the returned handles are safe from any thread; writers should
+    hold `write_lock(name)`, since Chroma's SQLite segment has a single writer.
+    chromadb itself is only imported when the first store is opened.
+    """
+
+    def __init__(self, path=EMBEDDING_PATH):
+        self.path = path
+        self._client = None
+        self._stores = {}
+        self._write_locks = {}
+        self._lock = threading.Lock()
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                import chromadb
+
+                self.path.mkdir(parents=True, exist_ok=True)
+                self._client = chromadb.PersistentClient(path=str(self.path))
+            return self._client
+
+    def get(self, collection_name: str, create: bool = True) -> "Chroma":
+        """The store for `collection_name`. With `create` False a missing
+        collection raises chromadb's NotFoundError instead of being created."""
+        store = self._stores.get(collection_name)
+        if store is not None:
+            return store
+
+        client = self.client()
+        if not create:
+            client.get_collection(collection_name)
+        with self._lock:
+            store = self._stores.get(collection_name)
+            if store is None:
+                from langchain_chroma import Chroma
+
+                # Vectors are always computed by us and passed in explicitly
+                store = Chroma(
+                    client=client,
+                    collection_name=collection_name,
+                    embedding_function=None,
+                    collection_metadata={"hnsw:space": "cosine"},
+                )
+                self._stores[collection_name] = store
+                self._write_locks[collection_name] = threading.Lock()
+            return store
+
+    def exists(self, collection_name: str) -> bool:
+        if collection_name in self._stores:
+            return True
+        from chromadb.errors import NotFoundError
+
+        try:
+            self.client().get_collection(collection_name)
+        except NotFoundError:
+            return False
+        return True
+
+    def write_lock(self, collection_name: str) -> threading.Lock:
+        self.get(collection_name)
+        return self._write_locks[collection_name]
+
+    def warm(self, collection_names):
+        for name in collection_names:
+            start = time.perf_counter()
+            collection = self.get(name)._collection
+
+            count = collection.count()
+            if count:
+                # A real query pulls the HNSW segment into memory before the first user does
+                sample = collection.peek(1)["embeddings"]
+                collection.query(query_embeddings=[list(sample[0])], n_results=1, include=[])
+
+            logger.info(f"[WARM] {name} | vectors={count} | {time.perf_counter() - start:.2f}s")
+
+    def close(self):
+        with self._lock:
+            self._stores.clear()
+            self._write_locks.clear()
+            if self._client is not None:
+                self._client.clear_system_cache()
+                self._client = None
+
+
+_manager = VectorStoreManager()
+atexit.register(_manager.close)
+
+
+def get_vectorstore(collection_name: str, create: bool = True) -> "Chroma":
+    # The query path passes create=False, so a request can never add a collection
+    return _manager.get(collection_name, create)
+
+
+def has_vectorstore(collection_name: str) -> bool:
+    return _manager.exists(collection_name)
+
+
+def iter_collection(collection, include: list[str], page_size: int = 1000, limit: int | None = None):
+    """Page through a Chroma collection, yielding `get` results of up to `page_size` rows."""
+    total = collection.count() if limit is None else limit
+    offset = 0
+    while offset < total:
+        page = collection.get(include=include, limit=min(page_size, total - offset), offset=offset)
+        if not page["ids"]:
+            break
+        yield page
+        offset += len(page["ids"])
+
+
+def get_write_lock(collection_name: str) -> threading.Lock:
+    return _manager.write_lock(collection_name)
+
+
+def warm_vectorstores(collection_names):
+    _manager.warm(collection_names)
+
+
+def close_vectorstores():
+    _manager.close()
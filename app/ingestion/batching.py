@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app.core.metrics import SIZE_BUCKETS, counter, histogram
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# batchEmbedContents accepts at most 100 texts per request
+EMBED_BATCH_SIZE = 100
+EMBED_BATCH_TOKENS = 20000
+EMBED_CONCURRENCY = 4
+MAX_RETRIES = 5
+
+BACKOFF_INITIAL = 1.0
+BACKOFF_MAX = 60.0
+
+# `source` is the collection being ingested, or "queries" for retrieval
+EMBED_BATCH_SECONDS = histogram("rag_embed_batch_seconds", "Latency of one embedding request", ("source",), stage="embed")
+EMBED_BATCH_TEXTS = histogram("rag_embed_batch_size", "Texts per embedding request", ("source",), SIZE_BUCKETS)
+EMBED_TOKENS = counter("rag_embed_tokens_total", "Estimated tokens sent for embedding", ("source",))
+EMBED_RETRIES = counter("rag_embed_retries_total", "Embedding request retries", ("source", "reason"))
+VECTOR_WRITE_SECONDS = histogram("rag_vector_write_seconds", "Chroma upsert time per batch", ("collection",), stage="vector_write")
+EMBEDDED_CHUNKS = counter("rag_embedded_chunks_total", "Chunks embedded and stored, by outcome", ("collection", "result"))
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 chars per token is close enough for request sizing, and avoids
+    # a full tokenizer pass over every chunk
+    return len(text) // 4 + 1
+
+
+def make_batches(
+    chunks: list[dict],
+    max_size: int = EMBED_BATCH_SIZE,
+    max_tokens: int = EMBED_BATCH_TOKENS,
+) -> list[list[dict]]:
+    batches = []
+    current = []
+    current_tokens = 0
+
+    for chunk in chunks:
+        tokens = estimate_tokens(chunk["text"])
+        if current and (len(current) >= max_size or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+
+        current.append(chunk)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+
+def is_rate_limited(exc: Exception) -> bool:
+    msg = str(exc).lower()
+    return any(s in msg for s in ("429", "resource_exhausted", "rate limit", "quota"))
+
+
+class AdaptiveBackoff:
+    """Delay shared by all workers: doubles on rate limits, halves on success."""
+
+    def __init__(self, initial: float = BACKOFF_INITIAL, maximum: float = BACKOFF_MAX):
+        self.initial = initial
+        self.maximum = maximum
+        self.delay = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            delay = self.delay
+        if delay:
+            time.sleep(delay)
+
+    def on_success(self):
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > self.initial / 4 else 0.0
+
+    def on_rate_limit(self):
+        with self._lock:
+            self.delay = min(max(self.delay * 2, self.initial), self.maximum)
+
+
+def chunk_metadata(chunk: dict) -> dict:
+    metadata = {
+        "parent_id": chunk["parent_id"],
+        "source_type": chunk["source_type"],
+        "title": chunk["title"],
+        "source_url": chunk["source_url"],
+    }
+    # Chroma rejects None values, and only numbers support range filters
+    for key in ("published_ts", "start_s", "end_s", "timestamp_url"):
+        if chunk.get(key) is not None:
+            metadata[key] = chunk[key]
+    return metadata
+
+
+def embed_texts(embedder, texts: list[str], backoff: AdaptiveBackoff, label: str) -> list[list[float]]:
+    """One `embed_documents` request, retried with the shared backoff on failure."""
+    retries = 0
+    EMBED_BATCH_TEXTS.observe(len(texts), source=label)
+    EMBED_TOKENS.inc(sum(estimate_tokens(t) for t in texts), source=label)
+
+    while True:
+        backoff.wait()
+        try:
+            with EMBED_BATCH_SECONDS.time(source=label):
+                vectors = embedder.embed_documents(texts)
+            backoff.on_success()
+            return vectors
+
+        except Exception as e:
+            retries += 1
+            if retries >= MAX_RETRIES:
+                raise
+
+            rate_limited = is_rate_limited(e)
+            EMBED_RETRIES.inc(source=label, reason="rate_limit" if rate_limited else "error")
+            if rate_limited:
+                backoff.on_rate_limit()
+                logger.warning(f"[RATE LIMIT] {label} | delay={backoff.delay:.1f}s ({retries}/{MAX_RETRIES})")
+            else:
+                logger.error(f"[RETRY] {label} | batch of {len(texts)} ({retries}/{MAX_RETRIES} | {e})")
+                time.sleep(2 * retries)
+
+
+def ingest_batches(
+    collection,
+    embedder,
+    chunks: list[dict],
+    *,
+    label: str = "",
+    concurrency: int = EMBED_CONCURRENCY,
+    max_size: int = EMBED_BATCH_SIZE,
+    max_tokens: int = EMBED_BATCH_TOKENS,
+    write_lock=None,
+    written: list | None = None,
+) -> tuple[int, int]:
+    """Embed chunks in bounded batches and upsert each batch in one Chroma write.
+
+    `collection` is a raw chromadb collection; `embedder` is anything with
+    `embed_documents`. Returns (embedded, failed) chunk counts. Chunks whose
+    batch was upserted are appended to `written`, when given.
+    """
+    batches = make_batches(chunks, max_size=max_size, max_tokens=max_tokens)
+    backoff = AdaptiveBackoff()
+    write_lock = write_lock or threading.Lock()
+
+    success = 0
+    failed = 0
+
+    def run(batch: list[dict]) -> int:
+        vectors = embed_texts(embedder, [c["text"] for c in batch], backoff, label)
+        # Chroma's SQLite writer is single-threaded; serialize the bulk writes
+        with write_lock, VECTOR_WRITE_SECONDS.time(collection=label):
+            collection.upsert(
+                ids=[c["chunk_id"] for c in batch],
+                embeddings=vectors,
+                documents=[c["text"] for c in batch],
+                metadatas=[chunk_metadata(c) for c in batch],
+            )
+        return len(batch)
+
+    logger.info(f"[BATCH] {label} | {len(chunks)} chunks in {len(batches)} batches | workers={concurrency}")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(run, batch): batch for batch in batches}
+        for done, future in enumerate(as_completed(futures), start=1):
+            batch = futures[future]
+            try:
+                success += future.result()
+                if written is not None:
+                    written.extend(batch)
+                logger.info(f"[EMBED] {label} | batch {done}/{len(batches)} | {success}/{len(chunks)}")
+            except Exception as e:
+                failed += len(batch)
+                logger.error(f"[FAIL] {label} | batch of {len(batch)} | {e}")
+
+    EMBEDDED_CHUNKS.inc(success, collection=label, result="ok")
+    EMBEDDED_CHUNKS.inc(failed, collection=label, result="failed")
+    return success, failed
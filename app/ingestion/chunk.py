@@ -1,17 +1,30 @@
 import json
 import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import hashlib
-from typing import List, Dict
-import tiktoken
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Dict
+import numpy as np
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from app.ingestion.token_splitter import TokenOffsetSplitter
 from app.core.config import (
-    BLOGS_CHUNKS_PATH,
-    PODCASTS_CHUNKS_PATH,
+    BLOGS_CHUNKS_DIR,
+    PODCASTS_CHUNKS_DIR,
     RAW_BLOGS_DIR,
     RAW_PODCASTS_DIR,
+    PODCAST_CHUNK_MODE,
+    SPLITTER_MODE,
 )
+from app.core.metrics import SIZE_BUCKETS, counter, histogram
+
+if TYPE_CHECKING:
+    import tiktoken
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -19,26 +32,83 @@ logger = logging.getLogger(__name__)
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 80
 
-_encoding = tiktoken.get_encoding("cl100k_base")
+# Part of every content hash, so changing the splitter re-chunks everything
+CHUNKER_VERSION = f"{SPLITTER_MODE}:{PODCAST_CHUNK_MODE}:{CHUNK_SIZE}:{CHUNK_OVERLAP}"
+CHUNK_WORKERS = os.cpu_count() or 1
+# Below this many changed documents a process pool costs more than it saves
+PARALLEL_MIN_DOCS = 8
+
+CHUNK_SECONDS = histogram("rag_chunk_seconds", "Splitting time per document", ("kind",), stage="chunk")
+CHUNKS_PER_DOC = histogram("rag_chunks_per_document", "Chunks produced per split document", ("kind",), SIZE_BUCKETS)
+CHUNK_DOCUMENTS = counter(
+    "rag_chunk_documents_total", "Raw documents seen by the chunker, by outcome "
+    "(rechunked, unchanged = same hash, skipped = same size/mtime, removed, failed)", ("kind", "result"),
+)
+
+SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+
+# The encoder and splitters are built on first use: loading the BPE ranks and
+# importing LangChain cost more than most processes spend chunking
+
+@lru_cache(maxsize=None)
+def get_encoding() -> "tiktoken.Encoding":
+    import tiktoken
+
+    return tiktoken.get_encoding("cl100k_base")
 
 def _token_len(text: str) -> int:
-    return len(_encoding.encode(text))
+    return len(get_encoding().encode(text))
 
-_splitter = RecursiveCharacterTextSplitter(
-    separators=["\n\n", "\n", ". ", " ", ""],
-    chunk_size=CHUNK_SIZE,
-    chunk_overlap=CHUNK_OVERLAP,
-    length_function=_token_len,
-)
+@lru_cache(maxsize=None)
+def recursive_splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        separators=SEPARATORS,
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=_token_len,
+    )
+
+@lru_cache(maxsize=None)
+def token_splitter() -> TokenOffsetSplitter:
+    return TokenOffsetSplitter(
+        separators=SEPARATORS,
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        encoding=get_encoding(),
+    )
+
+def split_pieces(text: str, mode: str = SPLITTER_MODE) -> list[str]:
+    if mode == "token":
+        try:
+            return token_splitter().split_text(text)
+        except ValueError:
+            logger.warning("[SPLIT] Text doesn't round-trip through tiktoken, using recursive splitter")
+    return recursive_splitter().split_text(text)
 
 def stable_chunk_id(parent_id: str, chunk_index: int, text: str) -> str:
     raw = f"{parent_id}:{chunk_index}:{text}".encode('utf-8')
     return hashlib.sha1(raw).hexdigest()
 
-def split_text(*, text: str, parent_id: str, source_type: str, title: str, source_url: str) -> List[Dict]:
+def published_timestamp(value: str | None) -> int | None:
+    # RSS dates are RFC 2822; anything we stamp ourselves is ISO 8601
+    if not value:
+        return None
+    try:
+        return int(parsedate_to_datetime(value).timestamp())
+    except (TypeError, ValueError):
+        pass
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        return None
+
+def split_text(*, text: str, parent_id: str, source_type: str, title: str, source_url: str, published_at: str | None = None) -> List[Dict]:
     chunks = []
+    published_ts = published_timestamp(published_at)
 
-    for chunk_index, chunk_text in enumerate(_splitter.split_text(text)):
+    for chunk_index, chunk_text in enumerate(split_pieces(text)):
         chunk_text = chunk_text.strip()
         if not chunk_text:
             continue
@@ -50,78 +120,364 @@ def split_text(*, text: str, parent_id: str, source_type: str, title: str, sourc
             "title": title,
             "source_url": source_url,
             "chunk_index": chunk_index,
+            "published_ts": published_ts,
             "text": chunk_text
         })
 
     return chunks
 
 
-def load_raw_items(raw_dir: Path) -> list[dict]:
-    items = []
-
-    for file in raw_dir.glob("*.json"):
-        try:
-            with open(file, "r", encoding="utf-8") as f:
-                items.append(json.load(f))
-        except Exception as e:
-            logger.error(f"[ERROR] Failed reading {file.name}: {e}")
-    
-    return items
+def timestamp_url(url: str, seconds: float) -> str:
+    # Media fragment: players that honour #t= open at the passage
+    return f"{url}#t={int(seconds)}" if url else ""
 
 
-def save_chunks(chunks: list[dict], output_path: Path):
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+def pack_segments(text: str, segments: dict) -> list[tuple[int, int, float, float, bool]]:
+    """Group whole transcript segments into (char_start, char_end, start_s, end_s, oversized) spans.
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(chunks, f, indent=2, ensure_ascii=False)
+    `segments` is the columnar form saved by the transcriber. Segment token
+    counts come from one tokenization of the transcript, and packing follows
+    the same CHUNK_SIZE budget and CHUNK_OVERLAP carry-over as the text
+    splitters, only the boundaries are Whisper's.
+    """
+    char_starts = np.array(segments["offset"], dtype=np.int64)
+    # Each segment ends where the next one's joining space begins
+    char_ends = np.append(char_starts[1:] - 1, len(text))
+    token_starts = np.array(token_splitter().token_offsets(text), dtype=np.int64)
+    # A segment owns the tokens from its joining space (" word" is one token) to the next space
+    owned = np.append(np.maximum(char_starts - 1, 0), len(text))
+    owned[0] = 0
+    counts = np.diff(np.searchsorted(token_starts, owned))
+    starts, ends = segments["start"], segments["end"]
 
+    spans = []
+    window = []
+    total = 0
 
-def process_blogs():
-    logger.info("Processing blogs")
-    all_chunks = []
+    def emit():
+        first, last = window[0], window[-1]
+        spans.append((int(char_starts[first]), int(char_ends[last]), starts[first], ends[last], False))
 
-    for blog in load_raw_items(RAW_BLOGS_DIR):
-        text = blog.get("content", "").strip()
-        if not text:
+    for i, count in enumerate(counts.tolist()):
+        if count >= CHUNK_SIZE:
+            # A runaway segment (rare; Whisper caps them at 30s) is left for the text splitter
+            if window:
+                emit()
+            window, total = [], 0
+            spans.append((int(char_starts[i]), int(char_ends[i]), starts[i], ends[i], True))
             continue
 
-        all_chunks.extend(split_text(
-            text=text,
-            parent_id=blog["blog_id"],
-            source_type="blog",
-            title=blog.get("title", ""),
-            source_url=blog.get("url", "")
-        ))
+        if total + count > CHUNK_SIZE and window:
+            emit()
+            while total > CHUNK_OVERLAP or (total + count > CHUNK_SIZE and total > 0):
+                total -= counts[window.pop(0)]
 
-    save_chunks(all_chunks, BLOGS_CHUNKS_PATH)
-    logger.info(f"[DONE] Blog chunks: {len(all_chunks)}")
+        window.append(i)
+        total += count
 
+    if window:
+        emit()
+    return spans
 
-def process_podcasts():
-    logger.info("Processing podcasts")
-    all_chunks = []
 
-    for episode in load_raw_items(RAW_PODCASTS_DIR):
-        text = episode.get("transcript", "").strip()
-        if not text:
-            continue
+def split_segments(*, text: str, segments: dict, parent_id: str, source_type: str, title: str, source_url: str, published_at: str | None = None) -> List[Dict]:
+    chunks = []
+    published_ts = published_timestamp(published_at)
+
+    for char_start, char_end, start_s, end_s, oversized in pack_segments(text, segments):
+        span = text[char_start:char_end].strip()
+        pieces = split_pieces(span) if oversized else [span]
 
-        all_chunks.extend(split_text(
-            text=text,
+        for chunk_text in pieces:
+            chunk_index = len(chunks)
+            chunks.append({
+                "chunk_id": stable_chunk_id(parent_id, chunk_index, chunk_text),
+                "parent_id": parent_id,
+                "source_type": source_type,
+                "title": title,
+                "source_url": source_url,
+                "chunk_index": chunk_index,
+                "published_ts": published_ts,
+                "start_s": start_s,
+                "end_s": end_s,
+                "timestamp_url": timestamp_url(source_url, start_s),
+                "text": chunk_text
+            })
+
+    return chunks
+
+
+def chunk_blog(blog: dict) -> list[dict]:
+    text = blog.get("content", "").strip()
+    if not text:
+        return []
+
+    return split_text(
+        text=text,
+        parent_id=blog["blog_id"],
+        source_type="blog",
+        title=blog.get("title", ""),
+        source_url=blog.get("url", "")
+    )
+
+
+def chunk_episode(episode: dict) -> list[dict]:
+    text = episode.get("transcript", "").strip()
+    if not text:
+        return []
+
+    if PODCAST_CHUNK_MODE == "segments" and episode.get("segments"):
+        return split_segments(
+            text=episode["transcript"],
+            segments=episode["segments"],
             parent_id=episode["episode_id"],
             source_type="podcast",
             title=episode.get("title", ""),
-            source_url=episode.get("episode_url", "")
-        ))
+            source_url=episode.get("episode_url", ""),
+            published_at=episode.get("published_at"),
+        )
+
+    return split_text(
+        text=text,
+        parent_id=episode["episode_id"],
+        source_type="podcast",
+        title=episode.get("title", ""),
+        source_url=episode.get("episode_url", ""),
+        published_at=episode.get("published_at"),
+    )
+
+
+# kind -> (chunker, raw fields that determine its output, raw dir, shard dir)
+KINDS = {
+    "blogs": (chunk_blog, ("content", "title", "url"), RAW_BLOGS_DIR, BLOGS_CHUNKS_DIR),
+    "podcasts": (
+        chunk_episode,
+        ("transcript", "segments", "title", "episode_url", "published_at"),
+        RAW_PODCASTS_DIR,
+        PODCASTS_CHUNKS_DIR,
+    ),
+}
+
+
+def content_hash(kind: str, raw: dict) -> str:
+    # Only fields that reach the chunks; extracted_at and friends change on every fetch
+    fields = KINDS[kind][1]
+    payload = json.dumps([CHUNKER_VERSION] + [raw.get(f) for f in fields], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _manifest_path(chunks_dir: Path) -> Path:
+    return chunks_dir / "manifest.json"
+
+
+def load_manifest(chunks_dir: Path) -> dict:
+    path = _manifest_path(chunks_dir)
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(chunks_dir: Path, manifest: dict):
+    path = _manifest_path(chunks_dir)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
 
-    save_chunks(all_chunks, PODCASTS_CHUNKS_PATH)
-    logger.info(f"[DONE] Podcast chunks: {len(all_chunks)}")
+
+def _pending_path(chunks_dir: Path) -> Path:
+    return chunks_dir / "pending.json"
+
+
+def load_pending(chunks_dir: Path) -> tuple[list[str], list[str]] | None:
+    """(changed, removed) parent ids chunked since the last embed; None until an embed has recorded a baseline."""
+    path = _pending_path(chunks_dir)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        pending = json.load(f)
+    return pending["changed"], pending["removed"]
+
+
+def save_pending(chunks_dir: Path, changed, removed):
+    chunks_dir.mkdir(parents=True, exist_ok=True)
+    path = _pending_path(chunks_dir)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"changed": sorted(changed), "removed": sorted(removed)}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def add_pending(chunks_dir: Path, changed: list[str], removed: list[str]):
+    # Without a baseline the next embed syncs everything anyway, and will write one
+    pending = load_pending(chunks_dir)
+    if pending is None:
+        return
+    old_changed, old_removed = pending
+    save_pending(
+        chunks_dir,
+        (set(old_changed) - set(removed)) | set(changed),
+        (set(old_removed) - set(changed)) | set(removed),
+    )
+
+
+def write_shard(chunks_dir: Path, parent_id: str, chunks: list[dict]):
+    # One JSON line per chunk, replaced atomically so readers never see half a document
+    path = chunks_dir / f"{parent_id}.jsonl"
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(json.dumps(chunk, ensure_ascii=False))
+            f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def store_chunks(kind: str, parent_id: str, chunks: list[dict], raw: dict) -> dict:
+    """Write the shard for a document chunked in memory (the pipeline) and return its manifest entry.
+
+    The entry matches what process_kind records, so the next chunk run skips
+    the raw file and `python -m app embed` sees the same shards either way.
+    """
+    _, _, raw_dir, chunks_dir = KINDS[kind]
+    chunks_dir.mkdir(parents=True, exist_ok=True)
+    write_shard(chunks_dir, parent_id, chunks)
+    stat = (raw_dir / f"{parent_id}.json").stat()
+    return {
+        "hash": content_hash(kind, raw),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "chunks": len(chunks),
+    }
+
+
+def update_manifest(kind: str, entries: dict[str, dict]):
+    if not entries:
+        return
+    chunks_dir = KINDS[kind][3]
+    manifest = load_manifest(chunks_dir)
+    manifest.update(entries)
+    save_manifest(chunks_dir, manifest)
+
+
+def record_chunking(kind: str, count: int, seconds: float | None = None):
+    # `seconds` is None when the caller timed the split with CHUNK_SECONDS.time()
+    if seconds is not None:
+        CHUNK_SECONDS.observe(seconds, kind=kind)
+    CHUNKS_PER_DOC.observe(count, kind=kind)
+    CHUNK_DOCUMENTS.inc(kind=kind, result="rechunked")
+
+
+def _chunk_file(kind: str, path: str, known_hash: str | None) -> tuple[str, str | None, int | None, float]:
+    """Re-split one raw document if its content hash changed.
+
+    Runs in a worker process. Returns (parent_id, hash, chunk count, seconds);
+    the count is None when the content was unchanged and the hash None when
+    unreadable. Metrics are recorded by the parent from the return value.
+    """
+    chunker, _, _, chunks_dir = KINDS[kind]
+    parent_id = Path(path).stem
+    start = time.perf_counter()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except Exception as e:
+        logger.error(f"[ERROR] Failed reading {Path(path).name}: {e}")
+        return parent_id, None, None, 0.0
+
+    digest = content_hash(kind, raw)
+    if digest == known_hash:
+        return parent_id, digest, None, 0.0
+
+    chunks = chunker(raw)
+    write_shard(chunks_dir, parent_id, chunks)
+    return parent_id, digest, len(chunks), time.perf_counter() - start
+
+
+def process_kind(kind: str, workers: int = CHUNK_WORKERS) -> tuple[list[str], list[str]]:
+    """Bring the chunk shards for `kind` in line with its raw documents.
+
+    A raw file whose size and mtime match the manifest is skipped without being
+    opened; the rest are hashed, and only real content changes are re-split.
+    Returns (changed, removed) parent ids.
+    """
+    _, _, raw_dir, chunks_dir = KINDS[kind]
+    chunks_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(chunks_dir)
+
+    candidates = []
+    seen = set()
+    for entry in os.scandir(raw_dir) if raw_dir.exists() else []:
+        if not entry.name.endswith(".json"):
+            continue
+        parent_id = entry.name[:-len(".json")]
+        seen.add(parent_id)
+        stat = entry.stat()
+        known = manifest.get(parent_id)
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            continue
+        candidates.append((entry.path, stat, (known or {}).get("hash")))
+
+    changed = []
+    removed = [parent_id for parent_id in manifest if parent_id not in seen]
+    for parent_id in removed:
+        (chunks_dir / f"{parent_id}.jsonl").unlink(missing_ok=True)
+        del manifest[parent_id]
+
+    jobs = [(kind, path, known_hash) for path, _, known_hash in candidates]
+    if len(jobs) >= PARALLEL_MIN_DOCS and workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as pool:
+            results = list(pool.map(_chunk_file, *zip(*jobs), chunksize=4))
+    else:
+        results = [_chunk_file(*job) for job in jobs]
+
+    CHUNK_DOCUMENTS.inc(len(seen) - len(candidates), kind=kind, result="skipped")
+    CHUNK_DOCUMENTS.inc(len(removed), kind=kind, result="removed")
+
+    total = 0
+    for (_, stat, _), (parent_id, digest, count, seconds) in zip(candidates, results):
+        if digest is None:
+            CHUNK_DOCUMENTS.inc(kind=kind, result="failed")
+            continue
+        if count is None:
+            CHUNK_DOCUMENTS.inc(kind=kind, result="unchanged")
+        else:
+            record_chunking(kind, count, seconds)
+            changed.append(parent_id)
+            total += count
+        manifest[parent_id] = {
+            "hash": digest,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "chunks": count if count is not None else manifest[parent_id]["chunks"],
+        }
+
+    save_manifest(chunks_dir, manifest)
+    # Kept for `python -m app embed`, which may run in a later process
+    add_pending(chunks_dir, changed, removed)
+    logger.info(
+        f"[DONE] {kind} | scanned: {len(candidates)}/{len(seen)} | "
+        f"re-chunked: {len(changed)} ({total} chunks) | removed: {len(removed)}"
+    )
+    return changed, removed
+
+
+def process_blogs(workers: int = CHUNK_WORKERS) -> tuple[list[str], list[str]]:
+    logger.info("Processing blogs")
+    return process_kind("blogs", workers)
+
+
+def process_podcasts(workers: int = CHUNK_WORKERS) -> tuple[list[str], list[str]]:
+    logger.info("Processing podcasts")
+    return process_kind("podcasts", workers)
 
 
-def chunker():
-    process_blogs()
-    process_podcasts()
+def chunker() -> dict[str, tuple[list[str], list[str]]]:
+    return {"blogs": process_blogs(), "podcasts": process_podcasts()}
 
 
 if __name__ == "__main__":
-    chunker()
\ No newline at end of file
+    chunker()
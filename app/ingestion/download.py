@@ -0,0 +1,179 @@
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from app.ingestion.fetch import get_session
+from app.core.config import AUDIO_MAX_BYTES, AUDIO_MIN_FREE_BYTES, PODCASTS_AUDIO_PATH
+from app.core.metrics import counter, histogram
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_TIMEOUT = 60
+SPACE_POLL_INTERVAL = 5
+# How long a download waits for the transcriber to free space before giving up
+SPACE_WAIT_TIMEOUT = 600
+
+AUDIO_HEADERS = {
+    "Accept": "*/*",
+    "Referer": "https://www.buzzsprout.com/",
+}
+
+
+DOWNLOAD_SECONDS = histogram("rag_download_seconds", "Audio download time per episode", stage="download")
+DOWNLOAD_BYTES = counter("rag_download_bytes_total", "Audio bytes written to disk")
+DOWNLOADS = counter("rag_downloads_total", "Audio downloads by outcome", ("result",))
+SPACE_WAIT_SECONDS = histogram("rag_download_space_wait_seconds", "Time downloads spent waiting for the disk budget", stage="download_wait")
+
+
+class DownloadError(Exception):
+    pass
+
+
+class DiskBudgetExceeded(DownloadError):
+    pass
+
+
+def audio_dir_bytes(audio_dir: Path = PODCASTS_AUDIO_PATH) -> int:
+    if not audio_dir.exists():
+        return 0
+    return sum(entry.stat().st_size for entry in os.scandir(audio_dir) if entry.is_file())
+
+
+def has_space(audio_dir: Path = PODCASTS_AUDIO_PATH) -> bool:
+    if audio_dir_bytes(audio_dir) >= AUDIO_MAX_BYTES:
+        return False
+    return shutil.disk_usage(audio_dir).free >= AUDIO_MIN_FREE_BYTES
+
+
+def wait_for_space(timeout: float | None = SPACE_WAIT_TIMEOUT, audio_dir: Path = PODCASTS_AUDIO_PATH):
+    """Block until the audio directory is under budget and the disk has headroom.
+
+    The check runs before each download starts, so the budget can be overshot
+    by at most the downloads already in flight. Space is freed by the
+    transcriber deleting audio it has finished with, possibly in another process,
+    hence polling.
+    """
+    if has_space(audio_dir):
+        return
+
+    with SPACE_WAIT_SECONDS.time():
+        _wait_for_space(timeout, audio_dir)
+
+
+def _wait_for_space(timeout: float | None, audio_dir: Path):
+    deadline = None if timeout is None else time.monotonic() + timeout
+    logged = False
+    while not has_space(audio_dir):
+        if deadline is not None and time.monotonic() >= deadline:
+            raise DiskBudgetExceeded(
+                f"audio dir at {audio_dir_bytes(audio_dir) / 1e9:.1f}GB "
+                f"(budget {AUDIO_MAX_BYTES / 1e9:.1f}GB, min free {AUDIO_MIN_FREE_BYTES / 1e9:.1f}GB)"
+            )
+        if not logged:
+            logger.info("[BACKPRESSURE] Audio disk budget reached, waiting for space")
+            logged = True
+        time.sleep(SPACE_POLL_INTERVAL)
+
+
+def _content_range_total(value: str | None) -> int | None:
+    # "bytes 1000-1999/5000" -> 5000 ("*" when the server doesn't know)
+    if not value or "/" not in value:
+        return None
+    total = value.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
+
+
+def download_audio(audio_url: str, episode_id: str, space_timeout: float | None = SPACE_WAIT_TIMEOUT) -> Path:
+    """Download an episode to `<id>.mp3`, resuming a previous partial download.
+
+    Bytes go to `<id>.mp3.part` and are renamed into place only once the size
+    matches what the server promised, so an existing `.mp3` is always complete.
+    """
+    PODCASTS_AUDIO_PATH.mkdir(parents=True, exist_ok=True)
+    audio_path = PODCASTS_AUDIO_PATH / f"{episode_id}.mp3"
+    part_path = PODCASTS_AUDIO_PATH / f"{episode_id}.mp3.part"
+
+    if audio_path.exists():
+        logger.info(f"[SKIP] Audio already exists: {audio_path}")
+        DOWNLOADS.inc(result="skipped")
+        return audio_path
+
+    try:
+        with DOWNLOAD_SECONDS.time():
+            _download(audio_url, episode_id, part_path, space_timeout)
+    except DiskBudgetExceeded:
+        DOWNLOADS.inc(result="deferred")
+        raise
+    except Exception:
+        DOWNLOADS.inc(result="failed")
+        raise
+
+    os.replace(part_path, audio_path)
+    DOWNLOADS.inc(result="ok")
+    return audio_path
+
+
+def _download(audio_url: str, episode_id: str, part_path: Path, space_timeout: float | None):
+    offset = part_path.stat().st_size if part_path.exists() else 0
+    if not offset:
+        wait_for_space(space_timeout)
+
+    headers = dict(AUDIO_HEADERS)
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+
+    logger.info(f"[DOWNLOAD] {episode_id}" + (f" | resuming at {offset} bytes" if offset else ""))
+
+    with get_session().get(audio_url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+        if r.status_code == 416:
+            # The partial file doesn't fit the current object; start over next attempt
+            part_path.unlink(missing_ok=True)
+            raise DownloadError(f"range {offset}- not satisfiable for {episode_id}")
+        r.raise_for_status()
+
+        if r.status_code == 206:
+            expected = _content_range_total(r.headers.get("Content-Range"))
+            mode = "ab"
+        else:
+            # Server ignored the Range header and sent the whole file
+            length = r.headers.get("Content-Length")
+            expected = int(length) if length and length.isdigit() else None
+            mode = "wb"
+
+        with open(part_path, mode) as f:
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+                DOWNLOAD_BYTES.inc(len(chunk))
+
+    size = part_path.stat().st_size
+    if expected is not None and size != expected:
+        if size > expected:
+            part_path.unlink(missing_ok=True)
+        # A short file stays as .part and resumes on the next attempt
+        raise DownloadError(f"{episode_id}: got {size} of {expected} bytes")
+
+
+def download_many(jobs: list[tuple[str, str]], workers: int = DOWNLOAD_WORKERS, space_timeout: float | None = 0):
+    """Download (episode_id, audio_url) jobs concurrently on the shared session.
+
+    Yields (episode_id, path, error) as each finishes. With the default
+    `space_timeout=0`, jobs that start once the disk budget is full fail fast
+    with DiskBudgetExceeded instead of waiting for a transcriber to catch up.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(download_audio, audio_url, episode_id, space_timeout): episode_id
+            for episode_id, audio_url in jobs
+        }
+        for future in as_completed(futures):
+            episode_id = futures[future]
+            try:
+                yield episode_id, future.result(), None
+            except Exception as e:
+                yield episode_id, None, e
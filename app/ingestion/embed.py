@@ -1,116 +1,304 @@
 import json
 import logging
 from pathlib import Path
-import time
-
-from langchain_chroma import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-
+from typing import Iterable, Iterator
 
+from app.core.cache import bump_collection_version
+from app.core.embeddings import get_embeddings
+from app.core.vectorstore import get_vectorstore, get_write_lock, iter_collection
+from app.ingestion.batching import ingest_batches
+from app.ingestion.chunk import load_manifest, load_pending, published_timestamp, save_pending
+from app.ingestion.storage import KINDS, get_registry
+from app.retrieval.lexical import ensure_lexical_index, remove_from_lexical_index, update_lexical_index
+from app.retrieval.quantized import refresh_quantized_index
 from app.core.config import (
-    BLOGS_CHUNKS_PATH,
-    PODCASTS_CHUNKS_PATH,
-    GEMINI_EMBED_MODEL,
-    GEMINI_API_KEY,
-    EMBEDDING_PATH
+    BLOGS_CHUNKS_DIR,
+    PODCASTS_CHUNKS_DIR,
 )
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-MAX_RETRIES = 3
+# Chunks handed to ingest_chunks at a time, so memory stays flat as the corpus grows
+INGEST_GROUP_SIZE = 5000
+RECONCILE_PAGE_SIZE = 1000
+DELETE_BATCH_SIZE = 1000
+# A full reconcile that would delete more than this share of the stored chunks is refused without `force`
+RECONCILE_MAX_DELETE_SHARE = 0.5
 
-embeddings = GoogleGenerativeAIEmbeddings(
-    model=GEMINI_EMBED_MODEL,
-    google_api_key=GEMINI_API_KEY,
-    task_type="retrieval_document"
-)
 
-def get_vectorstore(collection_name: str) -> Chroma:
-    return Chroma(
-        collection_name=collection_name,
-        embedding_function=embeddings,
-        persist_directory=str(EMBEDDING_PATH),
-        collection_metadata={"hnsw:space": "cosine"}
-    )
+def load_chunks(chunks_dir: Path, parent_ids: Iterable[str] | None = None) -> Iterator[dict]:
+    """Stream chunks from the per-document JSONL shards, optionally only some parents."""
+    if not chunks_dir.exists():
+        logger.warning(f"[SKIP] Chunks directory not found: {chunks_dir}")
+        return
 
-def load_chunks(path: Path) -> list[dict]:
-    if not path.exists():
-        logger.warning(f"[SKIP] Chunks file not found: {path}")
-        return []
-    
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    if parent_ids is None:
+        paths = sorted(chunks_dir.glob("*.jsonl"))
+    else:
+        paths = [chunks_dir / f"{parent_id}.jsonl" for parent_id in parent_ids]
 
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+        except FileNotFoundError:
+            logger.warning(f"[SKIP] Missing shard: {path.name}")
 
-def ingest_chunks(chunks: list[dict], collection_name: str):
+
+def grouped(chunks: Iterable[dict], size: int = INGEST_GROUP_SIZE) -> Iterator[list[dict]]:
+    group = []
+    for chunk in chunks:
+        group.append(chunk)
+        if len(group) >= size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+def existing_chunk_ids(collection, chunk_ids: list[str], page_size: int = 1000) -> set[str]:
+    # Look up only the candidate IDs, without pulling documents or embeddings
+    found = set()
+    for i in range(0, len(chunk_ids), page_size):
+        found.update(collection.get(ids=chunk_ids[i:i + page_size], include=[])["ids"])
+    return found
+
+
+def ingest_chunks(chunks: list[dict], collection_name: str, embedder=None) -> tuple[int, int]:
     if not chunks:
         logger.info(f"[SKIP] No chunks for {collection_name}")
-        return
+        return 0, 0
     
-    vectorstore = get_vectorstore(collection_name, embeddings)
+    vectorstore = get_vectorstore(collection_name)
 
-    existing = vectorstore.get()
+    existing_ids = existing_chunk_ids(vectorstore._collection, [c["chunk_id"] for c in chunks])
 
-    # Extracting all current chunk IDs
-    existing_ids = set(existing["ids"]) if existing and existing.get("ids") else set()
-
-    logger.info(f"[INFO] {collection_name} | Existing Vectors: {len(existing_ids)}")
+    logger.info(f"[INFO] {collection_name} | Already embedded: {len(existing_ids)}/{len(chunks)}")
 
     new_chunks = [c for c in chunks if c["chunk_id"] not in existing_ids]
 
     if not new_chunks:
         logger.info(f"[DONE] No new chunks to embed for {collection_name}")
-        return 
+        return 0, 0
     
     logger.info(f"[START] Embedding {len(new_chunks)} chunks -> {collection_name}")
 
-    success = 0
-    failed = 0
-
-    for idx, chunk in enumerate(new_chunks, start=1):
-        chunk_id = chunk["chunk_id"]
-
-        logger.info(f"[EMBED] {collection_name} | {idx}/{len(new_chunks)} | {chunk_id}") 
-
-        retries = 0
-        while retries < MAX_RETRIES:
-            try:
-                vectorstore.add_texts(
-                    texts=[chunk["text"]],
-                    ids=[chunk_id],
-                    metadatas=[{
-                        "parent_id": chunk["parent_id"],
-                        "source_type": chunk["source_type"],
-                        "title": chunk["title"],
-                        "source_url": chunk["source_url"],
-                    }],
-                )
-
-                success += 1
-                break
+    written = []
+    success, failed = ingest_batches(
+        vectorstore._collection,
+        embedder or get_embeddings("retrieval_document"),
+        new_chunks,
+        label=collection_name,
+        write_lock=get_write_lock(collection_name),
+        written=written,
+    )
 
-            except Exception as e:
-                retries += 1
-                logger.error(
-                    f"[RETRY] {collection_name} | {chunk_id} "
-                    f"({retries}/{MAX_RETRIES} | {e})"
-                )
-                time.sleep(2 * retries)
-
-        if retries == MAX_RETRIES:
-            failed += 1
-            logger.error(f"[FAIL] {collection_name} | {chunk_id}")
+    if success:
+        # Only chunks whose batch reached Chroma; failed ones are retried on the next run
+        update_lexical_index(collection_name, written)
+        bump_collection_version(collection_name)
     
     logger.info(f"[DONE] {collection_name} | Embedded: {success} | Failed: {failed}")
+    return success, failed
+
+
+def stored_chunk_ids(collection, parent_ids: Iterable[str] | None = None, page_size: int = RECONCILE_PAGE_SIZE) -> dict[str, set[str]]:
+    """parent_id -> chunk ids in the collection, paged through metadata only (no documents or vectors)."""
+    if parent_ids is None:
+        filters = [None]
+    else:
+        parent_ids = list(parent_ids)
+        filters = [
+            {"parent_id": {"$in": parent_ids[i:i + page_size]}}
+            for i in range(0, len(parent_ids), page_size)
+        ]
+
+    stored = {}
+    for where in filters:
+        offset = 0
+        while True:
+            page = collection.get(where=where, include=["metadatas"], limit=page_size, offset=offset)
+            for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+                stored.setdefault((metadata or {}).get("parent_id"), set()).add(chunk_id)
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+    return stored
+
+
+def delete_chunks(collection_name: str, chunk_ids: list[str]) -> int:
+    if not chunk_ids:
+        return 0
+
+    collection = get_vectorstore(collection_name)._collection
+    with get_write_lock(collection_name):
+        for i in range(0, len(chunk_ids), DELETE_BATCH_SIZE):
+            collection.delete(ids=chunk_ids[i:i + DELETE_BATCH_SIZE])
+
+    remove_from_lexical_index(collection_name, chunk_ids)
+    bump_collection_version(collection_name)
+    return len(chunk_ids)
+
+
+def reconcile(
+    collection_name: str,
+    live: dict[str, set[str]],
+    removed: Iterable[str] = (),
+    full: bool = False,
+    force: bool = False,
+) -> int:
+    """Delete vectors that no current chunk backs.
+
+    `live` maps parent_id to its current chunk ids. Only those parents and the
+    `removed` ones are checked, unless `full`, in which case every stored
+    parent missing from `live` is treated as removed. A full reconcile that
+    would delete more than RECONCILE_MAX_DELETE_SHARE of the stored chunks
+    deletes nothing unless `force`: that is far more likely a missing or
+    half-written shard directory than a real change in the corpus.
+    """
+    collection = get_vectorstore(collection_name)._collection
+    parents = None if full else set(live) | set(removed)
+    if parents is not None and not parents:
+        return 0
+
+    stored = stored_chunk_ids(collection, parents)
+    orphans = [
+        chunk_id
+        for parent_id, chunk_ids in stored.items()
+        for chunk_id in chunk_ids - live.get(parent_id, set())
+    ]
+
+    total = sum(len(chunk_ids) for chunk_ids in stored.values())
+    if full and not force and len(orphans) > RECONCILE_MAX_DELETE_SHARE * total:
+        logger.error(
+            f"[RECONCILE] {collection_name} | refusing to delete {len(orphans)}/{total} stored chunks; "
+            f"check the shards, or pass force to delete them"
+        )
+        return 0
+
+    deleted = delete_chunks(collection_name, orphans)
+    if deleted:
+        logger.info(f"[RECONCILE] {collection_name} | deleted {deleted} stale chunks from {len(stored)} parents")
+    return deleted
+
+
+def backfill_published_ts(collection_name: str, page_size: int = RECONCILE_PAGE_SIZE) -> int:
+    """Add `published_ts` to stored chunks embedded before chunks carried it.
+
+    ingest_chunks skips ids already in the collection, so re-chunking never
+    updates their metadata, and a published_after/before filter would exclude
+    them all. Dates come from the registry's `published_at`; parents without
+    one (blogs today) are left alone.
+    """
+    id_field = KINDS[collection_name][0]
+    dates = {}
+    for item in get_registry(collection_name).all():
+        ts = published_timestamp(item.get("published_at"))
+        if ts is not None:
+            dates[item[id_field]] = ts
+    if not dates:
+        return 0
+
+    collection = get_vectorstore(collection_name)._collection
+    ids, metadatas = [], []
+    for page in iter_collection(collection, ["metadatas"], page_size):
+        for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+            metadata = metadata or {}
+            ts = dates.get(metadata.get("parent_id"))
+            if ts is not None and metadata.get("published_ts") != ts:
+                ids.append(chunk_id)
+                metadatas.append({**metadata, "published_ts": ts})
+
+    with get_write_lock(collection_name):
+        for i in range(0, len(ids), DELETE_BATCH_SIZE):
+            collection.update(ids=ids[i:i + DELETE_BATCH_SIZE], metadatas=metadatas[i:i + DELETE_BATCH_SIZE])
+
+    if ids:
+        bump_collection_version(collection_name)
+        logger.info(f"[BACKFILL] {collection_name} | published_ts set on {len(ids)} chunks")
+    return len(ids)
+
+
+def ingest_shards(
+    chunks_dir: Path,
+    collection_name: str,
+    parent_ids: Iterable[str] | None = None,
+    removed: Iterable[str] = (),
+    force: bool = False,
+) -> dict[str, int]:
+    """Embed the given parents' shards (all when None) and drop their stale vectors.
+
+    The full reconcile (parent_ids None) only runs against a chunk directory
+    with a manifest. Without one, no shards loaded would mean "delete everything".
+    """
+    success = failed = 0
+    live = {}
+
+    def track(chunks: Iterable[dict]) -> Iterator[dict]:
+        for chunk in chunks:
+            live.setdefault(chunk["parent_id"], set()).add(chunk["chunk_id"])
+            yield chunk
+
+    ensure_lexical_index(collection_name)
+
+    parent_ids = None if parent_ids is None else list(parent_ids)
+    for group in grouped(track(load_chunks(chunks_dir, parent_ids))):
+        ok, bad = ingest_chunks(group, collection_name)
+        success += ok
+        failed += bad
+
+    # Parents whose shard is now empty still need their old vectors removed
+    for parent_id in parent_ids or ():
+        live.setdefault(parent_id, set())
+
+    deleted = 0
+    if parent_ids is None and not load_manifest(chunks_dir):
+        logger.warning(f"[RECONCILE] {collection_name} | no chunk manifest in {chunks_dir}; skipping the full reconcile")
+    elif not failed:
+        # A failed batch would look like a missing chunk; don't delete on a partial view
+        deleted = reconcile(collection_name, live, removed, full=parent_ids is None, force=force)
+    if parent_ids is None:
+        backfill_published_ts(collection_name)
+
+    report = {"added": success, "failed": failed, "deleted": deleted}
+    logger.info(f"[SYNC] {collection_name} | {report}")
+    return report
+
+
+def embedder(changes: dict[str, tuple[list[str], list[str]]] | None = None, full: bool = False, force: bool = False):
+    """Sync chunk shards into the vector store.
 
+    `changes` is chunker() output ({collection: (changed, removed) parent ids}).
+    Without it, the change set the chunker saved since the last embed is used.
+    With `full`, or when no change set has been saved yet, every shard is
+    ingested and the whole collection reconciled. Synced ids are cleared from
+    the saved change set, unless a batch failed. `force` lets a full sync
+    delete more than RECONCILE_MAX_DELETE_SHARE of a collection. Quantized
+    indexes already built are rebuilt so they keep serving.
+    """
+    for name, chunks_dir in (("blogs", BLOGS_CHUNKS_DIR), ("podcasts", PODCASTS_CHUNKS_DIR)):
+        pending = load_pending(chunks_dir)
+        if full or (changes is None and pending is None):
+            changed = removed = None
+        elif changes is not None:
+            changed, removed = changes.get(name, ([], []))
+        else:
+            changed, removed = pending
 
-def embedder():
-    blog_chunks = load_chunks(BLOGS_CHUNKS_PATH)
-    ingest_chunks(blog_chunks, "blogs")
+        if changed is None:
+            report = ingest_shards(chunks_dir, name, force=force)
+        else:
+            report = ingest_shards(chunks_dir, name, changed, removed)
+        refresh_quantized_index(name)
+        if report["failed"]:
+            continue
 
-    podcast_chunks = load_chunks(PODCASTS_CHUNKS_PATH)
-    ingest_chunks(podcast_chunks, "podcasts")
+        if changed is None:
+            save_pending(chunks_dir, [], [])
+        elif pending is not None:
+            save_pending(chunks_dir, set(pending[0]) - set(changed), set(pending[1]) - set(removed))
 
 if __name__ == "__main__":
-    embedder()
\ No newline at end of file
+    embedder()
@@ -1,123 +1,143 @@
 import json
 import logging
 import requests
-from bs4 import BeautifulSoup
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 
-from app.ingestion.fetch import fetch_page
-from app.ingestion.transcriber import audio_downloader, audio_transcriber
-from app.ingestion.storage import load_registry, save_registry
+from app.ingestion.fetch import PER_HOST_CONCURRENCY, fetch
+from app.ingestion.html_extract import get_extractor
+from app.ingestion.storage import get_registry
 from app.core.config import (
-    BLOGS_URL_PATH,
+    CHECK_INTERVAL_HOURS,
     RAW_BLOGS_DIR,
 )
+from app.core.metrics import counter, histogram
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def clean_text(text: str) -> str:
-    lines = [ln.strip() for ln in text.splitlines()]
-    lines = [ln for ln in lines if ln]
-    text = "\n".join(lines)
-    logging.info("--- Cleaned Article ---")
-    logging.info(f"ARTICLE: {text}")
-    return text
-
-
-def extract_main_content(soup: BeautifulSoup) -> str:
-    # remove extra stuff
-    for tag in soup(["script", "style", "nav", "footer", "aside"]):
-        tag.decompose()
-
-    # article tag
-    article = soup.find("article")
-    if article:
-        article_text = article.get_text(separator="\n")
-        return clean_text(article_text)
-    
-    # common containers
-    for cls in ["post-content", "entry-content", "blog-post"]:
-        div = soup.find("div", class_=cls)
-        if div:
-            return clean_text(div.get_text(separator="\n"))
-        
-    candidates = soup.find_all("div")
-    best = max(
-        candidates,
-        key = lambda d: len(d.get_text(strip=True)),
-        default=None
-    )
-
-    if best:
-        return clean_text(best.get_text(separator="\n"))
-    
-    return ""
-
-
-def extract_title(soup: BeautifulSoup) -> str | None:
-    h1 = soup.find("h1")
-    if h1:
-        return h1.get_text(strip=True)
-    
-    if soup.title:
-        return soup.title.get_text(strip=True)
-    
-    return None
-
-
-def blog_extractor():
-    registry = load_registry(BLOGS_URL_PATH)
+EXTRACT_SECONDS = histogram("rag_extract_seconds", "HTML parse and main-content extraction time per article", stage="extract")
+EXTRACTED = counter("rag_extract_total", "Articles by extraction outcome", ("result",))
+EXTRACTED_CHARS = counter("rag_extract_chars_total", "Characters of article text extracted")
+
+def extract_blog(blog_id: str, item: dict, conditional: bool = False) -> dict | None:
+    # With `conditional`, revalidate against the stored validators and
+    # return None when the server says the article hasn't changed
+    try:
+        raw = _extract_blog(blog_id, item, conditional)
+    except Exception:
+        EXTRACTED.inc(result="failed")
+        raise
+
+    if raw is None:
+        EXTRACTED.inc(result="unchanged")
+    else:
+        EXTRACTED.inc(result="ok")
+        EXTRACTED_CHARS.inc(len(raw["content"]))
+    return raw
+
+
+def _extract_blog(blog_id: str, item: dict, conditional: bool) -> dict | None:
+    url = item.get("url")
+    if conditional:
+        result = fetch(url, item.get("etag"), item.get("last_modified"))
+        if result.not_modified:
+            return None
+    else:
+        result = fetch(url)
+
+    with EXTRACT_SECONDS.time():
+        content, title = get_extractor().extract(result.text, url)
+        if not content:
+            raise ValueError("Empty content extracted")
+    if title:
+        item["title"] = title
+
+    for key, value in (("etag", result.etag), ("last_modified", result.last_modified)):
+        if value:
+            item[key] = value
+        else:
+            item.pop(key, None)
+
+    raw_data = {
+        "blog_id": blog_id,
+        "title": item.get("title", ""),
+        "url": url,
+        "content": content,
+        "extracted_at": datetime.now(timezone.utc).isoformat()
+    }
+
     # Save raw text of blogs in {blog_id}.json file
     RAW_BLOGS_DIR.mkdir(parents=True, exist_ok=True)
+    out_path = RAW_BLOGS_DIR / f"{blog_id}.json"
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(raw_data, f, indent=2, ensure_ascii=False)
+
+    return raw_data
+
+
+def _is_stale(item: dict) -> bool:
+    try:
+        last_checked = datetime.fromisoformat(item["last_checked"])
+    except (KeyError, ValueError):
+        return True
+    return datetime.now(timezone.utc) - last_checked > timedelta(hours=CHECK_INTERVAL_HOURS)
 
-    processed = 0
 
-    for blog_id, item in registry.items():
-        # Skips the already extracted URLs
-        if item.get("state") != "DISCOVERED":
-            continue
-
-        url = item.get("url")
-        logger.info("\n--- Fetching ---\n")
-        logger.info(f"[FETCH] {url}")
-
-        try:
-            soup = fetch_page(url)
-            content = extract_main_content(soup)
-            if not content:
-                raise ValueError("Empty content extracted")
-            
-            title = extract_title(soup)
-            if title:
-                item["title"] = title
-
-            raw_data = {
-                "blog_id": blog_id,
-                "title": item.get("title", ""),
-                "url": url,
-                "content": content,
-                "extracted_at": datetime.now(timezone.utc).isoformat()
-            }
-
-            out_path = RAW_BLOGS_DIR / f"{blog_id}.json"
-            with open(out_path, "w", encoding="utf-8") as f:
-                json.dump(raw_data, f, indent=2, ensure_ascii=False)
-
-            item["state"] = "FETCHED_RAW"
-            item["last_checked"] = datetime.now(timezone.utc).isoformat()
-
-            processed += 1
-
-        except Exception as e:
-            logger.error(f"[ERROR] {url} | {e}")
-            item["state"] = "FAILED_RAW"
-            item["last_checked"] = datetime.now(timezone.utc).isoformat()
-
-        
-    save_registry(BLOGS_URL_PATH, registry)
-    logger.info(f"[DONE] Blog raw extraction complete: {processed}")
+def blog_extractor(refresh: bool = True, workers: int = PER_HOST_CONCURRENCY):
+    registry = get_registry("blogs")
+
+    # New URLs are fetched outright; already-extracted ones are revalidated
+    # with a conditional GET once they are older than CHECK_INTERVAL_HOURS
+    jobs = [(item, False) for item in registry.by_state("DISCOVERED")]
+    if refresh:
+        jobs += [(item, True) for item in registry.by_state("FETCHED_RAW", "EMBEDDED") if _is_stale(item)]
+
+    processed = 0
+    unchanged = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(extract_blog, item["blog_id"], item, conditional): (item, conditional)
+            for item, conditional in jobs
+        }
+
+        for future in as_completed(futures):
+            item, conditional = futures[future]
+            blog_id = item["blog_id"]
+
+            try:
+                if future.result() is None:
+                    registry.update(blog_id, retries=None)
+                    unchanged += 1
+                    continue
+
+                # Changed articles go back through chunking and embedding
+                registry.transition(
+                    blog_id,
+                    "FETCHED_RAW",
+                    title=item.get("title"),
+                    etag=item.get("etag"),
+                    last_modified=item.get("last_modified"),
+                )
+                processed += 1
+                logger.info(f"[FETCHED] {item.get('url')}")
+
+            except Exception as e:
+                if not conditional:
+                    logger.error(f"[ERROR] {item.get('url')} | {e}")
+                    registry.update(blog_id, state="FAILED_RAW")
+                    continue
+                # A failed refresh keeps the stored article and its state; last_checked
+                # puts the next attempt a CHECK_INTERVAL_HOURS away
+                item = registry.fail(blog_id)
+                logger.error(f"[ERROR] refresh {item.get('url')} ({item['retries']}) | {e}")
+
+    logger.info(f"[DONE] Blog raw extraction complete: {processed} | Unchanged: {unchanged}")
 
 def podcasts_extractor():
+    from app.ingestion.transcriber import audio_transcriber
+
     # audio_downloader()
     audio_transcriber()
 
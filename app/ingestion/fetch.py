@@ -1,27 +1,127 @@
 import json
 import hashlib
+import os
+import threading
+import time
 import requests
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from typing import NamedTuple
 from urllib.parse import urljoin, urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import feedparser
 import logging
 
-from app.ingestion.storage import load_registry, save_registry
-from app.core.config import BLOGS_URL, BLOGS_URL_PATH, PODCASTS_URL, PODCASTS_URL_PATH
+from app.ingestion.storage import get_registry
+from app.core.config import BLOGS_URL, HTTP_CACHE_PATH, PODCASTS_URL
+from app.core.metrics import counter, histogram
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+PER_HOST_CONCURRENCY = 4
+MIN_REQUEST_INTERVAL = 0.25 # seconds between request starts to the same host
+REQUEST_TIMEOUT = 20
+USER_AGENT = "Mozilla/5.0 (compatible; ChallengerRAGBot/1.0)"
+
+FETCH_SECONDS = histogram("rag_fetch_seconds", "Page fetch latency, including per-host queueing", ("host",), stage="fetch")
+FETCH_RESPONSES = counter("rag_fetch_responses_total", "Page fetches by HTTP status", ("status",))
+
+
+class FetchResult(NamedTuple):
+    url: str
+    status: int
+    text: str | None
+    etag: str | None
+    last_modified: str | None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+
+class HostLimiter:
+    """Caps concurrent requests per host and spaces out their start times."""
+
+    def __init__(self, concurrency: int = PER_HOST_CONCURRENCY, interval: float = MIN_REQUEST_INTERVAL):
+        self.concurrency = concurrency
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._next_start = {}
+
+    def _slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.concurrency)
+            return self._slots[host]
+
+    def _wait_turn(self, host: str):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    @contextmanager
+    def limit(self, host: str):
+        with self._slot(host):
+            self._wait_turn(host)
+            yield
+
+
+_session = None
+_session_lock = threading.Lock()
+_limiter = HostLimiter()
+
+
+def get_session() -> requests.Session:
+    # One keep-alive pool for every fetch in the process
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=8,
+                pool_maxsize=PER_HOST_CONCURRENCY * 2,
+                max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _session = session
+        return _session
+
+
+def fetch(url: str, etag: str | None = None, last_modified: str | None = None) -> FetchResult:
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    host = urlparse(url).netloc
+    with FETCH_SECONDS.time(host=host), _limiter.limit(host):
+        r = get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    FETCH_RESPONSES.inc(status=r.status_code)
+
+    if r.status_code == 304:
+        return FetchResult(url, 304, None, etag, last_modified)
+
+    r.raise_for_status()
+    return FetchResult(url, r.status_code, r.text, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+
 def normalize_url(url: str) -> str:
     parsed = urlparse(url)
     return f"{parsed.scheme}://{parsed.netloc}{parsed.path}".rstrip("/")
 
 def fetch_page(url: str) -> BeautifulSoup:
     logging.info(f"URL TO FETCH: {url}")
-    r = requests.get(url, timeout=20)
-    r.raise_for_status()
-    return BeautifulSoup(r.text, "html.parser")
+    return BeautifulSoup(fetch(url).text, "html.parser")
 
 def filter_article(path: str) -> bool:
     parts = path.strip("/").split("/")
@@ -38,69 +138,121 @@ def fetch_rss_feed():
 
     return feed
 
-def blog_fetcher():
-    registry = load_registry(BLOGS_URL_PATH)
-    visited_pages = set()
+def load_http_cache() -> dict:
+    if HTTP_CACHE_PATH.exists():
+        with open(HTTP_CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
 
-    pages_to_visit = {"/blog"}
-    page_index = 1
 
-    while pages_to_visit:
-        path = pages_to_visit.pop()
-        visited_pages.add(path)
-        links_with_titles = []
-        
-        full_page_url = normalize_url(urljoin(BLOGS_URL, path))
-        logger.info(f"[VISIT] {full_page_url}")
-
-        # Fetch raw html page
-        try:
-            soup = fetch_page(full_page_url)
-        except Exception as e:
-            logger.error(f"[ERROR] {full_page_url}: {e}")
+def save_http_cache(cache: dict):
+    HTTP_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = HTTP_CACHE_PATH.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, HTTP_CACHE_PATH)
+
+
+def listing_url(page_index: int) -> str:
+    path = "/blog" if page_index == 0 else f"/blog/previous/{page_index}"
+    return normalize_url(urljoin(BLOGS_URL, path))
+
+
+def extract_article_links(soup: BeautifulSoup) -> list[tuple[str, str]]:
+    articles = []
+
+    # Find all links with titles
+    for a in soup.find_all("a", href=True):
+        href = a["href"].split("#")[0].strip()
+        title = a.get_text(strip=True)
+
+        if not href or not title:
             continue
 
-        # Find all links with titles
-        for a in soup.find_all("a", href=True):
-            href = a["href"].split("#")[0].strip()
-            title = a.get_text(strip=True)
+        link_path = urlparse(href).path
 
-            if not href or not title:
-                continue
-            
-            logger.info(f"HERF: {href}, TITLE: {title}")
-            links_with_titles.append((href, title))
-        
-        for href, title in links_with_titles:
-            parsed = urlparse(href)
-            link_path = parsed.path
-
-            # Check if it is article
-            if filter_article(link_path):
-                article_url = normalize_url(urljoin(BLOGS_URL, link_path))
-                # Generate blog ID
-                blog_id = hashlib.sha1(article_url.encode("utf-8")).hexdigest()
-
-                if blog_id not in registry:
-                    registry[blog_id] = {
+        # Check if it is article
+        if filter_article(link_path):
+            articles.append((normalize_url(urljoin(BLOGS_URL, link_path)), title))
+
+    return articles
+
+
+def _fetch_listing(page_index: int, validators: dict) -> tuple[int, FetchResult | None]:
+    url = listing_url(page_index)
+    logger.info(f"[VISIT] {url}")
+    try:
+        return page_index, fetch(url, validators.get("etag"), validators.get("last_modified"))
+    except Exception as e:
+        logger.error(f"[ERROR] {url}: {e}")
+        return page_index, None
+
+
+def blog_fetcher(full: bool = False, max_pages: int | None = None):
+    registry = get_registry("blogs")
+    http_cache = load_http_cache()
+    discovered = 0
+
+    # The first listing page goes alone: on a daily refresh it is usually the
+    # only request we need. Older pages are then fetched a window at a time.
+    page_index = 0
+    window = 1
+    done = False
+
+    with ThreadPoolExecutor(max_workers=PER_HOST_CONCURRENCY) as pool:
+        while not done and (max_pages is None or page_index < max_pages):
+            pages = range(page_index, page_index + window)
+            results = pool.map(
+                lambda i: _fetch_listing(i, {} if full else http_cache.get(listing_url(i), {})),
+                pages,
+            )
+
+            # Walk the window in page order so early termination is deterministic
+            for index, result in results:
+                if done:
+                    continue
+                if result is None:
+                    done = True
+                    continue
+
+                if result.not_modified:
+                    logger.info(f"[UNCHANGED] {result.url}")
+                    done = True
+                    continue
+
+                articles = extract_article_links(BeautifulSoup(result.text, "html.parser"))
+                new = 0
+                for article_url, title in articles:
+                    # Generate blog ID
+                    blog_id = hashlib.sha1(article_url.encode("utf-8")).hexdigest()
+
+                    if registry.add({
                         "blog_id": blog_id,
                         "title": title,
                         "url": article_url,
                         "state": "DISCOVERED",
                         "last_checked": datetime.now(timezone.utc).isoformat()
-                    }
-        
-        # Pagination Control
-        next_page = f"/blog/previous/{page_index}"
-        if next_page not in visited_pages:
-            pages_to_visit.add(next_page)
-            page_index += 1
+                    }):
+                        new += 1
+
+                http_cache[result.url] = {"etag": result.etag, "last_modified": result.last_modified}
+                discovered += new
+                logger.info(f"[PAGE] {result.url} | articles={len(articles)} | new={new}")
+
+                # Listings are newest first: a page with nothing new means we've
+                # caught up. A full crawl (e.g. resuming an interrupted first run)
+                # only stops once it runs out of listing pages.
+                if not articles or (not new and not full):
+                    done = True
 
-    save_registry(BLOGS_URL_PATH, registry)
-    logger.info(f"Total blogs discovered: {len(registry)}")
+            page_index += window
+            window = PER_HOST_CONCURRENCY
+
+    save_http_cache(http_cache)
+    logger.info(f"New blogs discovered: {discovered} | Total: {len(registry)}")
 
 def podcast_fetcher():
-    registry = load_registry(PODCASTS_URL_PATH)
+    registry = get_registry("podcasts")
     feed = fetch_rss_feed()
 
     discovered = 0
@@ -125,7 +277,7 @@ def podcast_fetcher():
 
         episode_url = audio_url.replace(".mp3", "")
 
-        registry[episode_id] = {
+        if registry.add({
             "episode_id": episode_id,
             "title": title,
             "episode_url": episode_url,
@@ -133,11 +285,9 @@ def podcast_fetcher():
             "published_at": published,
             "state": "DISCOVERED",
             "last_checked": datetime.now(timezone.utc).isoformat()
-        }
-
-        discovered += 1
+        }):
+            discovered += 1
 
-    save_registry(PODCASTS_URL_PATH, registry)
     logger.info(f"Total episodes discovered: {discovered}")
 
 # Optional: A unified fetcher that can be scheduled to run periodically
@@ -0,0 +1,194 @@
+import importlib.util
+import logging
+import threading
+
+from bs4 import BeautifulSoup
+
+from app.core.config import HTML_EXTRACTOR
+from app.core.metrics import counter
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REMOVED_TAGS = ["script", "style", "nav", "footer", "aside"]
+CONTENT_CLASSES = ["post-content", "entry-content", "blog-post"]
+
+EXTRACT_RULES = counter(
+    "rag_extract_rules_total", "Which rule found the main content (article, class, scan, none)", ("engine", "rule"),
+)
+
+
+def clean_text(text: str) -> str:
+    lines = [ln.strip() for ln in text.splitlines()]
+    lines = [ln for ln in lines if ln]
+    text = "\n".join(lines)
+    # Whole articles; formatting them is only worth it when debugging the extractor
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"ARTICLE: {text}")
+    return text
+
+
+def extract_main_content(soup: BeautifulSoup) -> str:
+    # remove extra stuff
+    for tag in soup(REMOVED_TAGS):
+        tag.decompose()
+
+    # article tag
+    article = soup.find("article")
+    if article:
+        article_text = article.get_text(separator="\n")
+        return clean_text(article_text)
+
+    # common containers
+    for cls in CONTENT_CLASSES:
+        div = soup.find("div", class_=cls)
+        if div:
+            return clean_text(div.get_text(separator="\n"))
+
+    candidates = soup.find_all("div")
+    best = max(
+        candidates,
+        key = lambda d: len(d.get_text(strip=True)),
+        default=None
+    )
+
+    if best:
+        return clean_text(best.get_text(separator="\n"))
+
+    return ""
+
+
+def extract_title(soup: BeautifulSoup) -> str | None:
+    h1 = soup.find("h1")
+    if h1:
+        return h1.get_text(strip=True)
+
+    if soup.title:
+        return soup.title.get_text(strip=True)
+
+    return None
+
+
+class SoupExtractor:
+    """The original heuristic on BeautifulSoup's pure-Python html.parser.
+
+    The longest-div fallback calls get_text on every div, which is quadratic
+    in nesting depth.
+    """
+
+    name = "soup"
+
+    def extract(self, html: str, url: str | None = None) -> tuple[str, str | None]:
+        soup = BeautifulSoup(html, "html.parser")
+        content = extract_main_content(soup)
+        return content, extract_title(soup)
+
+
+def _stripped_len(text: str | None) -> int:
+    return len(text.strip()) if text else 0
+
+
+class FastExtractor:
+    """Same rules as SoupExtractor on lxml's C parser, in linear time.
+
+    Text lengths for every element come from one bottom-up pass, so the
+    longest-div fallback no longer re-reads each subtree.
+    """
+
+    name = "fast"
+
+    def __init__(self):
+        import lxml.html
+
+        self._lxml = lxml.html
+        # lxml parsers must not be shared between threads
+        self._local = threading.local()
+
+    @property
+    def _parser(self):
+        parser = getattr(self._local, "parser", None)
+        if parser is None:
+            parser = self._local.parser = self._lxml.HTMLParser(encoding="utf-8")
+        return parser
+
+    def _text(self, el) -> str:
+        return clean_text("\n".join(el.itertext()))
+
+    def _longest_div(self, root):
+        """First div with the most text, by get_text(strip=True) length, in one bottom-up pass."""
+        nodes = [el for el in root.iter() if isinstance(el.tag, str)]
+        lengths = {}
+        # Reverse document order visits every child before its parent
+        for el in reversed(nodes):
+            n = _stripped_len(el.text)
+            for child in el:
+                n += lengths.get(child, 0) + _stripped_len(child.tail)
+            lengths[el] = n
+
+        divs = [el for el in nodes if el.tag == "div"]
+        return max(divs, key=lengths.__getitem__, default=None)
+
+    def _main_content(self, root) -> str:
+        for el in list(root.iter(*REMOVED_TAGS)):
+            # drop_tree keeps the tail text, like decompose() leaves the next string
+            el.drop_tree()
+
+        article = root.find(".//article")
+        if article is not None:
+            EXTRACT_RULES.inc(engine=self.name, rule="article")
+            return self._text(article)
+
+        for cls in CONTENT_CLASSES:
+            found = root.xpath(
+                "//div[contains(concat(' ', normalize-space(@class), ' '), $cls)]", cls=f" {cls} "
+            )
+            if found:
+                EXTRACT_RULES.inc(engine=self.name, rule="class")
+                return self._text(found[0])
+
+        best = self._longest_div(root)
+        if best is None:
+            EXTRACT_RULES.inc(engine=self.name, rule="none")
+            return ""
+
+        EXTRACT_RULES.inc(engine=self.name, rule="scan")
+        return self._text(best)
+
+    def _title(self, root) -> str | None:
+        for path in (".//h1", ".//title"):
+            el = root.find(path)
+            if el is not None:
+                return "".join(s.strip() for s in el.itertext())
+        return None
+
+    def extract(self, html: str, url: str | None = None) -> tuple[str, str | None]:
+        try:
+            # Bytes plus an explicit encoding: lxml rejects str input that carries an XML declaration
+            root = self._lxml.document_fromstring(html.encode("utf-8"), parser=self._parser)
+        except self._lxml.etree.ParserError:
+            # Empty document
+            return "", None
+
+        return self._main_content(root), self._title(root)
+
+
+_extractors = {}
+_extractors_lock = threading.Lock()
+
+EXTRACTORS = {
+    "soup": SoupExtractor,
+    "fast": FastExtractor,
+}
+
+
+def get_extractor(name: str = HTML_EXTRACTOR):
+    with _extractors_lock:
+        if name not in _extractors:
+            if name not in EXTRACTORS:
+                raise ValueError(f"Unknown HTML extractor: {name}")
+            if name == "fast" and importlib.util.find_spec("lxml") is None:
+                logger.warning("[EXTRACT] lxml is not installed; using the html.parser extractor")
+                _extractors[name] = SoupExtractor()
+            else:
+                _extractors[name] = EXTRACTORS[name]()
+        return _extractors[name]
@@ -0,0 +1,341 @@
+import json
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+from app.ingestion.chunk import CHUNK_SECONDS, chunk_blog, chunk_episode, record_chunking, store_chunks, update_manifest
+from app.ingestion.download import DOWNLOAD_WORKERS, DiskBudgetExceeded, download_audio
+from app.ingestion.embed import ingest_chunks, reconcile
+from app.ingestion.extract import extract_blog
+from app.ingestion.storage import KINDS, get_registry
+from app.ingestion.transcriber import (
+    MAX_RETRIES,
+    _init_worker,
+    _transcribe_job,
+    plan_workers,
+    record_transcription,
+    save_raw_transcript,
+)
+from app.retrieval.lexical import ensure_lexical_index
+from app.retrieval.quantized import refresh_quantized_index
+from app.core.config import (
+    PODCASTS_AUDIO_PATH,
+    PROFILE_SAMPLING,
+    RAW_BLOGS_DIR,
+    RAW_PODCASTS_DIR,
+    RUNS_DIR,
+    TRANSCRIBE_MODE,
+)
+from app.core.metrics import counter, histogram, profiling, reset_metrics, write_summary
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EXTRACT_WORKERS = 4
+EMBED_WORKERS = 2
+QUEUE_SIZE = 16
+
+_STOP = object()
+
+STAGE_SECONDS = histogram("rag_stage_seconds", "Pipeline stage time per job", ("stage",))
+STAGE_JOBS = counter("rag_stage_jobs_total", "Pipeline stage jobs by outcome (ok, dropped, error)", ("stage", "result"))
+
+
+class Stage:
+    """A pool of threads moving jobs from `inbox` to `outbox` through `fn`.
+
+    `fn` returning None drops the job (failures are recorded by `fn` itself).
+    Bounded queues give backpressure: a slow stage stalls the ones before it.
+    """
+
+    def __init__(self, name: str, fn, inbox: queue.Queue, outbox: queue.Queue | None, workers: int = 1):
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.processed = 0
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self):
+        for t in self._threads:
+            t.start()
+
+    def _run(self):
+        while True:
+            job = self.inbox.get()
+            if job is _STOP:
+                # Leave the marker for sibling workers
+                self.inbox.put(_STOP)
+                return
+
+            try:
+                with STAGE_SECONDS.time(stage=self.name):
+                    result = self.fn(job)
+            except Exception as e:
+                STAGE_JOBS.inc(stage=self.name, result="error")
+                logger.error(f"[{self.name.upper()}] Unhandled error | {e}")
+                continue
+
+            STAGE_JOBS.inc(stage=self.name, result="dropped" if result is None else "ok")
+            self.processed += 1
+            if result is not None and self.outbox is not None:
+                self.outbox.put(result)
+
+    def join(self):
+        for t in self._threads:
+            t.join()
+
+
+def _read_raw(path) -> dict | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"[ERROR] Failed reading {path.name}: {e}")
+        return None
+
+
+def run_pipeline(
+    blogs: bool = True,
+    podcasts: bool = True,
+    limit: int | None = None,
+    transcribe_workers: int | None = None,
+    transcribe_mode: str = TRANSCRIBE_MODE,
+    profile: bool = PROFILE_SAMPLING,
+):
+    """Stream every pending blog/episode through extract|download -> transcribe -> chunk -> embed.
+
+    Each item re-enters at the stage its registry state says it reached, so an
+    interrupted run resumes where it stopped. Finished items end in EMBEDDED.
+    In "stream" transcribe mode, episodes skip the download stage and are
+    decoded straight from their audio URL.
+
+    Every run writes a metrics summary to RUNS_DIR; with `profile`, sampled
+    stacks per stage go next to it in collapsed-stack format.
+    """
+    run_id = datetime.now(timezone.utc).strftime("pipeline-%Y%m%dT%H%M%SZ")
+    reset_metrics()
+    with profiling(RUNS_DIR / f"{run_id}.stacks") if profile else nullcontext():
+        stages = _run_pipeline(blogs, podcasts, limit, transcribe_workers, transcribe_mode)
+
+    path = write_summary(
+        RUNS_DIR / f"{run_id}.json",
+        run_id=run_id,
+        processed={stage.name: stage.processed for stage in stages},
+    )
+    logger.info(f"[PIPELINE] Metrics summary: {path}")
+
+    # Refresh the JSON snapshots of the registry
+    for kind in KINDS:
+        get_registry(kind).export_json()
+
+
+def _run_pipeline(blogs, podcasts, limit, transcribe_workers, transcribe_mode) -> list[Stage]:
+    start = time.perf_counter()
+    first_searchable = []
+    # collection -> parent_id -> manifest entry, written once at the end rather than per item
+    manifest_entries = {"blogs": {}, "podcasts": {}}
+    manifest_lock = threading.Lock()
+
+    # Each transition is its own SQLite transaction, so stage threads write directly
+    blog_registry = get_registry("blogs")
+    podcast_registry = get_registry("podcasts")
+
+    workers, cpu_threads = plan_workers(transcribe_workers)
+
+    # Embed workers only add their own chunks; backfill postings for what is already stored
+    for collection, enabled in (("blogs", blogs), ("podcasts", podcasts)):
+        if enabled:
+            ensure_lexical_index(collection)
+
+    extract_q = queue.Queue()
+    download_q = queue.Queue()
+    # Keep only a couple of episodes per transcriber waiting on disk
+    transcribe_q = queue.Queue(maxsize=workers * 2)
+    embed_q = queue.Queue(maxsize=QUEUE_SIZE)
+
+    # --- stage functions ---
+
+    def extract(blog_id: str):
+        item = blog_registry.get(blog_id)
+        try:
+            raw = extract_blog(blog_id, item)
+        except Exception as e:
+            logger.error(f"[ERROR] {item.get('url')} | {e}")
+            blog_registry.update(blog_id, state="FAILED_RAW")
+            return None
+
+        blog_registry.transition(
+            blog_id,
+            "FETCHED_RAW",
+            title=item.get("title"),
+            etag=item.get("etag"),
+            last_modified=item.get("last_modified"),
+        )
+        return ("blogs", blog_id, raw)
+
+    def download(episode_id: str):
+        item = podcast_registry.get(episode_id)
+        try:
+            download_audio(item["audio_url"], episode_id)
+        except DiskBudgetExceeded as e:
+            logger.warning(f"[DEFERRED] {episode_id} | {e}")
+            return None
+        except Exception as e:
+            logger.error(f"[ERROR] {episode_id} | {e}")
+            podcast_registry.fail(episode_id, "AUDIO_FAILED")
+            return None
+
+        podcast_registry.transition(episode_id, "AUDIO_DOWNLOADED")
+        return episode_id
+
+    pool = None
+    if podcasts:
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(cpu_threads,),
+        )
+
+    def transcribe(episode_id: str):
+        item = podcast_registry.get(episode_id)
+        audio_path = PODCASTS_AUDIO_PATH / f"{episode_id}.mp3"
+        streamed = not audio_path.exists()
+        source = item["audio_url"] if streamed else str(audio_path)
+        _, transcript, seconds = pool.submit(_transcribe_job, episode_id, source).result()
+        record_transcription(source, transcript, seconds)
+
+        if not transcript:
+            podcast_registry.fail(episode_id, "AUDIO_FAILED" if streamed else None)
+            return None
+
+        raw = save_raw_transcript(episode_id, item, transcript)
+        audio_path.unlink(missing_ok=True)
+        podcast_registry.transition(episode_id, "TRANSCRIBED")
+        logger.info(f"[TRANSCRIBED] {episode_id} | {seconds:.0f}s")
+        return ("podcasts", episode_id, raw)
+
+    def embed(job):
+        collection, item_id, raw = job
+        with CHUNK_SECONDS.time(kind=collection):
+            chunks = chunk_blog(raw) if collection == "blogs" else chunk_episode(raw)
+        record_chunking(collection, len(chunks))
+        _, failed = ingest_chunks(chunks, collection)
+        if failed:
+            return None
+
+        # A refetched article or redone transcript leaves its old chunks behind
+        reconcile(collection, {item_id: {c["chunk_id"] for c in chunks}})
+
+        # Same shards as the chunk stage, so a later `python -m app embed` sees this item
+        entry = store_chunks(collection, item_id, chunks, raw)
+        with manifest_lock:
+            manifest_entries[collection][item_id] = entry
+
+        registry = blog_registry if collection == "blogs" else podcast_registry
+        registry.transition(item_id, "EMBEDDED")
+
+        if not first_searchable:
+            first_searchable.append(time.perf_counter() - start)
+            logger.info(f"[PIPELINE] First searchable item after {first_searchable[0]:.1f}s: {item_id}")
+        return item_id
+
+    # --- seed queues from registry state ---
+
+    seeded = 0
+    resume_embed = []
+
+    if blogs:
+        for item in blog_registry.by_state("DISCOVERED", "FETCHED_RAW"):
+            if limit and seeded >= limit:
+                break
+            blog_id = item["blog_id"]
+            if item["state"] == "DISCOVERED":
+                extract_q.put(blog_id)
+                seeded += 1
+            else:
+                resume_embed.append(("blogs", blog_id, RAW_BLOGS_DIR / f"{blog_id}.json"))
+                seeded += 1
+
+    resume_transcribe = []
+    if podcasts:
+        pending = podcast_registry.by_state("DISCOVERED", "AUDIO_FAILED", "AUDIO_DOWNLOADED", "TRANSCRIBED")
+        for item in pending:
+            if limit and seeded >= limit:
+                break
+            episode_id = item["episode_id"]
+            state = item["state"]
+            if item.get("retries", 0) >= MAX_RETRIES:
+                continue
+            if state in {"DISCOVERED", "AUDIO_FAILED"}:
+                if transcribe_mode == "stream":
+                    resume_transcribe.append(episode_id)
+                else:
+                    download_q.put(episode_id)
+            elif state == "AUDIO_DOWNLOADED" and (PODCASTS_AUDIO_PATH / f"{episode_id}.mp3").exists():
+                resume_transcribe.append(episode_id)
+            elif state == "TRANSCRIBED":
+                resume_embed.append(("podcasts", episode_id, RAW_PODCASTS_DIR / f"{episode_id}.json"))
+            else:
+                continue
+            seeded += 1
+
+    logger.info(f"[PIPELINE] {seeded} items | transcribe workers={workers} x {cpu_threads} threads")
+
+    extract_q.put(_STOP)
+    download_q.put(_STOP)
+
+    stages = [
+        Stage("extract", extract, extract_q, embed_q, EXTRACT_WORKERS),
+        Stage("download", download, download_q, transcribe_q, DOWNLOAD_WORKERS),
+        Stage("transcribe", transcribe, transcribe_q, embed_q, workers),
+        Stage("embed", embed, embed_q, None, EMBED_WORKERS),
+    ]
+    extract_stage, download_stage, transcribe_stage, embed_stage = stages
+    for stage in stages:
+        stage.start()
+
+    # Resumed items enter mid-pipeline; feeding them from this thread respects queue bounds
+    for episode_id in resume_transcribe:
+        transcribe_q.put(episode_id)
+    for collection, item_id, path in resume_embed:
+        raw = _read_raw(path)
+        if raw is not None:
+            embed_q.put((collection, item_id, raw))
+
+    # Shut down front to back. Embed has two producers, so its STOP is only
+    # sent once both upstream stages have drained.
+    download_stage.join()
+    transcribe_q.put(_STOP)
+    transcribe_stage.join()
+    extract_stage.join()
+    embed_q.put(_STOP)
+    embed_stage.join()
+
+    for collection, entries in manifest_entries.items():
+        update_manifest(collection, entries)
+    for collection, enabled in (("blogs", blogs), ("podcasts", podcasts)):
+        if enabled:
+            refresh_quantized_index(collection)
+
+    if pool is not None:
+        pool.shutdown()
+
+    logger.info(
+        f"[PIPELINE DONE] {time.perf_counter() - start:.1f}s | "
+        + " | ".join(f"{s.name}={s.processed}" for s in stages)
+    )
+    return stages
+
+
+if __name__ == "__main__":
+    run_pipeline()
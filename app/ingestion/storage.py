@@ -1,23 +1,252 @@
 import json
-from app.core.config import BLOGS_URL_PATH
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache
 
+from app.core.config import BLOGS_URL_PATH, PODCASTS_URL_PATH, REGISTRY_DB_PATH
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# kind -> (id field, legacy JSON registry)
+KINDS = {
+    "blogs": ("blog_id", BLOGS_URL_PATH),
+    "podcasts": ("episode_id", PODCASTS_URL_PATH),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    kind TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    data TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (kind, item_id)
+);
+CREATE INDEX IF NOT EXISTS idx_items_state ON items(kind, state);
+CREATE TABLE IF NOT EXISTS migrations (
+    kind TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    migrated_at TEXT NOT NULL
+);
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class RegistryStore:
+    """SQLite (WAL) registry of blogs or podcast episodes.
+
+    Items are stored whole as JSON, with `state` mirrored into an indexed
+    column so "everything in state X" is an index scan. Every write is its own
+    transaction, and connections are per thread, so stage threads and worker
+    processes can share one database.
+
+    The database is the source of truth. The legacy JSON registry is imported
+    once, on first use, and after that is only a snapshot written by
+    `export_json`: at the end of a pipeline run, by `save_registry`, and by
+    `python -m app registry --export`. Stage commands run on their own
+    (fetch, extract, ...) leave it stale until then.
+    """
+
+    def __init__(self, kind: str, db_path=REGISTRY_DB_PATH):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown registry kind: {kind}")
+        self.kind = kind
+        self.id_field, self.json_path = KINDS[kind]
+        self.db_path = db_path
+        self._local = threading.local()
+
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+        self.migrate_from_json()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes the write lock up front, so read-modify-write is atomic across processes
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _write(self, conn: sqlite3.Connection, item: dict):
+        # Upsert rather than REPLACE so rows keep their rowid (discovery order)
+        conn.execute(
+            "INSERT INTO items (kind, item_id, state, data, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (kind, item_id) DO UPDATE SET "
+            "state = excluded.state, data = excluded.data, updated_at = excluded.updated_at",
+            (self.kind, item[self.id_field], item["state"], json.dumps(item, ensure_ascii=False), _now()),
+        )
+
+    def migrate_from_json(self, force: bool = False) -> int:
+        conn = self._conn()
+        done = conn.execute("SELECT 1 FROM migrations WHERE kind = ?", (self.kind,)).fetchone()
+        if (done and not force) or not self.json_path.exists():
+            return 0
+
+        with open(self.json_path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+
+        with self._transaction() as conn:
+            for item in items:
+                self._write(conn, item)
+            conn.execute(
+                "INSERT OR REPLACE INTO migrations (kind, source, migrated_at) VALUES (?, ?, ?)",
+                (self.kind, str(self.json_path), _now()),
+            )
+
+        logger.info(f"[MIGRATE] {self.kind} | {len(items)} items from {self.json_path.name}")
+        return len(items)
+
+    def get(self, item_id: str) -> dict | None:
+        row = self._conn().execute(
+            "SELECT data FROM items WHERE kind = ? AND item_id = ?", (self.kind, item_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def __contains__(self, item_id: str) -> bool:
+        return self._conn().execute(
+            "SELECT 1 FROM items WHERE kind = ? AND item_id = ?", (self.kind, item_id)
+        ).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM items WHERE kind = ?", (self.kind,)).fetchone()[0]
+
+    def all(self) -> list[dict]:
+        rows = self._conn().execute("SELECT data FROM items WHERE kind = ? ORDER BY rowid", (self.kind,))
+        return [json.loads(r[0]) for r in rows]
+
+    def by_state(self, *states: str, limit: int | None = None) -> list[dict]:
+        rows = self._conn().execute(
+            f"SELECT data FROM items WHERE kind = ? AND state IN ({','.join('?' * len(states))}) "
+            f"ORDER BY rowid LIMIT ?",
+            (self.kind, *states, -1 if limit is None else limit),
+        )
+        return [json.loads(r[0]) for r in rows]
+
+    def count_by_state(self) -> dict[str, int]:
+        rows = self._conn().execute(
+            "SELECT state, COUNT(*) FROM items WHERE kind = ? GROUP BY state", (self.kind,)
+        )
+        return dict(rows.fetchall())
+
+    def add(self, item: dict) -> bool:
+        """Insert a newly discovered item; False if the id is already known."""
+        cur = self._conn().execute(
+            "INSERT OR IGNORE INTO items (kind, item_id, state, data, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (self.kind, item[self.id_field], item["state"], json.dumps(item, ensure_ascii=False), _now()),
+        )
+        return cur.rowcount == 1
+
+    def put(self, item: dict):
+        with self._transaction() as conn:
+            self._write(conn, item)
+
+    def update(self, item_id: str, from_states=None, **fields) -> dict | None:
+        """Atomically merge `fields` into an item (None values delete the key).
+
+        With `from_states`, the update only applies if the item is currently in
+        one of them. Returns the new item, or None if it was missing or skipped.
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT data FROM items WHERE kind = ? AND item_id = ?", (self.kind, item_id)
+            ).fetchone()
+            if row is None:
+                return None
+
+            item = json.loads(row[0])
+            if from_states is not None and item.get("state") not in from_states:
+                return None
+
+            for key, value in fields.items():
+                if value is None:
+                    item.pop(key, None)
+                else:
+                    item[key] = value
+            item["last_checked"] = _now()
+
+            self._write(conn, item)
+            return item
+
+    def transition(self, item_id: str, state: str, from_states=None, **fields) -> dict | None:
+        # A successful transition also clears the failure counter
+        return self.update(item_id, from_states, state=state, retries=None, **fields)
+
+    def fail(self, item_id: str, state: str | None = None, **fields) -> dict | None:
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT data FROM items WHERE kind = ? AND item_id = ?", (self.kind, item_id)
+            ).fetchone()
+            if row is None:
+                return None
+
+            item = json.loads(row[0])
+            item["retries"] = item.get("retries", 0) + 1
+            if state:
+                item["state"] = state
+            item.update(fields)
+            item["last_checked"] = _now()
+
+            self._write(conn, item)
+            return item
+
+    def export_json(self, path=None):
+        path = path or self.json_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.all(), f, ensure_ascii=False, indent=2)
+        tmp_path.replace(path)
+
+
+@lru_cache(maxsize=None)
+def get_registry(kind: str) -> RegistryStore:
+    return RegistryStore(kind)
+
+
+def _kind_for_path(path) -> str:
+    for kind, (_, json_path) in KINDS.items():
+        if path == json_path:
+            return kind
+    raise ValueError(f"Not a registry path: {path}")
+
+
+# Whole-registry helpers kept for ad-hoc scripts; the stages use RegistryStore directly
 def load_registry(path) -> dict:
-    if path.exists():
-        if str(path).lower() == str(BLOGS_URL_PATH).lower():
-            with open(path, "r", encoding="utf-8") as f:
-                # For multiple URLs (dicts) in a list
-                return {item["blog_id"]: item for item in json.load(f)} 
-                #For Single URL (dict) without list
-                # return {json.load(f)['blog_id']}
-        else:
-            with open(path, "r", encoding="utf-8") as f:
-                # For multiple URLs (dicts) in a list
-                return {item["episode_id"]: item for item in json.load(f)} 
-                # For Single url (dict) without list
-                # return {json.load(f)['episode_id']}
-    return {}
+    store = get_registry(_kind_for_path(path))
+    return {item[store.id_field]: item for item in store.all()}
+
 
 def save_registry(path, registry: dict):
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(list(registry.values()), f, ensure_ascii=False, indent=2)
\ No newline at end of file
+    store = get_registry(_kind_for_path(path))
+    with store._transaction() as conn:
+        for item in registry.values():
+            store._write(conn, item)
+    store.export_json(path)
+
+
+if __name__ == "__main__":
+    for kind in KINDS:
+        store = get_registry(kind)
+        store.migrate_from_json()
+        store.export_json()
+        logger.info(f"[REGISTRY] {kind} | {store.count_by_state()}")
@@ -0,0 +1,182 @@
+import io
+import logging
+import queue
+import threading
+from typing import Iterator, NamedTuple
+
+import numpy as np
+
+from app.ingestion.download import AUDIO_HEADERS, DOWNLOAD_TIMEOUT
+from app.ingestion.fetch import get_session
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+STREAM_READ_SIZE = 64 * 1024
+# Compressed audio held between the network and the decoder (~9 min of 128kbps MP3)
+STREAM_BUFFER_BYTES = 8 * 1024 * 1024
+# Audio handed to Whisper at a time; each window is cut at the quietest point
+# near its end so words aren't split across windows
+WINDOW_SECONDS = 120
+CUT_SEARCH_SECONDS = 10
+CUT_FRAME_SECONDS = 0.25
+
+
+class Segment(NamedTuple):
+    start: float
+    end: float
+    text: str
+
+
+class StreamBuffer(io.RawIOBase):
+    """Bounded in-memory pipe from an HTTP response to the decoder.
+
+    A feeder thread pushes response chunks into a bounded queue and blocks
+    when the decoder falls behind, so nothing touches disk and memory is
+    capped at `max_bytes` of compressed audio.
+    """
+
+    def __init__(self, max_bytes: int = STREAM_BUFFER_BYTES):
+        self._queue = queue.Queue(maxsize=max(1, max_bytes // STREAM_READ_SIZE))
+        self._pending = memoryview(b"")
+        self._eof = False
+        self._error = None
+        self._stopped = threading.Event()
+
+    def feed(self, response):
+        try:
+            for chunk in response.iter_content(chunk_size=STREAM_READ_SIZE):
+                if not self._put(chunk):
+                    return
+        except Exception as e:
+            self._error = e
+        finally:
+            self._put(None)
+
+    def _put(self, item) -> bool:
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._pending:
+            if self._eof:
+                return 0
+            chunk = self._queue.get()
+            if chunk is None:
+                self._eof = True
+                if self._error is not None:
+                    raise IOError(f"audio stream failed: {self._error}")
+                return 0
+            self._pending = memoryview(chunk)
+
+        n = min(len(b), len(self._pending))
+        b[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self):
+        # Unblocks the feeder if the decoder gave up early
+        self._stopped.set()
+        super().close()
+
+
+def decode_stream(fileobj) -> Iterator[np.ndarray]:
+    """Decode audio incrementally to 16 kHz mono float32, as faster-whisper expects."""
+    import av
+
+    resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+
+    with av.open(fileobj, mode="r", metadata_errors="ignore") as container:
+        frames = container.decode(audio=0)
+        while True:
+            try:
+                frame = next(frames)
+            except StopIteration:
+                break
+            except av.error.InvalidDataError:
+                # Same as faster-whisper: skip corrupt frames instead of failing the episode
+                continue
+
+            for out in resampler.resample(frame):
+                yield out.to_ndarray().reshape(-1).astype(np.float32) / 32768.0
+
+        for out in resampler.resample(None):
+            yield out.to_ndarray().reshape(-1).astype(np.float32) / 32768.0
+
+
+def quiet_cut(audio: np.ndarray, search_from: int) -> int:
+    frame = int(CUT_FRAME_SECONDS * SAMPLE_RATE)
+    tail = audio[search_from:]
+    n_frames = len(tail) // frame
+    if n_frames < 2:
+        return len(audio)
+
+    energy = np.square(tail[:n_frames * frame]).reshape(n_frames, frame).mean(axis=1)
+    return search_from + int(np.argmin(energy)) * frame + frame // 2
+
+
+def audio_windows(samples: Iterator[np.ndarray], window_seconds: float = WINDOW_SECONDS) -> Iterator[tuple[float, np.ndarray]]:
+    """Group decoded samples into (offset_seconds, window) pairs."""
+    window = int(window_seconds * SAMPLE_RATE)
+    search = int(CUT_SEARCH_SECONDS * SAMPLE_RATE)
+
+    parts = []
+    buffered = 0
+    offset = 0
+
+    for part in samples:
+        parts.append(part)
+        buffered += len(part)
+        if buffered < window:
+            continue
+
+        audio = np.concatenate(parts)
+        cut = quiet_cut(audio[:window], max(0, window - search))
+        yield offset / SAMPLE_RATE, audio[:cut]
+
+        offset += cut
+        parts = [audio[cut:]]
+        buffered = len(parts[0])
+
+    if buffered:
+        yield offset / SAMPLE_RATE, np.concatenate(parts)
+
+
+def transcribe_stream(audio_url: str, model) -> Iterator[Segment]:
+    """Transcribe an episode straight from its HTTP response.
+
+    Segments are yielded window by window with episode-relative timestamps,
+    so transcription starts after the first window has arrived, not the
+    whole file.
+    """
+    buffer = StreamBuffer()
+    with get_session().get(audio_url, headers=AUDIO_HEADERS, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+        r.raise_for_status()
+        feeder = threading.Thread(target=buffer.feed, args=(r,), daemon=True)
+        feeder.start()
+
+        try:
+            for offset, window in audio_windows(decode_stream(buffer)):
+                segments, _ = model.transcribe(
+                    window,
+                    language="en",
+                    beam_size=1,
+                    vad_filter=True,
+                    condition_on_previous_text=False,
+                )
+                for seg in segments:
+                    text = seg.text.strip()
+                    if text:
+                        yield Segment(offset + seg.start, offset + seg.end, text)
+        finally:
+            buffer.close()
+            feeder.join(timeout=5)
@@ -0,0 +1,144 @@
+from bisect import bisect_left
+from itertools import accumulate
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import tiktoken
+
+
+class TokenOffsetSplitter:
+    """Recursive separator splitting measured on a single tokenization.
+
+    Follows RecursiveCharacterTextSplitter (separators kept at the start of the
+    following piece, greedy merge with overlap, whitespace-stripped chunks),
+    but each document is encoded once. Every piece is a character span, and
+    its length is the number of tokens starting inside it, found by bisecting
+    the token offsets. That makes lengths additive across adjacent pieces, so
+    merging never re-tokenizes anything.
+    """
+
+    def __init__(
+        self,
+        separators: list[str],
+        chunk_size: int,
+        chunk_overlap: int,
+        encoding: "tiktoken.Encoding",
+    ):
+        self.separators = separators
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.encoding = encoding
+
+    def split_text(self, text: str) -> list[str]:
+        # Per-document state lives in its own object; one splitter is shared across threads
+        doc = _Document(self, text, self.token_offsets(text))
+        chunks = []
+        for start, end in doc.split(0, len(text), self.separators):
+            chunk = text[start:end].strip()
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def token_offsets(self, text: str) -> list[int]:
+        """Character offset at which each token of `text` starts."""
+        try:
+            raw = text.encode("utf-8")
+        except UnicodeEncodeError:
+            # Lone surrogates don't round-trip through the tokenizer
+            raise ValueError("text is not valid UTF-8")
+
+        tokens = self.encoding.encode(text, disallowed_special=())
+        pieces = self.encoding.decode_tokens_bytes(tokens)
+        # tiktoken's decode_with_offsets does this per token in Python; cumulative
+        # byte lengths are the same thing for a fraction of the cost
+        offsets = [0, *accumulate(len(p) for p in pieces)][:-1]
+        if text.isascii():
+            return offsets
+
+        # Map byte offsets to character offsets (a token starting inside a
+        # multi-byte character belongs to that character)
+        data = np.frombuffer(raw, dtype=np.uint8)
+        char_index = np.cumsum((data & 0xC0) != 0x80) - 1
+        return char_index[np.array(offsets, dtype=np.int64)].tolist() if offsets else []
+
+
+class _Document:
+    def __init__(self, splitter: TokenOffsetSplitter, text: str, offsets: list[int]):
+        self.chunk_size = splitter.chunk_size
+        self.chunk_overlap = splitter.chunk_overlap
+        self._text = text
+        self._offsets = offsets
+
+    def _ntokens(self, start: int, end: int) -> int:
+        return bisect_left(self._offsets, end) - bisect_left(self._offsets, start)
+
+    def _pieces(self, start: int, end: int, separator: str) -> list[tuple[int, int]]:
+        if not separator:
+            # Last resort: cut between tokens rather than between characters
+            first = bisect_left(self._offsets, start)
+            last = bisect_left(self._offsets, end)
+            cuts = [start] + [o for o in self._offsets[first:last] if o > start] + [end]
+            return [(a, b) for a, b in zip(cuts, cuts[1:]) if b > a]
+
+        cuts = [start]
+        pos = self._text.find(separator, start, end)
+        while pos != -1:
+            if pos > cuts[-1]:
+                cuts.append(pos)
+            pos = self._text.find(separator, pos + len(separator), end)
+        cuts.append(end)
+        return [(a, b) for a, b in zip(cuts, cuts[1:]) if b > a]
+
+    def split(self, start: int, end: int, separators: list[str]) -> list[tuple[int, int]]:
+        separator = separators[-1]
+        remaining = []
+        for i, sep in enumerate(separators):
+            if not sep:
+                separator = sep
+                break
+            if self._text.find(sep, start, end) != -1:
+                separator = sep
+                remaining = separators[i + 1:]
+                break
+
+        spans = []
+        good = []
+        for piece in self._pieces(start, end, separator):
+            if self._ntokens(*piece) < self.chunk_size:
+                good.append(piece)
+                continue
+
+            if good:
+                spans.extend(self._merge(good))
+                good = []
+            if remaining:
+                spans.extend(self.split(*piece, remaining))
+            else:
+                spans.append(piece)
+
+        if good:
+            spans.extend(self._merge(good))
+        return spans
+
+    def _merge(self, pieces: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        merged = []
+        window = []
+        total = 0
+
+        for piece in pieces:
+            length = self._ntokens(*piece)
+            if total + length > self.chunk_size and window:
+                merged.append((window[0][0], window[-1][1]))
+                # Keep a tail of at most chunk_overlap tokens that leaves room for this piece
+                while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                    total -= self._ntokens(*window[0])
+                    window.pop(0)
+
+            window.append(piece)
+            total += length
+
+        if window:
+            merged.append((window[0][0], window[-1][1]))
+        return merged
@@ -1,19 +1,31 @@
+import hashlib
 import json
-import requests
+import os
+import random
+import time
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from datetime import datetime, timezone
-from faster_whisper import WhisperModel
+from typing import TYPE_CHECKING
 
-from app.ingestion.storage import load_registry, save_registry
+from app.ingestion.download import DOWNLOAD_WORKERS, DiskBudgetExceeded, download_many
+from app.ingestion.storage import get_registry
+from app.ingestion.stream_transcribe import SAMPLE_RATE, Segment, transcribe_stream
 from app.core.config import (
-    PODCASTS_URL_PATH,
+    FAKE_WHISPER_RTF,
     PODCASTS_AUDIO_PATH,
     RAW_PODCASTS_DIR,
     MODEL_SIZE,
     COMPUTE_TYPE,
-    DEVICE
+    DEVICE,
+    TRANSCRIBE_MODE,
+    WHISPER_BACKEND,
     )
+from app.core.metrics import RATIO_BUCKETS, counter, histogram
+
+if TYPE_CHECKING:
+    from faster_whisper import WhisperModel
 
 
 logging.basicConfig(level=logging.INFO)
@@ -22,80 +34,157 @@ logger = logging.getLogger(__name__)
 MAX_RETRIES = 3
 DEV_MAX_EPISODES = 10 # DEV ONLY - set to None for production
 
-model = WhisperModel(
-    MODEL_SIZE,
-    device=DEVICE,
-    compute_type=COMPUTE_TYPE,
+# CTranslate2 stops scaling well past a handful of threads per model, so on
+# big boxes several single-model workers beat one model with every core
+THREADS_PER_WORKER = 4
+
+TRANSCRIBE_SECONDS = histogram("rag_transcribe_seconds", "Wall time per episode transcription", ("mode",), stage="transcribe")
+TRANSCRIBE_RTF = histogram(
+    "rag_transcribe_realtime_factor", "Transcription wall time / audio duration (below 1 is faster than real time)",
+    ("mode",), RATIO_BUCKETS,
 )
+TRANSCRIBED_AUDIO = counter("rag_transcribed_audio_seconds_total", "Seconds of audio transcribed")
+TRANSCRIPTIONS = counter("rag_transcriptions_total", "Episode transcriptions by outcome", ("mode", "result"))
+
+# Fake transcripts: MP3 bitrate assumed when sizing audio, segment length and speaking rate
+FAKE_MP3_BITRATE = 128_000
+FAKE_SEGMENT_SECONDS = 5.0
+FAKE_WORDS_PER_SECOND = 2.5
+_FAKE_VOCAB = (
+    "so the squat is really about bracing and you want to keep tension through the whole rep "
+    "athletes program tempo velocity sprint hamstring recovery sleep protein volume intensity coach"
+).split()
+
+_model = None
+
+
+class FakeTranscriptionInfo:
+    def __init__(self, duration: float):
+        self.duration = duration
+
+
+class FakeWhisperModel:
+    """Deterministic, offline stand-in for faster_whisper.WhisperModel.
+
+    Audio length comes from the file size at FAKE_MP3_BITRATE (or the sample
+    count for decoded windows); the transcript is seeded by the source, and
+    `rtf` seconds are slept per second of audio.
+    """
+
+    def __init__(self, rtf: float = FAKE_WHISPER_RTF):
+        self.rtf = rtf
+
+    def _segments(self, seed: bytes, duration: float):
+        rng = random.Random(hashlib.sha1(seed).digest())
+        start = 0.0
+        while start < duration:
+            end = min(duration, start + FAKE_SEGMENT_SECONDS)
+            words = max(1, round((end - start) * FAKE_WORDS_PER_SECOND))
+            text = " ".join(rng.choice(_FAKE_VOCAB) for _ in range(words))
+            yield Segment(start, end, " " + text[0].upper() + text[1:] + ".")
+            start = end
+
+    def transcribe(self, audio, **kwargs):
+        if isinstance(audio, str):
+            duration = os.path.getsize(audio) * 8 / FAKE_MP3_BITRATE
+            seed = Path(audio).name.encode("utf-8")
+        else:
+            duration = len(audio) / SAMPLE_RATE
+            seed = audio[:SAMPLE_RATE].tobytes()
 
-def download_audio(audio_url: str, episode_id: str) -> Path:
-    PODCASTS_AUDIO_PATH.mkdir(parents=True, exist_ok=True)
-    audio_path = PODCASTS_AUDIO_PATH / f"{episode_id}.mp3"
+        if self.rtf:
+            time.sleep(duration * self.rtf)
+        return self._segments(seed, duration), FakeTranscriptionInfo(duration)
 
-    if audio_path.exists():
-        logger.info(f"[SKIP] Audio already exists: {audio_path}")
-        return audio_path
-    
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Accept": "*/*",
-        "Referer": "https://www.buzzsprout.com/"
-    }
 
-    logger.info(f"[DOWNLOAD] {episode_id}")
+def load_model(cpu_threads: int = 0) -> "WhisperModel":
+    if WHISPER_BACKEND == "fake":
+        return FakeWhisperModel()
+    if WHISPER_BACKEND != "faster-whisper":
+        raise ValueError(f"Unknown Whisper backend: {WHISPER_BACKEND}")
 
-    with requests.get(audio_url, headers=headers, stream=True, timeout=60) as r:
-        r.raise_for_status()
-        with open(audio_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8162):
-                if chunk:
-                    f.write(chunk)
+    from faster_whisper import WhisperModel
 
-    return audio_path
+    return WhisperModel(
+        MODEL_SIZE,
+        device=DEVICE,
+        compute_type=COMPUTE_TYPE,
+        cpu_threads=cpu_threads,
+    )
 
-def audio_downloader():
-    registry = load_registry(PODCASTS_URL_PATH)
+def get_model() -> "WhisperModel":
+    # Loaded on first use so pool workers (and the parent) don't each pay for a model they never run
+    global _model
+    if _model is None:
+        _model = load_model()
+    return _model
+
+def plan_workers(workers: int | None = None) -> tuple[int, int]:
+    cpus = os.cpu_count() or 1
+    if workers is None:
+        workers = max(1, cpus // THREADS_PER_WORKER)
+    workers = max(1, min(workers, cpus))
+    return workers, max(1, cpus // workers)
+
+def audio_downloader(workers: int = DOWNLOAD_WORKERS):
+    registry = get_registry("podcasts")
     downloaded = 0
-    processed = 0 #Dev only
 
-    for episode_id, item in registry.items():
-        if DEV_MAX_EPISODES and processed >= DEV_MAX_EPISODES: #Dev only
+    jobs = []
+    for item in registry.by_state("DISCOVERED", "AUDIO_FAILED"):
+        if DEV_MAX_EPISODES and len(jobs) >= DEV_MAX_EPISODES: #Dev only
             logger.info("[DEV] Epsiode limit reached")
             break
-
-        if item["state"] not in {"DISCOVERED", "AUDIO_FAILED"}:
-            continue
-
-        retries = item.get("retries", 0)
-        if retries >= MAX_RETRIES:
+        if item.get("retries", 0) >= MAX_RETRIES:
             continue
+        jobs.append((item["episode_id"], item["audio_url"]))
 
-        try:
-            download_audio(item["audio_url"], episode_id)
-
-            item["state"] = "AUDIO_DOWNLOADED"
-            item["last_checked"] = datetime.now(timezone.utc).isoformat()
-            item.pop("retries", None)
-
+    for episode_id, _, error in download_many(jobs, workers):
+        if error is None:
+            registry.transition(episode_id, "AUDIO_DOWNLOADED")
             downloaded += 1
-            processed += 1 # Dev only
+        elif isinstance(error, DiskBudgetExceeded):
+            # Not the episode's fault; it stays queued for the next run
+            logger.warning(f"[DEFERRED] {episode_id} | {error}")
+        else:
+            logger.error(f"[ERROR] {episode_id} | {error}")
+            registry.fail(episode_id, "AUDIO_FAILED")
 
-        except Exception as e:
-            logger.error(f"[ERROR] {episode_id} | {e}")
+    logger.info(f"[DONE] Audio downloaded: {downloaded}")
 
-            item["state"] = "AUDIO_FAILED"
-            item["retries"] = retries + 1
-            item["last_checked"] = datetime.now(timezone.utc).isoformat()
 
-    save_registry(PODCASTS_URL_PATH, registry)
-    logger.info(f"[DONE] Audio downloaded: {downloaded}")
+def pack_segments(segments, duration: float | None = None) -> dict | None:
+    """Columnar transcript: the joined text plus per-segment start/end times and
+    the character offset where each segment begins in that text. `duration`
+    (seconds of audio) defaults to the end of the last segment."""
+    texts, starts, ends, offsets = [], [], [], []
+    pos = 0
 
+    for seg in segments:
+        text = seg.text.strip()
+        if not text:
+            continue
+        if texts:
+            pos += 1  # the joining space
+        offsets.append(pos)
+        starts.append(round(seg.start, 2))
+        ends.append(round(seg.end, 2))
+        texts.append(text)
+        pos += len(text)
+
+    if not texts:
+        return None
+    return {
+        "transcript": " ".join(texts),
+        "segments": {"start": starts, "end": ends, "offset": offsets},
+        "duration": round(duration if duration is not None else ends[-1], 2),
+    }
 
-def transcribe_audio(audio_path: Path) -> str | None:
+def transcribe_audio(audio_path: Path, model: "WhisperModel | None" = None) -> dict | None:
     logger.info(f"[TRANSCRIBE] {audio_path.name}")
 
     try:
-        segments, _ = model.transcribe(
+        segments, info = (model or get_model()).transcribe(
             str(audio_path),
             language="en",
             beam_size=1,
@@ -103,14 +192,23 @@ def transcribe_audio(audio_path: Path) -> str | None:
             condition_on_previous_text=False
         )
 
-        transcript = " ".join(seg.text.strip() for seg in segments).strip()
-        return transcript if transcript else None
+        return pack_segments(segments, info.duration)
     
     except Exception as e:
         logger.error(f"[FAILED] Transcription error | {e}")
         return None
 
-def save_raw_transcript(episode_id: str, item: dict, transcript: str):
+def transcribe_url(audio_url: str, model: "WhisperModel | None" = None) -> dict | None:
+    logger.info(f"[TRANSCRIBE STREAM] {audio_url}")
+
+    try:
+        return pack_segments(transcribe_stream(audio_url, model or get_model()))
+
+    except Exception as e:
+        logger.error(f"[FAILED] Stream transcription error | {e}")
+        return None
+
+def save_raw_transcript(episode_id: str, item: dict, transcript: dict) -> dict:
     RAW_PODCASTS_DIR.mkdir(parents=True, exist_ok=True)
 
     raw_path = RAW_PODCASTS_DIR / f"{episode_id}.json"
@@ -121,48 +219,113 @@ def save_raw_transcript(episode_id: str, item: dict, transcript: str):
         "episode_url": item["episode_url"],
         "audio_url": item["audio_url"],
         "published_at": item["published_at"],
-        "transcript": transcript
+        "transcript": transcript["transcript"],
+        "segments": transcript["segments"],
     }
 
+    # No indent: the segment columns would otherwise put every number on its own line
     with open(raw_path, "w", encoding="utf-8") as f:
-        json.dump(raw_payload, f, indent=2, ensure_ascii=False)
-
-def audio_transcriber():
-    registry = load_registry(PODCASTS_URL_PATH)
+        json.dump(raw_payload, f, ensure_ascii=False)
+
+    return raw_payload
+
+def record_transcription(source, transcript: dict | None, seconds: float):
+    """Metrics for one finished job; called in the parent, since jobs may run in pool workers."""
+    mode = "stream" if str(source).startswith(("http://", "https://")) else "file"
+    TRANSCRIPTIONS.inc(mode=mode, result="ok" if transcript else "failed")
+    if not transcript:
+        return
+
+    TRANSCRIBE_SECONDS.observe(seconds, mode=mode)
+    if transcript.get("duration"):
+        TRANSCRIBED_AUDIO.inc(transcript["duration"])
+        TRANSCRIBE_RTF.observe(seconds / transcript["duration"], mode=mode)
+
+def _init_worker(cpu_threads: int):
+    global _model
+    _model = load_model(cpu_threads)
+
+def _transcribe_job(episode_id: str, source: str) -> tuple[str, dict | None, float]:
+    # `source` is a local audio path, or an http(s) URL to stream from
+    start = time.perf_counter()
+    if source.startswith(("http://", "https://")):
+        transcript = transcribe_url(source)
+    else:
+        transcript = transcribe_audio(Path(source))
+    return episode_id, transcript, time.perf_counter() - start
+
+def transcribe_episodes(jobs: list[tuple[str, Path | str]], workers: int | None = None):
+    """Yield (episode_id, transcript, seconds) as each episode finishes.
+
+    With more than one worker, each process loads its own model once and pulls
+    episodes from the pool's queue; results arrive in completion order.
+    """
+    workers, cpu_threads = plan_workers(workers)
+
+    if workers == 1 or len(jobs) == 1:
+        for episode_id, source in jobs:
+            yield _transcribe_job(episode_id, str(source))
+        return
+
+    logger.info(f"[POOL] {workers} workers x {cpu_threads} threads for {len(jobs)} episodes")
+
+    # spawn, not fork: CTranslate2 thread pools don't survive a fork
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(cpu_threads,),
+    ) as pool:
+        futures = [pool.submit(_transcribe_job, episode_id, str(source)) for episode_id, source in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+def audio_transcriber(workers: int | None = None, mode: str = TRANSCRIBE_MODE):
+    registry = get_registry("podcasts")
     completed = 0
+    jobs = []
+    items = {}
 
-    for episode_id, item in registry.items():
-        if item["state"] != "AUDIO_DOWNLOADED":
+    # Streaming picks up episodes that were never downloaded as well
+    states = ("AUDIO_DOWNLOADED",) if mode == "file" else ("AUDIO_DOWNLOADED", "DISCOVERED", "AUDIO_FAILED")
+
+    for item in registry.by_state(*states):
+        episode_id = item["episode_id"]
+        retries = item.get("retries", 0)
+        if retries >= MAX_RETRIES:
             continue
 
         audio_path = PODCASTS_AUDIO_PATH / f"{episode_id}.mp3"
-        if not audio_path.exists():
+        if audio_path.exists():
+            source = audio_path
+        elif mode == "stream":
+            source = item["audio_url"]
+        else:
             logger.warning(f"[MISSING AUDIO] {episode_id}")
             continue
 
-        retries = item.get("retries", 0)
-        if retries >= MAX_RETRIES:
-            continue
-
-        transcript = transcribe_audio(audio_path)
+        items[episode_id] = item
+        jobs.append((episode_id, source))
 
+    sources = dict(jobs)
+    for episode_id, transcript, seconds in transcribe_episodes(jobs, workers):
+        record_transcription(sources[episode_id], transcript, seconds)
         if transcript:
-            save_raw_transcript(episode_id, item, transcript)
+            save_raw_transcript(episode_id, items[episode_id], transcript)
 
             # delete audio after success
-            audio_path.unlink(missing_ok=True)
+            (PODCASTS_AUDIO_PATH / f"{episode_id}.mp3").unlink(missing_ok=True)
 
-            item["state"] = "TRANSCRIBED"
-            item["last_checked"] = datetime.now(timezone.utc).isoformat()
-            item.pop("retries", None)
+            # Each episode commits on its own, so a crash only loses in-flight work
+            registry.transition(episode_id, "TRANSCRIBED", from_states=set(states))
 
             completed += 1
-            logger.info(f"[DONE] {episode_id}")
+            logger.info(f"[DONE] {episode_id} | {seconds:.0f}s")
 
         else:
-            item["retries"] = retries + 1
-            item["last_checked"] = datetime.now(timezone.utc).isoformat()
+            # A failed stream is a fetch failure as much as a transcription one
+            state = "AUDIO_FAILED" if items[episode_id]["state"] != "AUDIO_DOWNLOADED" else None
+            item = registry.fail(episode_id, state)
             logger.error(f"[RETRY] {episode_id} ({item['retries']})")
 
-    save_registry(PODCASTS_URL_PATH, registry)
-    logger.info(f"[ALL DONE] Transcription complete: {completed}")
\ No newline at end of file
+    logger.info(f"[ALL DONE] Transcription complete: {completed}")
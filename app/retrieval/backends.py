@@ -0,0 +1,267 @@
+import logging
+import threading
+
+import numpy as np
+
+from app.core.cache import collection_version
+from app.core.config import EXACT_SEARCH_MAX_VECTORS, EXACT_SEARCH_MEMORY_MB, RETRIEVAL_BACKEND
+from app.core.vectorstore import get_vectorstore
+from app.retrieval.exact import ExactIndex
+from app.retrieval.filters import UnsupportedFilter, where_mask
+from app.retrieval.quantized import QuantizedIndex, index_path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def format_results(results: dict, index: int = 0) -> list[dict]:
+    return [
+        {
+            "chunk_id": chunk_id,
+            "text": document,
+            "metadata": metadata or {},
+            "distance": distance,
+        }
+        for chunk_id, document, metadata, distance in zip(
+            results["ids"][index],
+            results["documents"][index],
+            results["metadatas"][index],
+            results["distances"][index],
+        )
+    ]
+
+
+class ChromaBackend:
+    """Approximate search through Chroma's HNSW index."""
+
+    name = "chroma"
+
+    def search(self, query_vector: list[float], collection_name: str, top_k: int, where: dict | None) -> list[dict]:
+        return self.search_many([query_vector], collection_name, top_k, where)[0]
+
+    def search_many(self, query_vectors: list[list[float]], collection_name: str, top_k: int, where: dict | None) -> list[list[dict]]:
+        results = get_vectorstore(collection_name, create=False)._collection.query(
+            query_embeddings=list(query_vectors),
+            n_results=top_k,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [format_results(results, i) for i in range(len(query_vectors))]
+
+
+def hydrate(collection_name: str, scored: list[tuple[str, float]]) -> list[dict]:
+    """Turn (chunk_id, cosine) pairs into hits, reading text/metadata from Chroma's
+    metadata store (which doesn't load the HNSW segment)."""
+    if not scored:
+        return []
+
+    got = get_vectorstore(collection_name, create=False)._collection.get(
+        ids=[chunk_id for chunk_id, _ in scored], include=["documents", "metadatas"]
+    )
+    found = {i: (d, m) for i, d, m in zip(got["ids"], got["documents"], got["metadatas"])}
+
+    hits = []
+    for chunk_id, cosine in scored:
+        if chunk_id not in found:
+            # Deleted since the local index was built
+            continue
+        document, metadata = found[chunk_id]
+        hits.append({
+            "chunk_id": chunk_id,
+            "text": document,
+            "metadata": metadata or {},
+            # Same convention as Chroma's cosine space
+            "distance": 1.0 - cosine,
+        })
+    return hits
+
+
+class QuantizedBackend:
+    """Search a QuantizedIndex snapshot, falling back to Chroma when it can't answer.
+
+    That is: no index built yet, an index older than the collection version
+    (so results could miss new chunks), or a filter on an unstored field.
+    `python -m app quantize` builds the indexes; after that, embed and
+    pipeline runs rebuild them, so only writes from elsewhere leave one stale.
+    """
+
+    name = "quantized"
+
+    def __init__(self, fallback: ChromaBackend | None = None):
+        self.fallback = fallback or ChromaBackend()
+        # collection -> ((collection version, index mtime) when loaded, index)
+        self._indexes: dict[str, tuple[tuple, QuantizedIndex | None]] = {}
+        self._warned: set[tuple[str, str]] = set()
+        self._lock = threading.Lock()
+
+    def index(self, collection_name: str) -> QuantizedIndex | None:
+        version = collection_version(collection_name)
+        # A rebuild swaps the directory, so the info file's mtime spots it
+        info = index_path(collection_name) / "info.json"
+        key = (version, info.stat().st_mtime_ns if info.exists() else None)
+        with self._lock:
+            cached = self._indexes.get(collection_name)
+            if cached is None or cached[0] != key:
+                cached = (key, QuantizedIndex.load(index_path(collection_name)))
+                self._indexes[collection_name] = cached
+            index = cached[1]
+
+        if index is None or index.version != version:
+            if (collection_name, version) not in self._warned:
+                self._warned.add((collection_name, version))
+                logger.warning(
+                    f"[QUANTIZED] {collection_name} index missing or stale; using Chroma until "
+                    f"`python -m app quantize {collection_name}` is re-run"
+                )
+            return None
+        return index
+
+    def search(self, query_vector: list[float], collection_name: str, top_k: int, where: dict | None) -> list[dict]:
+        index = self.index(collection_name)
+        if index is None:
+            return self.fallback.search(query_vector, collection_name, top_k, where)
+
+        try:
+            mask = where_mask(where, index.columns, len(index))
+        except UnsupportedFilter as e:
+            logger.info(f"[QUANTIZED] {e} not indexed; using Chroma")
+            return self.fallback.search(query_vector, collection_name, top_k, where)
+
+        scored = index.search(np.asarray(query_vector, dtype=np.float32), top_k, mask)
+        return hydrate(collection_name, scored)
+
+    def search_many(self, query_vectors: list[list[float]], collection_name: str, top_k: int, where: dict | None) -> list[list[dict]]:
+        return [self.search(v, collection_name, top_k, where) for v in query_vectors]
+
+
+class ExactBackend:
+    """Brute-force search over each collection's vectors held in RAM.
+
+    The matrix is loaded from Chroma on first use. When the collection
+    version moves, it is reloaded on a background thread while queries keep
+    using the previous matrix, so results can trail a write by one reload.
+    """
+
+    name = "exact"
+
+    def __init__(self, fallback: ChromaBackend | None = None):
+        self.fallback = fallback or ChromaBackend()
+        self._indexes: dict[str, ExactIndex] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._reloading: set[str] = set()
+        self._lock = threading.Lock()
+
+    def index(self, collection_name: str) -> ExactIndex:
+        index = self._indexes.get(collection_name)
+        if index is not None:
+            if index.version != collection_version(collection_name):
+                self._reload_in_background(collection_name)
+            return index
+
+        with self._lock:
+            load_lock = self._locks.setdefault(collection_name, threading.Lock())
+        # Nothing to serve yet: one loader per collection, other callers wait for its result
+        with load_lock:
+            index = self._indexes.get(collection_name)
+            if index is None:
+                index = ExactIndex.from_collection(collection_name)
+                self._indexes[collection_name] = index
+            return index
+
+    def _reload_in_background(self, collection_name: str):
+        with self._lock:
+            if collection_name in self._reloading:
+                return
+            self._reloading.add(collection_name)
+        threading.Thread(
+            target=self._reload, args=(collection_name,), name=f"exact-reload-{collection_name}", daemon=True
+        ).start()
+
+    def _reload(self, collection_name: str):
+        try:
+            # Swapped in whole; a write during the load leaves it stale and the next query reloads again
+            self._indexes[collection_name] = ExactIndex.from_collection(collection_name)
+        except Exception as e:
+            logger.error(f"[EXACT] Reload of {collection_name} failed; serving the previous matrix | {e}")
+        finally:
+            with self._lock:
+                self._reloading.discard(collection_name)
+
+    def search(self, query_vector: list[float], collection_name: str, top_k: int, where: dict | None) -> list[dict]:
+        return self.search_many([query_vector], collection_name, top_k, where)[0]
+
+    def search_many(self, query_vectors: list[list[float]], collection_name: str, top_k: int, where: dict | None) -> list[list[dict]]:
+        index = self.index(collection_name)
+        try:
+            mask = index.mask(where)
+        except UnsupportedFilter as e:
+            logger.info(f"[EXACT] {e} not indexed; using Chroma")
+            return self.fallback.search_many(query_vectors, collection_name, top_k, where)
+
+        return [hydrate(collection_name, scored) for scored in index.search(query_vectors, top_k, mask)]
+
+
+class AutoBackend:
+    """Exact search while a collection's matrix fits the memory budget, Chroma's HNSW beyond.
+
+    The vector limit is `max_exact` when given, otherwise `memory_mb` divided
+    by the bytes per vector of the collection's dimensionality.
+    """
+
+    name = "auto"
+
+    def __init__(self, max_exact: int = EXACT_SEARCH_MAX_VECTORS, memory_mb: int = EXACT_SEARCH_MEMORY_MB):
+        self.max_exact = max_exact
+        self.memory_mb = memory_mb
+        self.chroma = ChromaBackend()
+        self.exact = ExactBackend(fallback=self.chroma)
+        # collection -> (collection version, vector count, vector limit)
+        self._counts: dict[str, tuple[str, int, int]] = {}
+
+    def limit(self, collection) -> int:
+        if self.max_exact:
+            return self.max_exact
+        sample = collection.get(limit=1, include=["embeddings"])["embeddings"]
+        if sample is None or len(sample) == 0:
+            return 0
+        return self.memory_mb * 1024**2 // (4 * len(sample[0]))
+
+    def choose(self, collection_name: str):
+        version = collection_version(collection_name)
+        cached = self._counts.get(collection_name)
+        if cached is None or cached[0] != version:
+            collection = get_vectorstore(collection_name, create=False)._collection
+            count = collection.count()
+            # The dimensionality doesn't change within a collection, so neither does a derived limit
+            limit = cached[2] if cached is not None and cached[2] else self.limit(collection)
+            if cached is not None and (cached[1] <= cached[2]) != (count <= limit):
+                logger.info(f"[AUTO] {collection_name} has {count} vectors (limit {limit}); switching backend")
+            cached = (version, count, limit)
+            self._counts[collection_name] = cached
+        return self.exact if cached[1] <= cached[2] else self.chroma
+
+    def search(self, query_vector: list[float], collection_name: str, top_k: int, where: dict | None) -> list[dict]:
+        return self.choose(collection_name).search(query_vector, collection_name, top_k, where)
+
+    def search_many(self, query_vectors: list[list[float]], collection_name: str, top_k: int, where: dict | None) -> list[list[dict]]:
+        return self.choose(collection_name).search_many(query_vectors, collection_name, top_k, where)
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+BACKENDS = {
+    "chroma": ChromaBackend,
+    "quantized": QuantizedBackend,
+    "exact": ExactBackend,
+    "auto": AutoBackend,
+}
+
+
+def get_backend(name: str = RETRIEVAL_BACKEND):
+    with _backends_lock:
+        if name not in _backends:
+            if name not in BACKENDS:
+                raise ValueError(f"Unknown retrieval backend: {name}")
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
@@ -1,8 +1,309 @@
+import asyncio
+import json
 import logging
+import threading
+import time
+from contextlib import asynccontextmanager
 from typing import Dict, List
 
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+from starlette.background import BackgroundTask
+
+from app.core.cache import LatencyStats
+from app.core.config import COLLECTIONS, RERANK_CANDIDATES
+from app.core.embeddings import get_embeddings
+from app.core.llm import get_llm
+from app.core.metrics import counter, histogram, render_prometheus
+from app.core.vectorstore import close_vectorstores, warm_vectorstores
+from app.retrieval.rerank import get_reranker, rerank
+from app.retrieval.retrieve import cache_stats, embed_query, retrieve
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CHAT_MAX_CONCURRENCY = 32
+QUEUE_TIMEOUT = 5
+RETRIEVAL_TIMEOUT = 10
+GENERATION_TIMEOUT = 60
+DEFAULT_TOP_K = 5
+MAX_TOP_K = 50
+
+SYSTEM_PROMPT = (
+    "You are the Challenger Strength assistant. Answer the question using only the "
+    "numbered context passages from our blog posts and podcast episodes. Cite passages "
+    "like [1]. If the context does not contain the answer, say you don't know."
+)
+
+_slots = asyncio.Semaphore(CHAT_MAX_CONCURRENCY)
+_stage_latency = LatencyStats()
+_warm = threading.Event()
+
+CHAT_STAGE_SECONDS = histogram("rag_chat_stage_seconds", "Chat request latency by stage", ("stage",))
+CHAT_REQUESTS = counter("rag_chat_requests_total", "Chat requests by outcome", ("result",))
+
+
+class ChatRequest(BaseModel):
+    question: str
+    top_k: int = Field(DEFAULT_TOP_K, ge=1, le=MAX_TOP_K)
+    collections: List[str] | None = None
+    hybrid: bool = False
+    # Only takes effect when a re-ranker is configured (RERANKER)
+    rerank: bool = True
+    stream: bool = True
+
+    @field_validator("collections")
+    @classmethod
+    def known_collections(cls, value):
+        # A 422 here, rather than the name reaching the vector store
+        unknown = sorted(set(value or ()) - set(COLLECTIONS))
+        if unknown:
+            raise ValueError(f"unknown collections: {', '.join(unknown)}")
+        return value
+
+
+class ChatTimeout(Exception):
+    pass
+
+
+def build_prompt(question: str, hits: List[Dict]) -> list:
+    context = "\n\n".join(
+        f"[{i}] {hit['metadata'].get('title', '')}\n{hit['text']}"
+        for i, hit in enumerate(hits, start=1)
+    )
+    return [
+        ("system", SYSTEM_PROMPT),
+        ("human", f"Context:\n{context}\n\nQuestion: {question}"),
+    ]
+
+
+def format_sources(hits: List[Dict]) -> List[Dict]:
+    return [
+        {
+            "index": i,
+            "chunk_id": hit["chunk_id"],
+            "collection": hit.get("collection"),
+            "title": hit["metadata"].get("title", ""),
+            # Podcast chunks link straight to the moment in the episode
+            "source_url": hit["metadata"].get("timestamp_url") or hit["metadata"].get("source_url", ""),
+            "start_s": hit["metadata"].get("start_s"),
+            "score": hit.get("score"),
+            "rerank_score": hit.get("rerank_score"),
+        }
+        for i, hit in enumerate(hits, start=1)
+    ]
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _record(timings: Dict[str, float]):
+    for stage, ms in timings.items():
+        _stage_latency.record(stage, ms / 1000)
+        CHAT_STAGE_SECONDS.observe(ms / 1000, stage=stage)
+    CHAT_REQUESTS.inc(result="ok")
+
+
+async def prepare(request: ChatRequest, timings: Dict[str, float]) -> tuple[list, List[Dict]]:
+    # Chroma and the embedding client are blocking; keep them off the event loop.
+    # embed_query fills the query-vector cache, so retrieve() below doesn't re-embed.
+    start = time.perf_counter()
+    await asyncio.to_thread(embed_query, request.question)
+    timings["embed"] = _elapsed_ms(start)
+
+    reranker = get_reranker() if request.rerank else None
+    # With a re-ranker, retrieve a wider candidate set and let it pick the top_k
+    candidates = max(request.top_k, RERANK_CANDIDATES) if reranker else request.top_k
+
+    start = time.perf_counter()
+    hits = await asyncio.to_thread(
+        retrieve,
+        request.question,
+        request.collections,
+        candidates,
+        None,
+        request.hybrid,
+    )
+    timings["search"] = _elapsed_ms(start)
+
+    if reranker:
+        start = time.perf_counter()
+        hits = await asyncio.to_thread(
+            rerank, request.question, hits, request.top_k, reranker, fused=request.hybrid
+        )
+        timings["rerank"] = _elapsed_ms(start)
+
+    start = time.perf_counter()
+    messages = build_prompt(request.question, hits)
+    timings["prompt"] = _elapsed_ms(start)
+
+    return messages, hits
+
+
+async def generate(messages: list, timings: Dict[str, float]):
+    start = time.perf_counter()
+    deadline = start + GENERATION_TIMEOUT
+    stream = get_llm().astream(messages).__aiter__()
+
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            raise ChatTimeout("generation timed out")
+        try:
+            chunk = await asyncio.wait_for(stream.__anext__(), remaining)
+        except StopAsyncIteration:
+            break
+        except asyncio.TimeoutError:
+            raise ChatTimeout("generation timed out")
+
+        if "first_token" not in timings:
+            timings["first_token"] = _elapsed_ms(start)
+        if chunk.content:
+            yield chunk.content
+
+    timings["generate"] = _elapsed_ms(start)
+
+
+async def _acquire_slot():
+    try:
+        await asyncio.wait_for(_slots.acquire(), QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        CHAT_REQUESTS.inc(result="rejected")
+        raise HTTPException(status_code=503, detail="Chat service is at capacity")
+
+
+def _slot_releaser():
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            _slots.release()
+
+    return release
+
+
+async def _prepare_with_timeout(request: ChatRequest, timings: Dict[str, float]):
+    try:
+        return await asyncio.wait_for(prepare(request, timings), RETRIEVAL_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise ChatTimeout("retrieval timed out")
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_answer(request: ChatRequest, start: float, release):
+    # The slot is already held; release() is idempotent and also runs as the
+    # response's background task, which covers a client that never read the body
+    timings = {"queue": _elapsed_ms(start)}
+    try:
+        messages, hits = await _prepare_with_timeout(request, timings)
+        yield sse("sources", format_sources(hits))
+
+        async for text in generate(messages, timings):
+            yield sse("token", {"text": text})
+
+        timings["total"] = _elapsed_ms(start)
+        _record(timings)
+        logger.info(f"[CHAT] {timings}")
+        yield sse("done", {"timings": timings})
+
+    except ChatTimeout as e:
+        CHAT_REQUESTS.inc(result="timeout")
+        logger.error(f"[TIMEOUT] {e} | {timings}")
+        yield sse("error", {"detail": str(e), "timings": timings})
+
+    except Exception as e:
+        # Headers are already sent, so the error can only be reported in-stream
+        CHAT_REQUESTS.inc(result="error")
+        logger.exception(f"[ERROR] {e} | {timings}")
+        yield sse("error", {"detail": "Internal error", "timings": timings})
+
+    finally:
+        release()
+
+
+def warm():
+    start = time.perf_counter()
+    try:
+        get_llm()
+        get_embeddings("retrieval_query")
+        warm_vectorstores(COLLECTIONS)
+    except Exception as e:
+        logger.error(f"[WARM] Failed; loading on first request instead | {e}")
+        return
+    _warm.set()
+    logger.info(f"[WARM] Chat ready | {time.perf_counter() - start:.2f}s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm in the background so the worker accepts requests at once; early
+    # requests wait on the same client/store locks rather than on startup
+    warming = asyncio.create_task(asyncio.to_thread(warm))
+    yield
+    await warming
+    close_vectorstores()
+
+
+app = FastAPI(title="Challenger Strength RAG Chat", lifespan=lifespan)
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    start = time.perf_counter()
+    # Acquired before any response starts, so a full server answers 503 on both paths
+    await _acquire_slot()
+
+    if request.stream:
+        release = _slot_releaser()
+        return StreamingResponse(
+            stream_answer(request, start, release),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            background=BackgroundTask(release),
+        )
+
+    timings = {}
+    try:
+        timings["queue"] = _elapsed_ms(start)
+        messages, hits = await _prepare_with_timeout(request, timings)
+        answer = "".join([text async for text in generate(messages, timings)])
+    except ChatTimeout as e:
+        CHAT_REQUESTS.inc(result="timeout")
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception:
+        CHAT_REQUESTS.inc(result="error")
+        raise
+    finally:
+        _slots.release()
+
+    timings["total"] = _elapsed_ms(start)
+    _record(timings)
+    return {"answer": answer, "sources": format_sources(hits), "timings": timings}
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "warm": _warm.is_set()}
+
+
+@app.get("/stats")
+async def stats():
+    return {"stages": _stage_latency.summary(), "retrieval": cache_stats()}
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 
+if __name__ == "__main__":
+    import uvicorn
 
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,108 @@
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+
+from app.core.cache import collection_version
+from app.core.vectorstore import get_vectorstore, iter_collection
+from app.retrieval.filters import metadata_columns, where_mask
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LOAD_PAGE_SIZE = 1000
+# Queries scored per matmul; bounds the (queries x vectors) score matrix
+QUERY_BLOCK = 64
+MASK_CACHE_SIZE = 256
+
+
+class ExactIndex:
+    """A collection's vectors as one contiguous, normalized float32 matrix.
+
+    Search is a single matrix product plus `argpartition`, so it is exact and
+    its latency depends only on collection size. Filter masks are evaluated
+    once per distinct `where` and reused.
+    """
+
+    def __init__(self, chunk_ids: np.ndarray, matrix: np.ndarray, columns: dict[str, np.ndarray], version: str):
+        self.chunk_ids = chunk_ids
+        self.matrix = matrix
+        self.columns = columns
+        self.version = version
+        self._masks: dict[str, np.ndarray | None] = {}
+        self._masks_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+    @classmethod
+    def from_collection(cls, collection_name: str, page_size: int = LOAD_PAGE_SIZE) -> "ExactIndex":
+        start = time.perf_counter()
+        # Read the version first: a write during the load then shows up as stale
+        version = collection_version(collection_name)
+        collection = get_vectorstore(collection_name, create=False)._collection
+
+        chunk_ids, parts, metadatas = [], [], []
+        for page in iter_collection(collection, ["embeddings", "metadatas"], page_size):
+            chunk_ids.extend(page["ids"])
+            parts.append(np.asarray(page["embeddings"], dtype=np.float32))
+            metadatas.extend(page["metadatas"])
+
+        matrix = np.concatenate(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+        index = cls(np.array(chunk_ids, dtype=str), matrix, metadata_columns(metadatas), version)
+        logger.info(
+            f"[EXACT] Loaded {collection_name} | {len(index)} vectors | "
+            f"{index.nbytes / 1e6:.1f}MB | {time.perf_counter() - start:.2f}s"
+        )
+        return index
+
+    def mask(self, where: dict | None) -> np.ndarray | None:
+        """Boolean row mask for a `where` clause; raises UnsupportedFilter like where_mask."""
+        if not where:
+            return None
+
+        key = json.dumps(where, sort_keys=True)
+        with self._masks_lock:
+            mask = self._masks.get(key)
+        if mask is None:
+            mask = where_mask(where, self.columns, len(self))
+            with self._masks_lock:
+                if len(self._masks) >= MASK_CACHE_SIZE:
+                    self._masks.pop(next(iter(self._masks)))
+                self._masks[key] = mask
+        return mask
+
+    def search(self, queries, top_k: int, mask: np.ndarray | None = None) -> list[list[tuple[str, float]]]:
+        """Top-k (chunk_id, cosine) per query row, among rows allowed by `mask`."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        allowed = len(self) if mask is None else int(mask.sum())
+        k = min(top_k, allowed)
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        results = []
+        for start in range(0, len(queries), QUERY_BLOCK):
+            scores = queries[start:start + QUERY_BLOCK] @ self.matrix.T
+            if mask is not None:
+                scores[:, ~mask] = -np.inf
+
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            results.extend(
+                [(str(self.chunk_ids[i]), float(s)) for i, s in zip(rows, row_scores)]
+                for rows, row_scores in zip(top, top_scores)
+            )
+        return results
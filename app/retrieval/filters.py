@@ -0,0 +1,72 @@
+import numpy as np
+
+# Metadata fields the local backends keep as columns; build_where only filters on these
+FILTER_FIELDS = ("parent_id", "source_type", "published_ts")
+
+_RANGE_OPS = {
+    "$gt": np.greater,
+    "$gte": np.greater_equal,
+    "$lt": np.less,
+    "$lte": np.less_equal,
+}
+
+
+class UnsupportedFilter(ValueError):
+    pass
+
+
+def metadata_columns(metadatas: list[dict]) -> dict[str, np.ndarray]:
+    """Column arrays for FILTER_FIELDS; missing numbers are NaN, missing strings ""."""
+    columns = {}
+    for field in FILTER_FIELDS:
+        values = [(m or {}).get(field) for m in metadatas]
+        if field == "published_ts":
+            columns[field] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        else:
+            columns[field] = np.array(["" if v is None else str(v) for v in values], dtype=str)
+    return columns
+
+
+def _field_mask(column: np.ndarray, condition) -> np.ndarray:
+    if not isinstance(condition, dict):
+        return column == condition
+
+    mask = np.ones(len(column), dtype=bool)
+    for op, value in condition.items():
+        if op == "$eq":
+            mask &= column == value
+        elif op == "$ne":
+            mask &= column != value
+        elif op == "$in":
+            mask &= np.isin(column, list(value))
+        elif op == "$nin":
+            mask &= ~np.isin(column, list(value))
+        elif op in _RANGE_OPS:
+            # NaN compares False, so chunks without the field never match a range
+            mask &= _RANGE_OPS[op](column, value)
+        else:
+            raise UnsupportedFilter(f"operator {op}")
+    return mask
+
+
+def where_mask(where: dict | None, columns: dict[str, np.ndarray], size: int) -> np.ndarray | None:
+    """Evaluate a Chroma `where` clause over metadata columns.
+
+    Returns None for "no filter". Raises UnsupportedFilter for fields or
+    operators that aren't stored, so callers can fall back to Chroma.
+    """
+    if not where:
+        return None
+
+    mask = np.ones(size, dtype=bool)
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [where_mask(c, columns, size) for c in condition]
+            parts = [p if p is not None else np.ones(size, dtype=bool) for p in parts]
+            combined = np.logical_and.reduce(parts) if key == "$and" else np.logical_or.reduce(parts)
+            mask &= combined
+        elif key in columns:
+            mask &= _field_mask(columns[key], condition)
+        else:
+            raise UnsupportedFilter(f"field {key}")
+    return mask
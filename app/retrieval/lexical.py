@@ -0,0 +1,432 @@
+import fcntl
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+
+from app.core.config import LEXICAL_INDEX_PATH
+from app.core.vectorstore import get_vectorstore, iter_collection
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Pending postings are merged into the packed arrays once they grow past this
+COMPACT_THRESHOLD = 50_000
+# Delta log records (added chunks, removals) before the base file is rewritten
+DELTA_COMPACT_RECORDS = 20_000
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOPWORDS = frozenset(
+    "a an and are as at be but by do for from has have he her his i if in into is it its "
+    "me my not of on or our she so that the their them then there these they this to "
+    "was we were what when which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+class LexicalIndex:
+    """BM25 inverted index over chunk text.
+
+    Postings are packed into flat int32 arrays (`post_docs`, `post_tfs`) sliced
+    by per-term offsets. New chunks go to a small pending dict and are merged
+    into the packed arrays on `compact()`, which `save()` always runs first.
+    """
+
+    def __init__(self):
+        self.chunk_ids: list[str] = []
+        self.doc_lens = np.zeros(0, dtype=np.int32)
+        self.deleted = np.zeros(0, dtype=bool)
+        self.terms: dict[str, tuple[int, int]] = {}
+        self.post_docs = np.zeros(0, dtype=np.int32)
+        self.post_tfs = np.zeros(0, dtype=np.int32)
+
+        self._doc_index: dict[str, int] = {}
+        self._pending: dict[str, list[tuple[int, int]]] = {}
+        self._pending_count = 0
+        self._total_len = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids) - int(self.deleted.sum())
+
+    def __contains__(self, chunk_id: str) -> bool:
+        doc = self._doc_index.get(chunk_id)
+        return doc is not None and not self.deleted[doc]
+
+    def add_chunks(self, chunks: list[dict]) -> int:
+        with self._lock:
+            return self.add_counted(
+                (chunk["chunk_id"], Counter(tokenize(chunk["text"])))
+                for chunk in chunks
+                if chunk["chunk_id"] not in self
+            )
+
+    def add_counted(self, docs) -> int:
+        """Add already tokenized (chunk_id, term counts) pairs, as replayed from a delta log."""
+        with self._lock:
+            lens = []
+            for chunk_id, counts in docs:
+                doc = self._doc_index.get(chunk_id)
+                # Skip live docs, including ones added earlier in this same call
+                if doc is not None and (doc >= len(self.deleted) or not self.deleted[doc]):
+                    continue
+
+                doc = len(self.chunk_ids)
+                self.chunk_ids.append(chunk_id)
+                self._doc_index[chunk_id] = doc
+                lens.append(sum(counts.values()))
+
+                for term, tf in counts.items():
+                    self._pending.setdefault(term, []).append((doc, tf))
+                self._pending_count += len(counts)
+
+            if lens:
+                self.doc_lens = np.concatenate([self.doc_lens, np.array(lens, dtype=np.int32)])
+                self.deleted = np.concatenate([self.deleted, np.zeros(len(lens), dtype=bool)])
+                self._total_len += sum(lens)
+
+            if self._pending_count > COMPACT_THRESHOLD:
+                self.compact()
+            return len(lens)
+
+    def remove(self, chunk_ids) -> int:
+        removed = 0
+        with self._lock:
+            for chunk_id in chunk_ids:
+                doc = self._doc_index.get(chunk_id)
+                if doc is not None and not self.deleted[doc]:
+                    self.deleted[doc] = True
+                    self._total_len -= int(self.doc_lens[doc])
+                    removed += 1
+        return removed
+
+    def compact(self):
+        with self._lock:
+            term_list = list(self.terms)
+            for term in self._pending:
+                if term not in self.terms:
+                    term_list.append(term)
+            term_ids = {t: i for i, t in enumerate(term_list)}
+
+            # Flatten packed + pending postings into (term, doc, tf) columns
+            old_terms = np.zeros(len(self.post_docs), dtype=np.int32)
+            for term, (start, end) in self.terms.items():
+                old_terms[start:end] = term_ids[term]
+
+            new = [(term_ids[t], d, tf) for t, plist in self._pending.items() for d, tf in plist]
+            new_cols = np.array(new, dtype=np.int32).reshape(-1, 3)
+
+            all_terms = np.concatenate([old_terms, new_cols[:, 0]])
+            all_docs = np.concatenate([self.post_docs, new_cols[:, 1]])
+            all_tfs = np.concatenate([self.post_tfs, new_cols[:, 2]])
+
+            # Drop tombstoned documents and renumber the survivors
+            if self.deleted.any():
+                keep_docs = ~self.deleted
+                remap = np.cumsum(keep_docs, dtype=np.int32) - 1
+                keep = keep_docs[all_docs]
+                all_terms, all_docs, all_tfs = all_terms[keep], remap[all_docs[keep]], all_tfs[keep]
+                self.chunk_ids = [c for c, k in zip(self.chunk_ids, keep_docs) if k]
+                self.doc_lens = self.doc_lens[keep_docs]
+                self.deleted = np.zeros(len(self.chunk_ids), dtype=bool)
+                self._doc_index = {c: i for i, c in enumerate(self.chunk_ids)}
+
+            order = np.lexsort((all_docs, all_terms))
+            all_terms, self.post_docs, self.post_tfs = all_terms[order], all_docs[order], all_tfs[order]
+
+            bounds = np.searchsorted(all_terms, np.arange(len(term_list) + 1))
+            self.terms = {
+                t: (int(bounds[i]), int(bounds[i + 1]))
+                for i, t in enumerate(term_list)
+                if bounds[i + 1] > bounds[i]
+            }
+            self._pending = {}
+            self._pending_count = 0
+
+    def _postings(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        docs, tfs = [], []
+        span = self.terms.get(term)
+        if span:
+            docs.append(self.post_docs[span[0]:span[1]])
+            tfs.append(self.post_tfs[span[0]:span[1]])
+        pending = self._pending.get(term)
+        if pending:
+            extra = np.array(pending, dtype=np.int32)
+            docs.append(extra[:, 0])
+            tfs.append(extra[:, 1])
+        if not docs:
+            return None, None
+        return np.concatenate(docs), np.concatenate(tfs)
+
+    def search(self, query: str, top_k: int = 10) -> list[tuple[str, float]]:
+        with self._lock:
+            n_docs = len(self)
+            if not n_docs:
+                return []
+
+            avg_len = self._total_len / n_docs
+            scores = np.zeros(len(self.chunk_ids), dtype=np.float32)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lens / avg_len)
+
+            for term in set(tokenize(query)):
+                docs, tfs = self._postings(term)
+                if docs is None:
+                    continue
+                df = len(docs)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                scores[docs] += idf * tfs * (BM25_K1 + 1) / (tfs + norm[docs])
+
+            scores[self.deleted] = 0.0
+            hits = np.flatnonzero(scores)
+            if len(hits) > top_k:
+                hits = hits[np.argpartition(-scores[hits], top_k)[:top_k]]
+            hits = hits[np.argsort(-scores[hits])]
+
+            return [(self.chunk_ids[i], float(scores[i])) for i in hits]
+
+    def save(self, path):
+        with self._lock:
+            self.compact()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            starts = np.array([s for s, _ in self.terms.values()], dtype=np.int64)
+            ends = np.array([e for _, e in self.terms.values()], dtype=np.int64)
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "wb") as f:
+                np.savez(
+                    f,
+                    chunk_ids=np.array(self.chunk_ids, dtype=str),
+                    doc_lens=self.doc_lens,
+                    terms=np.array(list(self.terms), dtype=str),
+                    starts=starts,
+                    ends=ends,
+                    post_docs=self.post_docs,
+                    post_tfs=self.post_tfs,
+                )
+            os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path) -> "LexicalIndex":
+        index = cls()
+        if not path.exists():
+            return index
+
+        with np.load(path, allow_pickle=False) as data:
+            index.chunk_ids = data["chunk_ids"].tolist()
+            index.doc_lens = data["doc_lens"]
+            index.post_docs = data["post_docs"]
+            index.post_tfs = data["post_tfs"]
+            index.terms = dict(zip(
+                data["terms"].tolist(),
+                zip(data["starts"].tolist(), data["ends"].tolist()),
+            ))
+
+        index.deleted = np.zeros(len(index.chunk_ids), dtype=bool)
+        index._doc_index = {c: i for i, c in enumerate(index.chunk_ids)}
+        index._total_len = int(index.doc_lens.sum())
+        return index
+
+
+def _index_path(collection_name: str):
+    return LEXICAL_INDEX_PATH / f"{collection_name}.npz"
+
+
+def _file_id(path) -> tuple | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class StoredIndex:
+    """One collection's index and its files: a packed base .npz plus an append-only delta log.
+
+    Updates append their postings to the delta log. Only once it holds
+    DELTA_COMPACT_RECORDS records is the base rewritten and the log cleared.
+    The in-process index is the authority for this process's own writes.
+    `sync()` loads whatever other processes wrote: the tail of the log, or
+    the whole index after another process compacted. Hold `locked()` across
+    sync, modify and persist, so concurrent writers can't save a stale copy.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.delta_path = path.with_name(f"{path.stem}.delta.jsonl")
+        self.lock_path = path.with_name(f"{path.stem}.lock")
+        self.lock = threading.RLock()
+        self._lock_file = None
+        self._lock_depth = 0
+        self.index = None
+        self._base = None
+        self._offset = 0
+        self._records = 0
+
+    @contextmanager
+    def locked(self):
+        """`lock` for this process's threads plus a flock on the sidecar file for other processes.
+
+        Without the flock, a compaction here could unlink a delta log another
+        process had just appended to, and its records would be lost.
+        """
+        with self.lock:
+            # flock isn't reentrant per file; only the outermost holder takes and releases it
+            if self._lock_depth == 0:
+                if self._lock_file is None:
+                    self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+                    self._lock_file = open(self.lock_path, "a")
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def sync(self) -> LexicalIndex:
+        with self.locked():
+            base = _file_id(self.path)
+            delta_size = self.delta_path.stat().st_size if self.delta_path.exists() else 0
+            if self.index is None or base != self._base or delta_size < self._offset:
+                self.index = LexicalIndex.load(self.path)
+                self._base, self._offset, self._records = base, 0, 0
+            if delta_size > self._offset:
+                self._replay()
+            return self.index
+
+    def _replay(self):
+        with open(self.delta_path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # A writer may be mid-line; leave the partial record for the next sync
+        data = data[:data.rfind(b"\n") + 1]
+
+        adds = []
+        for line in data.splitlines():
+            record = json.loads(line)
+            if "add" in record:
+                adds.append((record["add"], record["tf"]))
+            else:
+                self.index.add_counted(adds)
+                adds = []
+                self.index.remove(record["remove"])
+        self.index.add_counted(adds)
+
+        self._offset += len(data)
+        self._records += data.count(b"\n")
+
+    def _append(self, records: list[dict]):
+        self.delta_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.delta_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r) + "\n" for r in records))
+            f.flush()
+            self._offset = f.tell()
+        self._records += len(records)
+        if self._records >= DELTA_COMPACT_RECORDS:
+            self.save()
+
+    def save(self):
+        """Rewrite the base file from the in-process index and clear the delta log."""
+        with self.locked():
+            self.index.save(self.path)
+            self.delta_path.unlink(missing_ok=True)
+            self._base, self._offset, self._records = _file_id(self.path), 0, 0
+
+    def add_chunks(self, chunks: list[dict]) -> int:
+        with self.locked():
+            index = self.sync()
+            docs = {}
+            for chunk in chunks:
+                if chunk["chunk_id"] not in index:
+                    docs[chunk["chunk_id"]] = Counter(tokenize(chunk["text"]))
+            added = index.add_counted(docs.items())
+            if added:
+                self._append([{"add": chunk_id, "tf": counts} for chunk_id, counts in docs.items()])
+            return added
+
+    def remove(self, chunk_ids) -> int:
+        with self.locked():
+            index = self.sync()
+            live = [chunk_id for chunk_id in chunk_ids if chunk_id in index]
+            removed = index.remove(live)
+            if removed:
+                self._append([{"remove": live}])
+            return removed
+
+
+_stores: dict[str, StoredIndex] = {}
+_stores_lock = threading.Lock()
+
+
+def get_stored_index(collection_name: str) -> StoredIndex:
+    with _stores_lock:
+        stored = _stores.get(collection_name)
+        if stored is None:
+            stored = _stores[collection_name] = StoredIndex(_index_path(collection_name))
+        return stored
+
+
+def get_lexical_index(collection_name: str) -> LexicalIndex:
+    # Picks up postings another process (ingestion) has written since the last call
+    return get_stored_index(collection_name).sync()
+
+
+def update_lexical_index(collection_name: str, chunks: list[dict]) -> int:
+    stored = get_stored_index(collection_name)
+    added = stored.add_chunks(chunks)
+    if added:
+        logger.info(f"[LEXICAL] {collection_name} | +{added} | total={len(stored.index)}")
+    return added
+
+
+def remove_from_lexical_index(collection_name: str, chunk_ids) -> int:
+    stored = get_stored_index(collection_name)
+    removed = stored.remove(chunk_ids)
+    if removed:
+        logger.info(f"[LEXICAL] {collection_name} | -{removed} | total={len(stored.index)}")
+    return removed
+
+
+def rebuild_lexical_index(collection_name: str, page_size: int = 1000) -> int:
+    """Index every chunk stored in the collection from scratch, and save it as the new base."""
+    collection = get_vectorstore(collection_name)._collection
+    stored = get_stored_index(collection_name)
+    with stored.locked():
+        index = LexicalIndex()
+        for page in iter_collection(collection, ["documents"], page_size):
+            index.add_chunks([
+                {"chunk_id": chunk_id, "text": text or ""}
+                for chunk_id, text in zip(page["ids"], page["documents"])
+            ])
+        stored.index = index
+        stored.save()
+    logger.info(f"[LEXICAL] {collection_name} | rebuilt | total={len(index)}")
+    return len(index)
+
+
+def ensure_lexical_index(collection_name: str) -> bool:
+    """Rebuild when the index is missing or doesn't hold exactly the collection's chunks.
+
+    Corpora embedded before the index existed (or before a crash between the
+    Chroma upsert and the index update) would otherwise never get postings,
+    and hybrid retrieval would quietly be dense-only.
+    """
+    count = get_vectorstore(collection_name)._collection.count()
+    indexed = len(get_lexical_index(collection_name))
+    if indexed == count:
+        return False
+    logger.warning(f"[LEXICAL] {collection_name} | index has {indexed} chunks, collection {count}; rebuilding")
+    rebuild_lexical_index(collection_name)
+    return True
@@ -0,0 +1,221 @@
+import json
+import logging
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from app.core.cache import collection_version
+from app.core.config import COLLECTIONS, QUANTIZED_INDEX_PATH
+from app.core.vectorstore import get_vectorstore, iter_collection
+from app.retrieval.filters import metadata_columns
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# gemini-embedding-001 is Matryoshka-trained, so its leading dimensions carry
+# most of the signal. It returns 3072 dims; the first 256 (a twelfth) as int8
+# codes take 1/48 of the float32 bytes, and the re-rank restores full precision
+QUANTIZED_DIMS = 256
+# Candidates from the int8 scan that get re-scored with full float vectors
+RERANK_FACTOR = 10
+MIN_CANDIDATES = 50
+SCAN_BLOCK = 65_536
+BUILD_PAGE_SIZE = 1000
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def quantize(vectors: np.ndarray, dims: int) -> tuple[np.ndarray, np.ndarray]:
+    """Truncate to `dims`, renormalize, and scale each row into int8."""
+    truncated = _normalize(vectors[:, :dims].astype(np.float32))
+    scales = np.abs(truncated).max(axis=1) / 127.0
+    scales = np.maximum(scales, 1e-12).astype(np.float32)
+    codes = np.rint(truncated / scales[:, None]).astype(np.int8)
+    return codes, scales
+
+
+class QuantizedIndex:
+    """Compact on-disk vector index: int8 Matryoshka prefixes plus float re-ranking.
+
+    `codes.npy` (n x dims int8) is memory-mapped and scanned in blocks for
+    candidates; `vectors.npy` (n x full dims float32, normalized) is also
+    memory-mapped but only the candidate rows are read, to re-score exactly.
+    Resident memory is therefore dominated by the int8 codes the OS keeps paged
+    in. Filter columns and ids live in `meta.npz`.
+    """
+
+    def __init__(self, path, codes, vectors, scales, chunk_ids, columns, version: str):
+        self.path = path
+        self.codes = codes
+        self.vectors = vectors
+        self.scales = scales
+        self.chunk_ids = chunk_ids
+        self.columns = columns
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    @property
+    def dims(self) -> int:
+        return self.codes.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    @classmethod
+    def build(cls, path, batches, total: int, full_dim: int, dims: int = QUANTIZED_DIMS, version: str = "") -> "QuantizedIndex":
+        """Write an index from an iterable of (chunk_ids, vectors, metadatas) batches."""
+        tmp_path = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+
+        dims = min(dims, full_dim)
+        codes = np.lib.format.open_memmap(tmp_path / "codes.npy", mode="w+", dtype=np.int8, shape=(total, dims))
+        vectors = np.lib.format.open_memmap(tmp_path / "vectors.npy", mode="w+", dtype=np.float32, shape=(total, full_dim))
+        scales = np.zeros(total, dtype=np.float32)
+        chunk_ids = []
+        metadatas = []
+
+        row = 0
+        for ids, batch, batch_meta in batches:
+            # Rows added after `total` was taken wait for the next build
+            take = min(len(ids), total - row)
+            if take <= 0:
+                break
+            ids, batch, batch_meta = ids[:take], np.asarray(batch[:take], dtype=np.float32), batch_meta[:take]
+            end = row + take
+            codes[row:end], scales[row:end] = quantize(batch, dims)
+            vectors[row:end] = _normalize(batch)
+            chunk_ids.extend(ids)
+            metadatas.extend(batch_meta)
+            row = end
+
+        codes.flush()
+        vectors.flush()
+        del codes, vectors
+
+        columns = metadata_columns(metadatas)
+        np.savez(
+            tmp_path / "meta.npz",
+            chunk_ids=np.array(chunk_ids, dtype=str),
+            scales=scales[:row],
+            **{f"col_{k}": v for k, v in columns.items()},
+        )
+        (tmp_path / "info.json").write_text(
+            json.dumps({"version": version, "count": row, "dims": dims, "full_dim": full_dim}),
+            encoding="utf-8",
+        )
+
+        # Swap directories; open memmaps on the old files stay valid until released
+        old_path = path.with_name(path.name + ".old")
+        shutil.rmtree(old_path, ignore_errors=True)
+        if path.exists():
+            path.rename(old_path)
+        tmp_path.rename(path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path) -> "QuantizedIndex | None":
+        if not (path / "info.json").exists():
+            return None
+
+        info = json.loads((path / "info.json").read_text(encoding="utf-8"))
+        count = info["count"]
+        codes = np.load(path / "codes.npy", mmap_mode="r")[:count]
+        vectors = np.load(path / "vectors.npy", mmap_mode="r")[:count]
+        with np.load(path / "meta.npz", allow_pickle=False) as meta:
+            chunk_ids = meta["chunk_ids"]
+            scales = meta["scales"]
+            columns = {k[len("col_"):]: meta[k] for k in meta.files if k.startswith("col_")}
+        return cls(path, codes, vectors, scales, chunk_ids, columns, info["version"])
+
+    def scan(self, query: np.ndarray) -> np.ndarray:
+        """Approximate cosine for every row from the int8 prefixes."""
+        q = _normalize(query[:self.dims].astype(np.float32))
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), SCAN_BLOCK):
+            end = start + SCAN_BLOCK
+            scores[start:end] = (self.codes[start:end].astype(np.float32) @ q) * self.scales[start:end]
+        return scores
+
+    def search(self, query, top_k: int, mask: np.ndarray | None = None, candidates: int | None = None) -> list[tuple[str, float]]:
+        """Top-k (chunk_id, cosine) among rows allowed by `mask`."""
+        if not len(self) or top_k <= 0:
+            return []
+
+        query = np.asarray(query, dtype=np.float32)
+        scores = self.scan(query)
+        if mask is not None:
+            scores[~mask] = -np.inf
+            allowed = int(mask.sum())
+        else:
+            allowed = len(self)
+
+        n_candidates = min(candidates or max(top_k * RERANK_FACTOR, MIN_CANDIDATES), allowed)
+        if n_candidates <= 0:
+            return []
+
+        rows = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        # Sorted rows read the float memmap sequentially
+        rows.sort()
+
+        exact = self.vectors[rows] @ _normalize(query)
+        best = np.argsort(-exact)[:top_k]
+        return [(str(self.chunk_ids[rows[i]]), float(exact[i])) for i in best]
+
+
+def index_path(collection_name: str):
+    return QUANTIZED_INDEX_PATH / collection_name
+
+
+def build_quantized_index(collection_name: str, dims: int = QUANTIZED_DIMS, page_size: int = BUILD_PAGE_SIZE) -> QuantizedIndex:
+    """Snapshot a Chroma collection into a quantized index, paging through it."""
+    start = time.perf_counter()
+    # Read the version first: a write during the build then shows up as stale
+    version = collection_version(collection_name)
+    collection = get_vectorstore(collection_name)._collection
+    total = collection.count()
+
+    first = collection.get(include=["embeddings"], limit=1)
+    full_dim = len(first["embeddings"][0]) if len(first["ids"]) else dims
+
+    pages = (
+        (page["ids"], page["embeddings"], page["metadatas"])
+        for page in iter_collection(collection, ["embeddings", "metadatas"], page_size, total)
+    )
+
+    index = QuantizedIndex.build(index_path(collection_name), pages, total, full_dim, dims, version)
+    logger.info(
+        f"[QUANTIZED] {collection_name} | {len(index)} vectors | {index.dims}/{full_dim} dims int8 | "
+        f"{index.nbytes / 1e6:.1f}MB | {time.perf_counter() - start:.1f}s"
+    )
+    return index
+
+
+def refresh_quantized_index(collection_name: str) -> bool:
+    """Rebuild a collection's index if it has one older than the collection version.
+
+    Collections that were never quantized are left alone; `python -m app quantize`
+    builds them. True when a rebuild ran.
+    """
+    info = index_path(collection_name) / "info.json"
+    if not info.exists():
+        return False
+    if json.loads(info.read_text(encoding="utf-8"))["version"] == collection_version(collection_name):
+        return False
+    build_quantized_index(collection_name)
+    return True
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or COLLECTIONS:
+        build_quantized_index(name)
@@ -0,0 +1,198 @@
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from app.core.config import (
+    RERANK_BUDGET_MS,
+    RERANK_DECISIVE_GAP,
+    RERANK_MODEL,
+    RERANKER,
+)
+from app.core.metrics import counter, histogram
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Passage text sent to the re-ranker; the head of a chunk is enough to judge it
+RERANK_PASSAGE_CHARS = 1500
+CROSS_ENCODER_BATCH_SIZE = 32
+
+LLM_RERANK_PROMPT = (
+    "Rate how well each numbered passage helps answer the question, from 0 (irrelevant) "
+    "to 10 (answers it directly). Reply with only a JSON list of numbers, one per passage, in order."
+)
+
+RERANK_SECONDS = histogram("rag_rerank_seconds", "Re-ranker scoring latency", ("reranker",), stage="rerank")
+RERANKS = counter("rag_rerank_total", "Re-rank calls by outcome", ("reranker", "result"))
+
+_JSON_LIST_RE = re.compile(r"\[[^\[\]]*\]")
+RERANK_WORKERS = 4
+# Calls running or queued on the pool, including ones that ran past their budget;
+# past this, requests keep the vector order instead of queueing behind them
+RERANK_MAX_PENDING = RERANK_WORKERS * 2
+_rerank_pool = ThreadPoolExecutor(max_workers=RERANK_WORKERS, thread_name_prefix="rerank")
+_rerank_slots = threading.BoundedSemaphore(RERANK_MAX_PENDING)
+
+
+class CrossEncoderReranker:
+    """Scores (query, passage) pairs with a local cross-encoder.
+
+    Needs sentence-transformers; the model is loaded on first use.
+    """
+
+    name = "cross-encoder"
+
+    def __init__(self, model_name: str = RERANK_MODEL):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+
+                start = time.perf_counter()
+                self._model = CrossEncoder(self.model_name)
+                logger.info(f"[RERANK] Loaded {self.model_name} | {time.perf_counter() - start:.1f}s")
+            return self._model
+
+    def score(self, query: str, hits: list[dict]) -> list[float]:
+        pairs = [(query, hit["text"][:RERANK_PASSAGE_CHARS]) for hit in hits]
+        scores = self.model().predict(pairs, batch_size=CROSS_ENCODER_BATCH_SIZE)
+        return [float(s) for s in scores]
+
+
+class LLMReranker:
+    """Scores all candidates in a single call to the chat model."""
+
+    name = "llm"
+
+    def __init__(self, llm=None):
+        self._llm = llm
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            from app.core.llm import get_llm
+
+            self._llm = get_llm()
+        return self._llm
+
+    def score(self, query: str, hits: list[dict]) -> list[float]:
+        passages = "\n\n".join(
+            f"[{i}] {hit['text'][:RERANK_PASSAGE_CHARS]}" for i, hit in enumerate(hits, start=1)
+        )
+        messages = [
+            ("system", LLM_RERANK_PROMPT),
+            ("human", f"Question: {query}\n\nPassages:\n{passages}"),
+        ]
+        reply = self.llm.invoke(messages).content
+
+        match = _JSON_LIST_RE.search(reply)
+        if match is None:
+            raise ValueError(f"no score list in reply: {reply[:200]!r}")
+        scores = json.loads(match.group(0))
+        if len(scores) != len(hits):
+            raise ValueError(f"{len(scores)} scores for {len(hits)} passages")
+        return [float(s) for s in scores]
+
+
+def is_decisive(hits: list[dict], top_n: int, gap: float = RERANK_DECISIVE_GAP, fused: bool = False) -> bool:
+    """True when the vector scores already separate the top `top_n` from the rest.
+
+    Only pure vector hits qualify. `fused` hits are in RRF order, which their
+    distances don't follow, so they are never decisive.
+    """
+    if len(hits) <= top_n:
+        return True
+    if fused:
+        return False
+
+    head = hits[:top_n + 1]
+    if any(hit.get("distance") is None for hit in head):
+        return False
+    return head[top_n]["distance"] - head[top_n - 1]["distance"] >= gap
+
+
+def rerank(
+    query: str,
+    hits: list[dict],
+    top_n: int,
+    reranker=None,
+    budget_ms: int = RERANK_BUDGET_MS,
+    fused: bool = False,
+) -> list[dict]:
+    """Re-order retrieval candidates with `reranker` and keep the best `top_n`.
+
+    `hits` must be in retrieval order; pass `fused` for hybrid results. The vector order is kept when the
+    re-ranker is disabled, the scores are already decisive, the pool
+    already has RERANK_MAX_PENDING calls, or scoring fails or runs past
+    `budget_ms`. Re-ranked hits gain `rerank_score`.
+    """
+    reranker = reranker if reranker is not None else get_reranker()
+    if reranker is None or top_n <= 0:
+        return hits[:top_n]
+    if is_decisive(hits, top_n, fused=fused):
+        RERANKS.inc(reranker=reranker.name, result="decisive")
+        return hits[:top_n]
+
+    if not _rerank_slots.acquire(blocking=False):
+        RERANKS.inc(reranker=reranker.name, result="saturated")
+        logger.warning(f"[RERANK] {reranker.name} saturated ({RERANK_MAX_PENDING} pending); using vector order")
+        return hits[:top_n]
+
+    start = time.perf_counter()
+    future = _rerank_pool.submit(reranker.score, query, hits)
+    future.add_done_callback(lambda _: _rerank_slots.release())
+    try:
+        with RERANK_SECONDS.time(reranker=reranker.name):
+            scores = future.result(timeout=budget_ms / 1000)
+    except FutureTimeout:
+        # Drops the call if it is still queued; a running one can't be interrupted,
+        # so it finishes in the background, holding its slot, and is dropped
+        future.cancel()
+        RERANKS.inc(reranker=reranker.name, result="timeout")
+        logger.warning(f"[RERANK] {reranker.name} over budget ({budget_ms}ms); using vector order")
+        return hits[:top_n]
+    except Exception as e:
+        RERANKS.inc(reranker=reranker.name, result="failed")
+        logger.error(f"[RERANK] {reranker.name} failed; using vector order | {e}")
+        return hits[:top_n]
+
+    RERANKS.inc(reranker=reranker.name, result="reranked")
+
+    for hit, score in zip(hits, scores):
+        hit["rerank_score"] = score
+
+    # Stable sort: ties keep their retrieval order
+    ranked = sorted(hits, key=lambda h: h["rerank_score"], reverse=True)
+    logger.info(
+        f"[RERANK] {reranker.name} | {len(hits)} -> {top_n} | "
+        f"{(time.perf_counter() - start) * 1000:.0f}ms"
+    )
+    return ranked[:top_n]
+
+
+_rerankers = {}
+_rerankers_lock = threading.Lock()
+
+RERANKERS = {
+    "cross-encoder": CrossEncoderReranker,
+    "llm": LLMReranker,
+}
+
+
+def get_reranker(name: str = RERANKER):
+    if name == "none":
+        return None
+
+    with _rerankers_lock:
+        if name not in _rerankers:
+            if name not in RERANKERS:
+                raise ValueError(f"Unknown reranker: {name}")
+            _rerankers[name] = RERANKERS[name]()
+        return _rerankers[name]
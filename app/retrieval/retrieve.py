@@ -1,34 +1,401 @@
+import argparse
+import json
 import logging
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator
 
-from langchain_chroma import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from app.core.config import GEMINI_API_KEY, GEMINI_EMBED_MODEL, EMBEDDING_PATH
+from app.core.cache import LatencyStats, TTLCache, collection_version
+from app.core.embeddings import get_embeddings
+from app.core.vectorstore import get_vectorstore, has_vectorstore
+from app.core.config import COLLECTIONS
+from app.core.metrics import histogram
+from app.ingestion.batching import EMBED_BATCH_SIZE, EMBED_CONCURRENCY, AdaptiveBackoff, embed_texts
+from app.retrieval.backends import get_backend
+from app.retrieval.lexical import get_lexical_index
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-query_embeddings = GoogleGenerativeAIEmbeddings(
-    model=GEMINI_EMBED_MODEL,
-    google_api_key=GEMINI_API_KEY,
-    task_type="retrieval_query"
+QUERY_CACHE_SIZE = 10_000
+QUERY_CACHE_TTL = 24 * 3600
+RESULT_CACHE_SIZE = 5_000
+RESULT_CACHE_TTL = 15 * 60
+# Reciprocal rank fusion constant from Cormack et al.; dampens the head of each list
+RRF_K = 60
+# Queries per batch in the batch API; one embedding request and one search call per collection
+QUERY_BATCH_SIZE = EMBED_BATCH_SIZE
+
+RETRIEVE_EMBED_SECONDS = histogram("rag_retrieve_embed_seconds", "Query embedding latency (cache misses)", stage="retrieve_embed")
+RETRIEVE_SEARCH_SECONDS = histogram(
+    "rag_retrieve_search_seconds", "Vector search latency per collection call", ("collection", "backend"), stage="retrieve_search"
 )
 
-def get_vectorstore(collection_name: str) -> Chroma:
-    return Chroma(
-        collection_name=collection_name,
-        embedding_function=query_embeddings,
-        persist_directory=str(EMBEDDING_PATH),
-        collection_metadata={"hnsw:space": "cosine"},
+# L1: normalized query text -> query vector
+_query_cache = TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+# L2: (query, collection, top_k, filters, collection version) -> results
+_result_cache = TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+_latency = LatencyStats()
+_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieve")
+# Embeds upcoming query batches while the current one is searched
+_embed_pool = ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY, thread_name_prefix="embed-query")
+
+def normalize_query(query: str) -> str:
+    # Case and whitespace variants of the same question share cache entries. The
+    # normalized text is also what gets embedded, so a cached vector doesn't
+    # depend on which variant happened to arrive first.
+    return " ".join(query.lower().split())
+
+def embed_query(query: str) -> list[float]:
+    key = normalize_query(query)
+    vector = _query_cache.get(key)
+    if vector is None:
+        with RETRIEVE_EMBED_SECONDS.time():
+            vector = get_embeddings("retrieval_query").embed_query(key)
+        _query_cache.set(key, vector)
+    return vector
+
+def embed_queries(queries: list[str], backoff: AdaptiveBackoff | None = None) -> list[list[float]]:
+    """Query vectors in input order; distinct cache misses are embedded
+    EMBED_BATCH_SIZE at a time instead of one request per query."""
+    keys = [normalize_query(q) for q in queries]
+    vectors = {}
+    missing = {}
+
+    for key in keys:
+        if key in vectors or key in missing:
+            continue
+        vector = _query_cache.get(key)
+        if vector is None:
+            missing[key] = None
+        else:
+            vectors[key] = vector
+
+    pending = list(missing)
+    backoff = backoff or AdaptiveBackoff()
+    for start in range(0, len(pending), EMBED_BATCH_SIZE):
+        part = pending[start:start + EMBED_BATCH_SIZE]
+        fresh = embed_texts(get_embeddings("retrieval_query"), part, backoff, "queries")
+        for key, vector in zip(part, fresh):
+            _query_cache.set(key, vector)
+            vectors[key] = vector
+
+    return [vectors[key] for key in keys]
+
+def _result_key(query: str, collection_name: str, top_k: int, where: dict | None) -> tuple:
+    return (
+        normalize_query(query),
+        collection_name,
+        top_k,
+        json.dumps(where, sort_keys=True) if where else "",
+        collection_version(collection_name),
     )
 
-def retrieve_collection(query: str, collection_name: str, top_k: int = 5) -> list[dict]:
+def _query_collection(query_vector: list[float], collection_name: str, top_k: int, where: dict | None) -> list[dict]:
+    backend = get_backend()
+    with RETRIEVE_SEARCH_SECONDS.time(collection=collection_name, backend=backend.name):
+        return backend.search(query_vector, collection_name, top_k, where)
+
+def search_collections(query: str, limits: dict[str, int], where: dict | None = None) -> dict[str, list[dict]]:
+    """Top-k hits per collection; the query is embedded at most once and
+    collections missing from the result cache are searched concurrently."""
+    results = {}
+    misses = {}
+
+    for name, top_k in limits.items():
+        key = _result_key(query, name, top_k, where)
+        cached = _result_cache.get(key)
+        if cached is not None:
+            results[name] = [dict(r) for r in cached]
+        else:
+            misses[name] = key
+
+    if not misses:
+        return results
+
+    query_vector = embed_query(query)
+
+    if len(misses) == 1:
+        name = next(iter(misses))
+        fetched = {name: _query_collection(query_vector, name, limits[name], where)}
+    else:
+        futures = {
+            name: _search_pool.submit(_query_collection, query_vector, name, limits[name], where)
+            for name in misses
+        }
+        fetched = {name: future.result() for name, future in futures.items()}
+
+    for name, hits in fetched.items():
+        _result_cache.set(misses[name], hits)
+        results[name] = [dict(r) for r in hits]
+
+    return results
+
+def search_collections_batch(queries: list[str], limits: dict[str, int], where: dict | None = None) -> list[dict[str, list[dict]]]:
+    """`search_collections` for many queries, in input order.
+
+    Queries missing from the result cache are embedded together and each
+    collection is searched with a single backend call for all of them.
+    """
+    results = [{} for _ in queries]
+    misses = {name: [] for name in limits}
+
+    for i, query in enumerate(queries):
+        for name, top_k in limits.items():
+            key = _result_key(query, name, top_k, where)
+            cached = _result_cache.get(key)
+            if cached is not None:
+                results[i][name] = [dict(r) for r in cached]
+            else:
+                misses[name].append((i, key))
+
+    misses = {name: missed for name, missed in misses.items() if missed}
+    if not misses:
+        return results
+
+    needed = sorted({i for missed in misses.values() for i, _ in missed})
+    vectors = dict(zip(needed, embed_queries([queries[i] for i in needed])))
+
+    def search(name: str) -> list[list[dict]]:
+        backend = get_backend()
+        with RETRIEVE_SEARCH_SECONDS.time(collection=name, backend=backend.name):
+            return backend.search_many([vectors[i] for i, _ in misses[name]], name, limits[name], where)
+
+    futures = {name: _search_pool.submit(search, name) for name in misses}
+    for name, future in futures.items():
+        for (i, key), hits in zip(misses[name], future.result()):
+            _result_cache.set(key, hits)
+            results[i][name] = [dict(r) for r in hits]
+
+    return results
+
+def retrieve_collection(query: str, collection_name: str, top_k: int = 5, where: dict | None = None) -> list[dict]:
     logger.info(f"[RETRIEVE] Collection={collection_name} | top_k={top_k}")
+    start = time.perf_counter()
+    hits_before = _result_cache.hits
+
+    hits = search_collections(query, {collection_name: top_k}, where)[collection_name]
+
+    _latency.record("hit" if _result_cache.hits > hits_before else "miss", time.perf_counter() - start)
+    return hits
+
+def _as_timestamp(value) -> int:
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    if isinstance(value, str):
+        return int(datetime.fromisoformat(value).timestamp())
+    return int(value)
+
+def build_where(
+    source_type: str | list[str] | None = None,
+    parent_id: str | list[str] | None = None,
+    published_after=None,
+    published_before=None,
+) -> dict | None:
+    clauses = []
+
+    for field, value in (("source_type", source_type), ("parent_id", parent_id)):
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            clauses.append({field: {"$in": list(value)}})
+        else:
+            clauses.append({field: value})
+
+    # Only chunks with a published_ts (podcasts today) can match a date range. Vectors
+    # embedded before the field existed get it from `python -m app backfill-dates`
+    # (a full `python -m app embed` runs the same pass); until then they never match.
+    if published_after is not None:
+        clauses.append({"published_ts": {"$gte": _as_timestamp(published_after)}})
+    if published_before is not None:
+        clauses.append({"published_ts": {"$lte": _as_timestamp(published_before)}})
+
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+def fuse_lexical(query: str, collection_name: str, vector_hits: list[dict], top_k: int, where: dict | None = None) -> list[dict]:
+    """Reciprocal rank fusion of vector hits with BM25 hits from the local lexical index."""
+    lexical = get_lexical_index(collection_name).search(query, top_k)
+    fused = {}
+
+    for rank, hit in enumerate(vector_hits, start=1):
+        hit["rrf"] = 1.0 / (RRF_K + rank)
+        fused[hit["chunk_id"]] = hit
+
+    # Lexical-only hits still need their text/metadata, and must pass the same filter
+    missing = [chunk_id for chunk_id, _ in lexical if chunk_id not in fused]
+    found = {}
+    if missing:
+        got = get_vectorstore(collection_name, create=False)._collection.get(
+            ids=missing, where=where, include=["documents", "metadatas"]
+        )
+        found = {i: (d, m) for i, d, m in zip(got["ids"], got["documents"], got["metadatas"])}
+
+    for rank, (chunk_id, bm25) in enumerate(lexical, start=1):
+        hit = fused.get(chunk_id)
+        if hit is None:
+            if chunk_id not in found:
+                continue
+            document, metadata = found[chunk_id]
+            hit = {"chunk_id": chunk_id, "text": document, "metadata": metadata or {}, "distance": None, "rrf": 0.0}
+            fused[chunk_id] = hit
+
+        hit["rrf"] += 1.0 / (RRF_K + rank)
+        hit["bm25"] = bm25
+
+    return sorted(fused.values(), key=lambda h: h["rrf"], reverse=True)
+
+def searchable(collections: list[str] | None) -> list[str]:
+    """Configured collections that exist; raises ValueError for any name outside COLLECTIONS.
+
+    Retrieval never creates a collection, so one nothing has been ingested
+    into yet is skipped rather than searched.
+    """
+    collections = collections or COLLECTIONS
+    unknown = sorted(set(collections) - set(COLLECTIONS))
+    if unknown:
+        raise ValueError(f"Unknown collections: {', '.join(unknown)}")
+    return [name for name in collections if has_vectorstore(name)]
+
+
+def _limits(collections: list[str], top_k: int, quotas: dict[str, int]) -> dict[str, int]:
+    limits = {name: min(top_k, quotas.get(name, top_k)) for name in collections}
+    return {name: k for name, k in limits.items() if k > 0}
+
+def _merge(query: str, per_collection: dict[str, list[dict]], limits: dict[str, int], top_k: int, hybrid: bool, where: dict | None) -> list[dict]:
+    merged = []
+    for name, hits in per_collection.items():
+        if hybrid:
+            hits = fuse_lexical(query, name, hits, limits[name], where)[:limits[name]]
+
+        for hit in hits:
+            hit["collection"] = name
+            if hybrid:
+                hit["score"] = hit.pop("rrf")
+            else:
+                # Chroma cosine distance is 1 - cos, in [0, 2]
+                hit["score"] = 1.0 - hit["distance"] / 2.0
+            merged.append(hit)
+
+    merged.sort(key=lambda h: h["score"], reverse=True)
+    return merged[:top_k]
+
+def retrieve(
+    query: str,
+    collections: list[str] | None = None,
+    top_k: int = 5,
+    quotas: dict[str, int] | None = None,
+    hybrid: bool = False,
+    **filters,
+) -> list[dict]:
+    """Search several collections with one query embedding and merge into a global top-k.
+
+    `quotas` caps how many hits each collection may contribute. `filters` are
+    passed to `build_where` (source_type, parent_id, published_after/before;
+    date filters only match chunks whose metadata has `published_ts`).
+    Each hit gains `collection` and a `score` in [0, 1] (1 = identical). With
+    `hybrid`, BM25 hits are fused in and `score` is the RRF score instead;
+    lexical-only hits have `distance` None.
+    """
+    collections = searchable(collections)
+    quotas = quotas or {}
+    where = build_where(**filters)
+
+    logger.info(f"[RETRIEVE] Collections={','.join(collections)} | top_k={top_k}")
+    start = time.perf_counter()
+    hits_before = _result_cache.hits
+
+    limits = _limits(collections, top_k, quotas)
+    per_collection = search_collections(query, limits, where)
+    merged = _merge(query, per_collection, limits, top_k, hybrid, where)
+
+    _latency.record(
+        "hit" if _result_cache.hits - hits_before == len(per_collection) else "miss",
+        time.perf_counter() - start,
+    )
+    return merged
+
+def iter_retrieve_batch(
+    queries: Iterable[str],
+    collections: list[str] | None = None,
+    top_k: int = 5,
+    quotas: dict[str, int] | None = None,
+    hybrid: bool = False,
+    batch_size: int = QUERY_BATCH_SIZE,
+    **filters,
+) -> Iterator[list[list[dict]]]:
+    """`retrieve` for many queries, yielding each batch's results as it completes.
+
+    Every yielded item holds one hit list per query of that batch, in input
+    order. Upcoming batches are embedded while the current one is searched,
+    so `queries` may be a lazy iterable of any length.
+    """
+    collections = searchable(collections)
+    limits = _limits(collections, top_k, quotas or {})
+    where = build_where(**filters)
+
+    remaining = iter(queries)
+    batches = iter(lambda: list(islice(remaining, batch_size)), [])
+    pending = deque()
+    backoff = AdaptiveBackoff()
+
+    def submit_next():
+        batch = next(batches, None)
+        if batch is not None:
+            pending.append((batch, _embed_pool.submit(embed_queries, batch, backoff)))
+
+    for _ in range(EMBED_CONCURRENCY):
+        submit_next()
+
+    while pending:
+        batch, embedded = pending.popleft()
+        start = time.perf_counter()
+        embedded.result()
+        submit_next()
+
+        per_query = search_collections_batch(batch, limits, where)
+        results = [
+            _merge(query, per_collection, limits, top_k, hybrid, where)
+            for query, per_collection in zip(batch, per_query)
+        ]
+
+        elapsed = time.perf_counter() - start
+        _latency.record("batch", elapsed)
+        logger.info(f"[RETRIEVE] Batch of {len(batch)} | {elapsed * 1000:.0f}ms")
+        yield results
+
+def retrieve_batch(queries: Iterable[str], **kwargs) -> list[list[dict]]:
+    """Hit lists for every query, in input order; see `iter_retrieve_batch`."""
+    return [hits for batch in iter_retrieve_batch(queries, **kwargs) for hits in batch]
+
+def cache_stats() -> dict:
+    return {
+        "query_cache": _query_cache.stats(),
+        "result_cache": _result_cache.stats(),
+        "latency": _latency.summary(),
+    }
+
+def retrieve_lines(lines: Iterable[str], out=sys.stdout, top_k: int = 5, hybrid: bool = False, batch_size: int = QUERY_BATCH_SIZE):
+    """Offline evaluation: one question per line in, one JSON line of hits per question out (same order)."""
+    questions = (line.strip() for line in lines if line.strip())
+    for batch in iter_retrieve_batch(questions, top_k=top_k, hybrid=hybrid, batch_size=batch_size):
+        for hits in batch:
+            out.write(json.dumps(hits, ensure_ascii=False) + "\n")
+        out.flush()
 
-    query_vector = query_embeddings.embed_query(query)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch retrieval for a file of questions")
+    parser.add_argument("questions", nargs="?", type=argparse.FileType("r", encoding="utf-8"), default=sys.stdin)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--hybrid", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=QUERY_BATCH_SIZE)
+    args = parser.parse_args()
 
-    vectorstore = get_vectorstore(collection_name)
-    results = vectorstore._collection.query(
-        query_embeddings=[query_vector],
-        n_results=top_k,
-        include=["documents", "metadatas", "distances"]
-    )
\ No newline at end of file
+    retrieve_lines(args.questions, top_k=args.top_k, hybrid=args.hybrid, batch_size=args.batch_size)
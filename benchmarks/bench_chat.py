@@ -0,0 +1,106 @@
+"""Offline load test for the chat service.
+
+    python -m benchmarks.bench_chat --requests 500 --concurrency 50
+
+Runs against an in-process app with the fake embedder and fake LLM, seeded
+with synthetic chunks in a throwaway data directory. Pass --url to load-test a
+running server instead (e.g. `LLM_BACKEND=fake uvicorn app.retrieval.chat:app`);
+only then is time-to-first-token meaningful, since the in-process transport
+buffers the whole response. Needs httpx.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+QUESTIONS = [
+    "How should I program tempo squats for youth athletes?",
+    "What does velocity based training measure?",
+    "How does strength training help aerobic capacity?",
+    "What is a good sprint warm up?",
+    "How do you individualize semi-private training?",
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def one_request(client: httpx.AsyncClient, question: str) -> tuple[float, float | None]:
+    start = time.perf_counter()
+    first = None
+    async with client.stream("POST", "/chat", json={"question": question}) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if first is None and line.startswith("event: token"):
+                first = time.perf_counter() - start
+    return time.perf_counter() - start, first
+
+
+async def load(client: httpx.AsyncClient, total: int, concurrency: int):
+    gate = asyncio.Semaphore(concurrency)
+    latencies, ttfts, errors = [], [], 0
+
+    async def worker(i: int):
+        nonlocal errors
+        async with gate:
+            try:
+                latency, ttft = await one_request(client, QUESTIONS[i % len(QUESTIONS)])
+                latencies.append(latency)
+                if ttft is not None:
+                    ttfts.append(ttft)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+
+    print(f"requests   : {total} ({errors} errors) at concurrency {concurrency}")
+    print(f"throughput : {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        print(
+            f"latency    : p50={statistics.median(latencies) * 1000:.0f}ms "
+            f"p95={percentile(latencies, 95) * 1000:.0f}ms p99={percentile(latencies, 99) * 1000:.0f}ms"
+        )
+    if ttfts:
+        print(f"first token: p50={statistics.median(ttfts) * 1000:.0f}ms p99={percentile(ttfts, 99) * 1000:.0f}ms")
+
+
+def local_app(chunks: int):
+    os.environ.setdefault("RAG_DATA_DIR", tempfile.mkdtemp(prefix="bench-chat-"))
+    os.environ.setdefault("EMBEDDER_BACKEND", "fake")
+    os.environ.setdefault("LLM_BACKEND", "fake")
+
+    from benchmarks.bench_embed import synthetic_chunks
+    from app.ingestion.embed import ingest_chunks
+    from app.retrieval.chat import app
+
+    ingest_chunks(synthetic_chunks(chunks), "blogs")
+    return app
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=1000, help="synthetic chunks for the in-process app")
+    parser.add_argument("--url", help="load-test a running server instead")
+    args = parser.parse_args()
+
+    if args.url:
+        transport, base_url = None, args.url
+    else:
+        transport, base_url = httpx.ASGITransport(app=local_app(args.chunks)), "http://bench"
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=120) as client:
+        await load(client, args.requests, args.concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""Offline benchmark for the batched embedding engine.
+
+    python -m benchmarks.bench_embed --chunks 2000 --latency 0.2
+
+Runs the old one-chunk-per-call shape (batch size 1, one worker) against
+the batched engine, using FakeEmbeddings and a throwaway Chroma directory.
+"""
+import argparse
+import random
+import tempfile
+import time
+
+import chromadb
+
+from app.core.embeddings import FakeEmbeddings
+from app.ingestion.batching import EMBED_BATCH_SIZE, EMBED_CONCURRENCY, ingest_batches
+
+WORDS = (
+    "squat deadlift tempo velocity aerobic capacity athlete sprint mobility "
+    "hamstring recovery program coach strength power speed volume intensity"
+).split()
+
+
+def synthetic_chunks(n: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "chunk_id": f"bench-{i}",
+            "parent_id": f"parent-{i // 10}",
+            "source_type": "blog",
+            "title": f"Synthetic {i // 10}",
+            "source_url": f"https://example.com/{i // 10}",
+            "text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(200, 400))),
+        }
+        for i in range(n)
+    ]
+
+
+def run(chunks: list[dict], latency: float, concurrency: int, batch_size: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        client = chromadb.PersistentClient(path=tmp)
+        collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+
+        start = time.perf_counter()
+        ingest_batches(
+            collection,
+            FakeEmbeddings(latency=latency),
+            chunks,
+            label="bench",
+            concurrency=concurrency,
+            max_size=batch_size,
+        )
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.1, help="fake seconds per embed call")
+    parser.add_argument("--concurrency", type=int, default=EMBED_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--skip-serial", action="store_true")
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.chunks)
+
+    if not args.skip_serial:
+        serial = run(chunks, args.latency, concurrency=1, batch_size=1)
+        print(f"serial   : {serial:8.2f}s  {len(chunks) / serial:10.1f} chunks/s")
+
+    batched = run(chunks, args.latency, args.concurrency, args.batch_size)
+    print(f"batched  : {batched:8.2f}s  {len(chunks) / batched:10.1f} chunks/s")
+
+
+if __name__ == "__main__":
+    main()
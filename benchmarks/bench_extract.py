@@ -0,0 +1,173 @@
+"""lxml extractor (fast) versus the BeautifulSoup heuristic (soup) on blog HTML.
+
+    python -m benchmarks.bench_extract --pages 40 --depths 5 20 60
+    python -m benchmarks.bench_extract --fixtures benchmarks/fixtures/html --check
+
+Pages are synthetic by default, in four templates: an <article> post, a
+WordPress entry-content post, a page-builder layout of nested divs (the
+longest-div fallback, at each --depth) and malformed markup. --fixtures
+reads saved .html files instead, with one subdirectory per site. --save
+writes the synthetic pages in that layout.
+
+Parity counts pages where both engines return identical content and title.
+For the others it also reports the share of content lines they have in
+common. With --check the exit status is 1 unless every page matches.
+benchmarks/fixtures/html holds a stored set, written with --save.
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+from app.ingestion.html_extract import FastExtractor, SoupExtractor
+
+WORDS = (
+    "squat bench deadlift athlete coach program volume intensity recovery sleep "
+    "protein tempo sprint hamstring mobility bracing tension progress season"
+).split()
+
+CHROME = """<nav><a href="/">Home</a><a href="/blog">Blog</a></nav>
+<script>window.dataLayer = [];</script><style>.x{color:red}</style>"""
+FOOTER = "<aside>Subscribe to the newsletter</aside><footer>&copy; Challenger Strength</footer>"
+
+
+def paragraphs(rng: random.Random, n: int) -> str:
+    return "\n".join(
+        f"<p>{' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 60)))}.</p>" for _ in range(n)
+    )
+
+
+def article_page(rng: random.Random, depth: int) -> str:
+    return (f"<html><head><title>Post</title></head><body>{CHROME}"
+            f"<article><h1>Training {rng.randint(1, 999)}</h1>{paragraphs(rng, 12)}</article>{FOOTER}</body></html>")
+
+
+def wordpress_page(rng: random.Random, depth: int) -> str:
+    return (f"<html><head><title>Blog | Site</title></head><body>{CHROME}<div class=\"wrap\">"
+            f"<h1>Recovery {rng.randint(1, 999)}</h1><div class=\"post entry-content clearfix\">{paragraphs(rng, 12)}</div>"
+            f"<div class=\"comments\">{paragraphs(rng, 2)}</div></div>{FOOTER}</body></html>")
+
+
+def builder_page(rng: random.Random, depth: int) -> str:
+    # Page builders wrap the post in many layers of section/row/column divs
+    opening = "".join(f"<div class=\"et_pb_level_{i}\">" for i in range(depth))
+    closing = "</div>" * depth
+    sidebar = f"<div class=\"sidebar\">{paragraphs(rng, 2)}</div>"
+    page = (f"<div id=\"page-container\">{opening}<div class=\"et_pb_post_body\">{paragraphs(rng, 12)}</div>"
+            f"{closing}{sidebar}</div>")
+    if rng.random() < 0.3:
+        # Some pages of the same site add an outer wrapper with a banner, which then wins the longest-div rule
+        page = f"<div id=\"site-wrapper\"><div class=\"banner\">{paragraphs(rng, 1)}</div>{page}</div>"
+    return (f"<html><head><title>Strength {rng.randint(1, 999)}</title></head><body>{CHROME}"
+            f"{page}{FOOTER}</body></html>")
+
+
+def malformed_page(rng: random.Random, depth: int) -> str:
+    # Unclosed paragraphs and divs, stray end tags, no <html>/<body>
+    body = "".join(f"<div><p>{' '.join(rng.choice(WORDS) for _ in range(30))}" for _ in range(6))
+    return f"<title>Broken</title>{CHROME}<div class=\"content\"><h1>Broken</h1>{body}</span></td>"
+
+
+TEMPLATES = {
+    "article": article_page,
+    "wordpress": wordpress_page,
+    "builder": builder_page,
+    "malformed": malformed_page,
+}
+
+
+def synthetic_pages(pages: int, depths: list[int], seed: int) -> dict[str, list[tuple[str, str]]]:
+    """group -> [(url, html)]; one host per group, so each group is one site template."""
+    rng = random.Random(seed)
+    groups = {}
+    for name, template in TEMPLATES.items():
+        for depth in depths if name == "builder" else depths[:1]:
+            group = f"{name}-d{depth}" if name == "builder" else name
+            groups[group] = [
+                (f"https://{group}.example/post-{i}", template(rng, depth)) for i in range(pages)
+            ]
+    return groups
+
+
+def load_fixtures(root: Path) -> dict[str, list[tuple[str, str]]]:
+    groups = {}
+    for path in sorted(root.rglob("*.html")):
+        site = path.parent.name
+        groups.setdefault(site, []).append((f"https://{site}/{path.stem}", path.read_text(encoding="utf-8", errors="replace")))
+    return groups
+
+
+def save_fixtures(groups: dict[str, list[tuple[str, str]]], root: Path):
+    for group, pages in groups.items():
+        (root / group).mkdir(parents=True, exist_ok=True)
+        for i, (_, html) in enumerate(pages):
+            (root / group / f"{i:04d}.html").write_text(html, encoding="utf-8")
+
+
+def run(extractor, pages: list[tuple[str, str]]) -> tuple[float, list[tuple[str, str | None]]]:
+    start = time.perf_counter()
+    results = [extractor.extract(html, url) for url, html in pages]
+    return time.perf_counter() - start, results
+
+
+def line_overlap(old: str, new: str) -> float:
+    old_lines, new_lines = old.splitlines(), set(new.splitlines())
+    if not old_lines:
+        return 1.0 if not new_lines else 0.0
+    return sum(line in new_lines for line in old_lines) / len(old_lines)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40, help="synthetic pages per template")
+    parser.add_argument("--depths", type=int, nargs="+", default=[5, 20, 60], help="div nesting of the page-builder template")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixtures", type=Path, help="directory of saved .html pages, one subdirectory per site")
+    parser.add_argument("--save", type=Path, help="write the synthetic pages here and exit")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 unless every page matches")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        groups = load_fixtures(args.fixtures)
+    else:
+        groups = synthetic_pages(args.pages, args.depths, args.seed)
+    if args.save:
+        save_fixtures(groups, args.save)
+        print(f"wrote {sum(len(p) for p in groups.values())} pages to {args.save}")
+        return
+
+    soup, fast = SoupExtractor(), FastExtractor()
+    print(f"{'site':<14}{'pages':>6}{'soup p/s':>10}{'fast p/s':>10}{'speedup':>9}  parity")
+    totals = {"soup": 0.0, "fast": 0.0}
+    same_total = pages_total = 0
+    for group, pages in groups.items():
+        soup_seconds, old = run(soup, pages)
+        fast_seconds, new = run(fast, pages)
+        totals["soup"] += soup_seconds
+        totals["fast"] += fast_seconds
+
+        differing = [(a, b) for a, b in zip(old, new) if a != b]
+        same = len(pages) - len(differing)
+        same_total += same
+        pages_total += len(pages)
+        parity = f"{same}/{len(pages)}"
+        if differing:
+            overlap = sum(line_overlap(a[0], b[0]) for a, b in differing) / len(differing)
+            parity += f" (differing pages share {overlap:.0%} of lines)"
+        n = len(pages)
+        print(
+            f"{group:<14}{n:>6}{n / soup_seconds:>10.0f}{n / fast_seconds:>10.0f}"
+            f"{soup_seconds / fast_seconds:>8.1f}x  {parity}"
+        )
+
+    print(
+        f"{'total':<14}{pages_total:>6}{pages_total / totals['soup']:>10.0f}{pages_total / totals['fast']:>10.0f}"
+        f"{totals['soup'] / totals['fast']:>8.1f}x  {same_total}/{pages_total}"
+    )
+    if args.check and same_total < pages_total:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Recall@k versus memory and latency: Chroma HNSW, exact NumPy search and the quantized index.
+
+    python -m benchmarks.bench_quantized --vectors 20000 --queries 200 --dim 3072 --dims 128 256 768 --candidates 20 100
+
+Vectors are synthetic but shaped like Matryoshka embeddings: clustered, with
+variance decaying across dimensions so the leading ones carry most of the
+signal. Ground truth is exact float cosine. "memory" is what each backend
+keeps resident for search: HNSW segment files for Chroma, the float matrix
+for exact search, int8 codes plus
+scales for the quantized index (its float vectors stay on disk and only the
+re-ranked candidate rows are read).
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import chromadb
+import numpy as np
+
+from app.retrieval.exact import ExactIndex
+from app.retrieval.filters import metadata_columns
+from app.retrieval.quantized import QuantizedIndex
+
+CHROMA_BATCH = 5000
+
+
+def synthetic_vectors(n: int, dim: int, seed: int = 0, clusters: int = 200) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    weights = (1 + np.arange(dim) / 32) ** -0.75
+    centers = rng.normal(size=(clusters, dim))
+    labels = rng.integers(0, clusters, size=n)
+    vectors = (centers[labels] + rng.normal(scale=0.8, size=(n, dim))) * weights
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> list[set[int]]:
+    scores = queries @ vectors.T
+    return [set(np.argpartition(-row, k)[:k].tolist()) for row in scores]
+
+
+def recall(found: list[set[int]], truth: list[set[int]]) -> float:
+    return float(np.mean([len(f & t) / len(t) for f, t in zip(found, truth)]))
+
+
+def dir_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def bench_chroma(vectors, queries, k, tmp: Path):
+    client = chromadb.PersistentClient(path=str(tmp / "chroma"))
+    collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+    ids = [str(i) for i in range(len(vectors))]
+    for start in range(0, len(vectors), CHROMA_BATCH):
+        end = start + CHROMA_BATCH
+        collection.add(ids=ids[start:end], embeddings=vectors[start:end].tolist())
+
+    latencies, found = [], []
+    for q in queries:
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[q.tolist()], n_results=k, include=[])
+        latencies.append(time.perf_counter() - start)
+        found.append({int(i) for i in result["ids"][0]})
+
+    # The HNSW segment lives in a per-collection subdirectory next to chroma.sqlite3
+    hnsw = sum(dir_bytes(p) for p in (tmp / "chroma").iterdir() if p.is_dir())
+    return found, latencies, hnsw
+
+
+def bench_exact(vectors, queries, k, batch: int = 1):
+    index = ExactIndex(np.arange(len(vectors)).astype(str), vectors.copy(), metadata_columns([{}] * len(vectors)), "")
+
+    latencies, found = [], []
+    for start in range(0, len(queries), batch):
+        began = time.perf_counter()
+        results = index.search(queries[start:start + batch], k)
+        # Per-query latency, amortized over the batch
+        latencies.extend([(time.perf_counter() - began) / len(results)] * len(results))
+        found.extend({int(chunk_id) for chunk_id, _ in hits} for hits in results)
+    return found, latencies, index.nbytes
+
+
+def build_quantized(vectors, dims, tmp: Path) -> QuantizedIndex:
+    ids = [str(i) for i in range(len(vectors))]
+    batches = [(ids, vectors, [{}] * len(vectors))]
+    return QuantizedIndex.build(tmp / f"q{dims}", batches, len(vectors), vectors.shape[1], dims)
+
+
+def bench_quantized(index, queries, k, candidates=None):
+    latencies, found = [], []
+    for q in queries:
+        start = time.perf_counter()
+        hits = index.search(q, k, candidates=candidates)
+        latencies.append(time.perf_counter() - start)
+        found.append({int(chunk_id) for chunk_id, _ in hits})
+    return found, latencies, index.nbytes
+
+
+def report(name, found, latencies, nbytes, truth, n):
+    lat = np.array(latencies) * 1000
+    print(
+        f"{name:<18} recall@k={recall(found, truth):.3f}  "
+        f"p50={np.percentile(lat, 50):6.2f}ms  p95={np.percentile(lat, 95):6.2f}ms  "
+        f"memory={nbytes / 1e6:7.1f}MB ({nbytes / n:.0f} B/vector)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    # gemini-embedding-001's output size
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--dims", type=int, nargs="+", default=[128, 256, 768])
+    parser.add_argument("--candidates", type=int, nargs="*", default=[],
+                        help="re-rank pool sizes to try besides the default")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--skip-chroma", action="store_true")
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.vectors, args.dim)
+    # Queries are perturbed corpus points, like a question close to a passage
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, args.vectors, size=args.queries)
+    queries = vectors[picks] + rng.normal(scale=0.02, size=(args.queries, args.dim)).astype(np.float32)
+    truth = exact_top_k(vectors, queries, args.k)
+
+    print(f"{args.vectors} vectors x {args.dim} dims | {args.queries} queries | k={args.k}")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        if not args.skip_chroma:
+            report("chroma hnsw", *bench_chroma(vectors, queries, args.k, tmp), truth, args.vectors)
+        report("numpy exact", *bench_exact(vectors, queries, args.k), truth, args.vectors)
+        report("numpy exact x32", *bench_exact(vectors, queries, args.k, batch=32), truth, args.vectors)
+        for dims in args.dims:
+            index = build_quantized(vectors, dims, tmp)
+            for candidates in [None, *args.candidates]:
+                name = f"int8 {dims}d/{candidates or 'auto'}"
+                report(name, *bench_quantized(index, queries, args.k, candidates), truth, args.vectors)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Token-offset splitter versus the recursive LangChain splitter.
+
+    python -m benchmarks.bench_split --docs 20 --words 12000
+
+Transcripts are synthetic Whisper-style text: one long line of sentences,
+with an occasional paragraph break. Reports throughput for both modes, how
+many chunk boundaries match exactly, and the largest chunk each mode
+produced (re-encoded with tiktoken, so it checks the CHUNK_SIZE budget).
+"""
+import argparse
+import random
+import time
+
+from app.ingestion.chunk import CHUNK_SIZE, get_encoding, split_pieces
+
+WORDS = (
+    "so the squat is really about bracing and you want to keep tension through "
+    "the whole rep I think a lot of athletes miss that when they go heavy and "
+    "honestly the program matters less than consistency over time like sleep "
+    "protein recovery volume intensity tempo velocity sprint hamstring coach"
+).split()
+
+
+def synthetic_transcript(n_words: int, rng: random.Random) -> str:
+    sentences = []
+    words = 0
+    while words < n_words:
+        length = rng.randint(4, 30)
+        sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+        sentences.append(sentence[0].upper() + sentence[1:] + rng.choice([".", ".", ".", "?"]))
+        words += length
+        if rng.random() < 0.02:
+            sentences.append("\n\n")
+    return " ".join(sentences).replace(" \n\n ", "\n\n")
+
+
+def run(docs: list[str], mode: str) -> tuple[float, list[list[str]]]:
+    start = time.perf_counter()
+    chunks = [split_pieces(doc, mode) for doc in docs]
+    return time.perf_counter() - start, chunks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--words", type=int, default=12000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    docs = [synthetic_transcript(args.words, rng) for _ in range(args.docs)]
+    total_tokens = sum(len(get_encoding().encode(doc)) for doc in docs)
+    print(f"{args.docs} transcripts | {total_tokens} tokens | chunk_size={CHUNK_SIZE}")
+
+    results = {}
+    for mode in ("recursive", "token"):
+        seconds, chunks = run(docs, mode)
+        results[mode] = chunks
+        n_chunks = sum(len(c) for c in chunks)
+        largest = max(len(get_encoding().encode(c)) for doc in chunks for c in doc)
+        print(
+            f"{mode:>9} | {seconds:7.2f}s | {total_tokens / seconds:10.0f} tokens/s | "
+            f"{n_chunks} chunks | largest={largest} tokens"
+        )
+
+    same_docs = 0
+    same_chunks = 0
+    for old, new in zip(results["recursive"], results["token"]):
+        same_docs += old == new
+        same_chunks += len(set(old) & set(new))
+    n_old = sum(len(c) for c in results["recursive"])
+    print(
+        f"   parity | identical documents: {same_docs}/{args.docs} | "
+        f"identical chunks: {same_chunks}/{n_old} ({same_chunks / n_old:.1%})"
+    )
+
+
+if __name__ == "__main__":
+    main()
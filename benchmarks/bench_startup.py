@@ -0,0 +1,97 @@
+"""Import time of each entry point, and which heavy dependencies it drags in.
+
+    python -m benchmarks.bench_startup --runs 5 --budget 1.0
+    python -m benchmarks.bench_startup --top app.retrieval.chat
+
+Every measurement is a fresh interpreter, so nothing is cached between
+runs, and the median is reported. "loads" lists the heavy libraries already
+in sys.modules after the import. A blog-only entry point should show none.
+Entry points over --budget seconds are flagged, and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# label -> module imported by that entry point
+ENTRY_POINTS = {
+    "cli": "app.__main__",
+    "config": "app.core.config",
+    "fetch": "app.ingestion.fetch",
+    "extract (blogs)": "app.ingestion.extract",
+    "chunk": "app.ingestion.chunk",
+    "embed": "app.ingestion.embed",
+    "transcriber": "app.ingestion.transcriber",
+    "pipeline": "app.ingestion.pipeline",
+    "retrieve": "app.retrieval.retrieve",
+    "chat api": "app.retrieval.chat",
+}
+
+HEAVY = ["faster_whisper", "ctranslate2", "av", "chromadb", "langchain_chroma",
+         "langchain_google_genai", "langchain_text_splitters", "tiktoken"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loads": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str) -> dict:
+    done = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+        capture_output=True, text=True, check=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+
+def top_imports(module: str, n: int) -> list[tuple[float, str]]:
+    """Slowest imports (cumulative) from `python -X importtime`."""
+    done = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in done.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        rows.append((int(cumulative) / 1e6, name.rstrip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds allowed per entry point")
+    parser.add_argument("--top", metavar="MODULE", help="show the slowest imports under MODULE instead")
+    args = parser.parse_args()
+
+    if args.top:
+        for seconds, name in top_imports(args.top, 25):
+            print(f"{seconds * 1000:8.1f}ms  {name}")
+        return
+
+    over = 0
+    print(f"{'entry point':<17}{'module':<28}{'median':>9}{'max':>9}  loads")
+    for label, module in ENTRY_POINTS.items():
+        runs = [measure(module) for _ in range(args.runs)]
+        seconds = [r["seconds"] for r in runs]
+        flag = ""
+        if statistics.median(seconds) > args.budget:
+            flag = "  OVER BUDGET"
+            over += 1
+        print(
+            f"{label:<17}{module:<28}{statistics.median(seconds) * 1000:7.0f}ms{max(seconds) * 1000:7.0f}ms  "
+            f"{', '.join(runs[-1]['loads']) or '-'}{flag}"
+        )
+    if over:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
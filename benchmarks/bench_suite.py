@@ -0,0 +1,350 @@
+"""End-to-end offline benchmark: transcription, chunking, embedding, retrieval and chat by corpus size.
+
+    python -m benchmarks.bench_suite --chunks 1000 10000 100000
+    python -m benchmarks.bench_suite --chunks 1000 10000 --save-baseline
+
+Each size runs in its own process against a throwaway data directory.
+That process generates a synthetic corpus of blog posts and podcast audio
+(sparse MP3-sized files) of roughly the requested number of chunks. It then
+runs the real pipeline stages with the fake Gemini embedder, fake Gemini LLM
+and fake Whisper model. Their latencies are set by the flags, so the numbers
+measure this code rather than the network.
+
+Memory is the process's peak RSS after each stage. Chunking worker
+processes aren't included.
+
+Results are compared with the stored baseline (benchmarks/baselines/suite.json).
+Any metric worse than the baseline by more than --tolerance is reported as a
+regression, and the exit status is 1. Baselines are machine-specific, so
+re-record them with --save-baseline where the comparison will run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "suite.json"
+
+# Sized so a blog is ~5 chunks and an episode ~10 at the default CHUNK_SIZE
+BLOG_WORDS = 1600
+EPISODE_SECONDS = 20 * 60
+MP3_BYTES_PER_SECOND = 128_000 // 8
+CHUNKS_PER_BLOG = 5
+CHUNKS_PER_EPISODE = 10
+
+WORDS = (
+    "squat deadlift tempo velocity aerobic capacity athlete sprint mobility hamstring recovery "
+    "program coach strength power speed volume intensity youth semi-private warm up progression "
+    "the a of to and in for with on is that you your this we"
+).split()
+
+# Metric name suffix -> True when higher is better
+DIRECTIONS = {"_per_s": True, "_realtime_x": True, "_ms": False, "_mb": False}
+
+
+def synthetic_text(rng: random.Random, n_words: int) -> str:
+    paragraphs, sentences, words = [], [], 0
+    while words < n_words:
+        length = rng.randint(6, 24)
+        sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+        sentences.append(sentence[0].upper() + sentence[1:] + ".")
+        words += length
+        if rng.random() < 0.15:
+            paragraphs.append(" ".join(sentences))
+            sentences = []
+    paragraphs.append(" ".join(sentences))
+    return "\n\n".join(p for p in paragraphs if p)
+
+
+def synthetic_queries(n: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    return [
+        f"How does {rng.choice(WORDS)} {rng.choice(WORDS)} affect {rng.choice(WORDS)} {rng.choice(WORDS)} {i}?"
+        for i in range(n)
+    ]
+
+
+def write_corpus(target_chunks: int, podcast_share: float, seed: int = 0) -> tuple[int, list[tuple[str, dict]]]:
+    """Raw blog posts plus podcast audio; returns (blog count, [(episode_id, registry item)])."""
+    from app.core.config import PODCASTS_AUDIO_PATH, RAW_BLOGS_DIR
+
+    rng = random.Random(seed)
+    n_episodes = round(target_chunks * podcast_share / CHUNKS_PER_EPISODE)
+    n_blogs = max(1, round((target_chunks - n_episodes * CHUNKS_PER_EPISODE) / CHUNKS_PER_BLOG))
+
+    RAW_BLOGS_DIR.mkdir(parents=True, exist_ok=True)
+    for i in range(n_blogs):
+        blog_id = f"bench-blog-{i}"
+        raw = {
+            "blog_id": blog_id,
+            "title": f"Synthetic post {i}",
+            "url": f"https://example.com/blog/{i}",
+            "content": synthetic_text(rng, BLOG_WORDS),
+        }
+        with open(RAW_BLOGS_DIR / f"{blog_id}.json", "w", encoding="utf-8") as f:
+            json.dump(raw, f, ensure_ascii=False)
+
+    PODCASTS_AUDIO_PATH.mkdir(parents=True, exist_ok=True)
+    episodes = []
+    for i in range(n_episodes):
+        episode_id = f"bench-episode-{i}"
+        # Sparse: the fake Whisper model only reads the size
+        with open(PODCASTS_AUDIO_PATH / f"{episode_id}.mp3", "wb") as f:
+            f.truncate(EPISODE_SECONDS * MP3_BYTES_PER_SECOND)
+        episodes.append((episode_id, {
+            "title": f"Synthetic episode {i}",
+            "episode_url": f"https://example.com/podcast/{i}",
+            "audio_url": f"https://example.com/podcast/{i}.mp3",
+            "published_at": "Mon, 06 Jan 2025 10:00:00 GMT",
+        }))
+    return n_blogs, episodes
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+@contextmanager
+def measure(results: dict, stage: str):
+    before = peak_rss_mb()
+    row = {}
+    start = time.perf_counter()
+    yield row
+    row["seconds"] = round(time.perf_counter() - start, 3)
+    row["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    row["rss_growth_mb"] = round(max(0.0, row["peak_rss_mb"] - before), 1)
+    results[stage] = row
+
+
+def percentiles_ms(latencies: list[float]) -> tuple[float, float]:
+    ordered = sorted(latencies)
+    p50 = ordered[len(ordered) // 2]
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return round(p50 * 1000, 2), round(p95 * 1000, 2)
+
+
+async def chat_load(app, questions: list[str], concurrency: int) -> list[float]:
+    import httpx
+
+    from benchmarks.bench_chat import one_request
+
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def worker(question: str):
+        async with gate:
+            latency, _ = await one_request(client, question)
+            latencies.append(latency)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await asyncio.gather(*(worker(q) for q in questions))
+    return latencies
+
+
+def run_size(target: int, args) -> dict:
+    """One corpus size, end to end. Runs in the child process, after the env is set."""
+    from app.core.vectorstore import get_vectorstore
+    from app.ingestion.chunk import BLOGS_CHUNKS_DIR, PODCASTS_CHUNKS_DIR, chunker, load_manifest
+    from app.ingestion.embed import embedder
+    from app.ingestion.transcriber import record_transcription, save_raw_transcript, transcribe_episodes
+    from app.retrieval.retrieve import retrieve, retrieve_batch
+
+    results = {}
+
+    with measure(results, "corpus") as row:
+        n_blogs, episodes = write_corpus(target, args.podcast_share)
+        row.update(blogs=n_blogs, episodes=len(episodes))
+
+    with measure(results, "transcribe") as row:
+        from app.core.config import PODCASTS_AUDIO_PATH
+
+        items = dict(episodes)
+        sources = {episode_id: PODCASTS_AUDIO_PATH / f"{episode_id}.mp3" for episode_id in items}
+        audio = 0.0
+        for episode_id, transcript, seconds in transcribe_episodes(list(sources.items()), args.whisper_workers):
+            record_transcription(sources[episode_id], transcript, seconds)
+            save_raw_transcript(episode_id, items[episode_id], transcript)
+            audio += transcript["duration"]
+    if episodes:
+        row["episodes_per_s"] = round(len(episodes) / row["seconds"], 2)
+        row["audio_realtime_x"] = round(audio / row["seconds"], 1)
+
+    with measure(results, "chunk") as row:
+        changes = chunker()
+    chunks = sum(
+        entry["chunks"] or 0
+        for chunks_dir in (BLOGS_CHUNKS_DIR, PODCASTS_CHUNKS_DIR)
+        for entry in load_manifest(chunks_dir).values()
+    )
+    row["chunks"] = chunks
+    row["chunks_per_s"] = round(chunks / row["seconds"], 1)
+
+    with measure(results, "embed") as row:
+        embedder(changes)
+    vectors = sum(get_vectorstore(name)._collection.count() for name in ("blogs", "podcasts"))
+    row["vectors"] = vectors
+    row["chunks_per_s"] = round(vectors / row["seconds"], 1)
+
+    queries = synthetic_queries(args.queries * 2 + 1, seed=1)
+    with measure(results, "retrieve") as row:
+        # The first query loads the search indexes; time it on its own
+        start = time.perf_counter()
+        retrieve(queries[0])
+        row["first_query_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+        latencies = []
+        for query in queries[1:args.queries + 1]:
+            start = time.perf_counter()
+            retrieve(query)
+            latencies.append(time.perf_counter() - start)
+        row["p50_ms"], row["p95_ms"] = percentiles_ms(latencies)
+        row["queries_per_s"] = round(len(latencies) / sum(latencies), 1)
+
+        batch = queries[args.queries + 1:]
+        start = time.perf_counter()
+        retrieve_batch(batch)
+        row["batch_queries_per_s"] = round(len(batch) / (time.perf_counter() - start), 1)
+
+    with measure(results, "chat") as row:
+        from app.retrieval.chat import app
+
+        questions = synthetic_queries(args.requests, seed=2)
+        start = time.perf_counter()
+        latencies = asyncio.run(chat_load(app, questions, args.concurrency))
+        row["requests_per_s"] = round(len(latencies) / (time.perf_counter() - start), 1)
+        row["p50_ms"], row["p95_ms"] = percentiles_ms(latencies)
+
+    return results
+
+
+def child_env(args, data_dir: str) -> dict:
+    return {
+        **os.environ,
+        "RAG_DATA_DIR": data_dir,
+        "EMBEDDER_BACKEND": "fake",
+        "LLM_BACKEND": "fake",
+        "WHISPER_BACKEND": "fake",
+        "FAKE_EMBED_LATENCY": str(args.embed_latency),
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_LLM_TOKEN_LATENCY": str(args.token_latency),
+        "FAKE_WHISPER_RTF": str(args.whisper_rtf),
+    }
+
+
+def run_child(target: int, args) -> dict:
+    with tempfile.TemporaryDirectory(prefix="bench-suite-") as tmp:
+        out, log = Path(tmp) / "result.json", Path(tmp) / "run.log"
+        command = [sys.executable, "-m", "benchmarks.bench_suite", "--child", str(target), "--out", str(out)]
+        command += [arg for arg in sys.argv[1:] if arg != "--save-baseline"]
+        with open(log, "w") as stderr:
+            done = subprocess.run(
+                command, env=child_env(args, str(Path(tmp) / "data")),
+                stdout=subprocess.DEVNULL, stderr=None if args.verbose else stderr,
+            )
+        if done.returncode != 0:
+            tail = log.read_text(encoding="utf-8", errors="replace").splitlines()[-20:]
+            raise RuntimeError(f"{target} chunks failed (exit {done.returncode}):\n" + "\n".join(tail))
+        return json.loads(out.read_text(encoding="utf-8"))
+
+
+def settings(args) -> dict:
+    return {
+        key: getattr(args, key)
+        for key in ("podcast_share", "queries", "requests", "concurrency", "whisper_workers",
+                    "embed_latency", "llm_latency", "token_latency", "whisper_rtf")
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Metrics worse than the baseline by more than `tolerance` (a fraction)."""
+    regressions = []
+    for size, stages in results.items():
+        for stage, row in stages.items():
+            base_row = baseline.get("results", {}).get(size, {}).get(stage, {})
+            for metric, value in row.items():
+                higher_better = next((d for suffix, d in DIRECTIONS.items() if metric.endswith(suffix)), None)
+                base = base_row.get(metric)
+                if higher_better is None or not base or metric.startswith(("first_", "rss_")):
+                    continue
+                change = (value - base) / base
+                if (-change if higher_better else change) > tolerance:
+                    regressions.append(f"{size} chunks | {stage}.{metric}: {base} -> {value} ({change:+.0%})")
+    return regressions
+
+
+def print_results(results: dict):
+    for size, stages in results.items():
+        print(f"--- {size} chunks ---")
+        for stage, row in stages.items():
+            fields = "  ".join(f"{k}={v}" for k, v in row.items())
+            print(f"{stage:<11}{fields}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="approximate corpus sizes, in chunks")
+    parser.add_argument("--podcast-share", type=float, default=0.4, help="fraction of chunks from podcasts")
+    parser.add_argument("--queries", type=int, default=200, help="single and batched retrieval queries each")
+    parser.add_argument("--requests", type=int, default=100, help="chat requests")
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent chat requests")
+    parser.add_argument("--whisper-workers", type=int, default=1)
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="fake seconds per embed call")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="fake time to first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="fake seconds per streamed token")
+    parser.add_argument("--whisper-rtf", type=float, default=0.0, help="fake transcription seconds per audio second")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="record these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown before flagging, as a fraction")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own logging")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--out", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        args.out.write_text(json.dumps(run_size(args.child, args)), encoding="utf-8")
+        return
+
+    results = {}
+    for target in args.chunks:
+        print(f"running {target} chunks ...", flush=True)
+        results[str(target)] = run_child(target, args)
+    print_results(results)
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+    if baseline:
+        if baseline.get("settings") != settings(args):
+            print(f"note: baseline was recorded with different settings: {baseline.get('settings')}")
+        regressions = compare(results, baseline, args.tolerance)
+        print(f"{len(regressions)} regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+        for line in regressions:
+            print(f"  REGRESSION {line}")
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        merged = baseline.get("results", {}) if baseline.get("settings") == settings(args) else {}
+        args.baseline.write_text(json.dumps({
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "machine": {"cpus": os.cpu_count(), "python": platform.python_version(), "platform": platform.platform()},
+            "settings": settings(args),
+            "results": {**merged, **results},
+        }, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline saved to {args.baseline}")
+    elif baseline and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Episodes/hour versus transcription worker count.
+
+    python -m benchmarks.bench_transcribe --audio clip.mp3 --episodes 8 --workers 1 2 4
+
+Each "episode" is a copy of the same short clip. Prefer a real 1-2 minute
+podcast excerpt via --audio: the default fixture is a synthetic voiced
+signal written with `wave`, and the VAD filter may discard much of it.
+"""
+import argparse
+import math
+import os
+import random
+import shutil
+import struct
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+from app.ingestion.transcriber import plan_workers, transcribe_episodes
+
+SAMPLE_RATE = 16000
+
+
+def write_fixture(path: Path, seconds: int = 60, seed: int = 0):
+    # Vowel-like bursts: a 120 Hz fundamental with formant-ish harmonics,
+    # amplitude-modulated at syllable rate and separated by short pauses
+    rng = random.Random(seed)
+    frames = bytearray()
+    t = 0
+    while t < seconds * SAMPLE_RATE:
+        burst = int(SAMPLE_RATE * rng.uniform(0.15, 0.4))
+        f0 = rng.uniform(100, 160)
+        for n in range(burst):
+            x = n / SAMPLE_RATE
+            env = math.sin(math.pi * n / burst)
+            v = sum(a * math.sin(2 * math.pi * f0 * h * x) for h, a in ((1, 0.6), (3, 0.3), (7, 0.2), (12, 0.1)))
+            frames += struct.pack("<h", int(9000 * env * v))
+        pause = int(SAMPLE_RATE * rng.uniform(0.05, 0.3))
+        frames += b"\x00\x00" * pause
+        t += burst + pause
+
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(bytes(frames))
+
+
+def audio_seconds(path: Path) -> float | None:
+    if path.suffix != ".wav":
+        return None
+    with wave.open(str(path), "rb") as w:
+        return w.getnframes() / w.getframerate()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--audio", type=Path, help="audio clip to use as every episode")
+    parser.add_argument("--episodes", type=int, default=8)
+    parser.add_argument("--workers", type=int, nargs="+", default=None)
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    worker_counts = args.workers or sorted({1, 2, plan_workers()[0], max(1, cpus // 2)})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        fixture = args.audio
+        if fixture is None:
+            fixture = tmp / "fixture.wav"
+            write_fixture(fixture)
+
+        jobs = []
+        for i in range(args.episodes):
+            path = tmp / f"episode-{i}{fixture.suffix}"
+            shutil.copy(fixture, path)
+            jobs.append((f"episode-{i}", path))
+
+        duration = audio_seconds(fixture)
+        print(f"cpus={cpus} episodes={args.episodes} clip={duration or '?'}s")
+
+        for requested in worker_counts:
+            workers, threads = plan_workers(requested)
+            start = time.perf_counter()
+            failed = sum(transcript is None for _, transcript, _ in transcribe_episodes(jobs, workers))
+            elapsed = time.perf_counter() - start
+
+            line = f"workers={workers:<3} threads={threads:<3} {elapsed:8.1f}s  {args.episodes / elapsed * 3600:10.1f} episodes/h"
+            if failed:
+                line += f"  FAILED={failed}"
+            if duration:
+                line += f"  RTF={elapsed / (duration * args.episodes):.3f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()